@@ -2,9 +2,10 @@ import numpy as np
 from circuitree import CircuiTree
 from circuitree.models import SimpleNetworkGrammar
 from adaptation_circuits.tf_network import TFNetworkModel
-from adaptation_circuits.sample_params import generate_samples
+from adaptation_circuits.sample_params import generate_samples, ParameterBank
 from collections import Counter
-from adaptation_circuits.enumerate_topologies import build_param_idx_table, topologies_to_num_params
+from adaptation_circuits.enumerate_topologies import build_param_idx_table, topologies_to_num_params, TopologyRegistry, \
+    PermutationTable, filter_topology_with_path
 # from time import sleep
 import sys
 from pathlib import Path
@@ -49,15 +50,29 @@ class AdaptationTree(CircuiTree):
         self.n_samples = int(kwargs.get('n_samples', 1e3))
         self.visit_counter = Counter()
         self.Q_threshold = .01
+        # how each simulation reaches steady state, see TFNetworkModel
+        self.steady_state = kwargs.get('steady_state', 'fixed')
         self.successful_params = {}
+        # index of all topologies in the design space, for O(1) matching of states
+        self.topology_registry = TopologyRegistry(self.unique_topologies)
+        self._non_serializable_attrs.append("topology_registry")
 
         # param_table: dict[str, tuple] = ...
         # param dict -- gives parameters for each topology, order to index the param table
-        if kwargs.get('generate_param_sets'):
+        if kwargs.get('param_bank') is not None:
+            # parameter sets are memory-mapped from disk and the order in which each topology visits them is
+            # derived from the bank's seed on demand, so startup costs almost no memory
+            self.param_sets = ParameterBank.open_or_create(kwargs['param_bank'], len(self.grammar.components),
+                                                           self.n_samples, seed=kwargs.get('param_seed', 2024),
+                                                           method=kwargs.get('sampling_method', 'lhs'))
+            self.param_table = PermutationTable(self.unique_topologies, self.n_samples, seed=self.param_sets.seed)
+            self.topology_size_table = topologies_to_num_params(self.param_table.keys())
+        elif kwargs.get('generate_param_sets'):
             # order with which parameters should be sampled
             self.param_table = build_param_idx_table(self.grammar.components, self.rg, self.n_samples, top=self.unique_topologies)
             self.topology_size_table = topologies_to_num_params(self.param_table.keys())
-            self.param_sets = generate_samples(len(self.grammar.components), self.rg, self.n_samples)
+            self.param_sets = generate_samples(len(self.grammar.components), self.rg, self.n_samples,
+                                               method=kwargs.get('sampling_method', 'lhs'))
         # todo: save to reload later
         else:
             # load from file
@@ -65,7 +80,7 @@ class AdaptationTree(CircuiTree):
 
     def get_param_set_index(self, state: str, visit: int) -> int:
         """Get the index of the parameter set to use for this state and visit number."""
-        return self.param_table[state][visit]
+        return int(self.param_table[state][visit])
 
     # todo: save params for topologies that work
     def get_reward(self, state: str, expensive: bool = False) -> float:
@@ -84,9 +99,23 @@ class AdaptationTree(CircuiTree):
             # index param table with 1. number of params and 2. the param set index
             param_set = self.param_sets[self.topology_size_table[state2]][:, :, :, :, param_set_idx]
 
-            model = TFNetworkModel(self.rg, state, params=param_set)
-            # todo: param_set needs to be a list of k_cat, K_thresh
-            reward = model.run_ode_with_params()
+            # The simulation is deterministic given the state and parameter set, so
+            # its result can be reused across restarts and replicas
+            cache_key = (state, int(param_set_idx))
+            if self.steady_state != 'fixed':
+                cache_key += (self.steady_state,)
+            # topologies without a path from input to output can never adapt, so they are rejected without
+            # a simulation
+            if not filter_topology_with_path(state, source='A', destination='O'):
+                reward = 0
+            else:
+                reward = None if self.reward_cache is None else self.reward_cache.get(cache_key)
+            if reward is None:
+                model = TFNetworkModel(self.rg, state, params=param_set, steady_state=self.steady_state)
+                # todo: param_set needs to be a list of k_cat, K_thresh
+                reward = model.run_ode_with_params()
+                if self.reward_cache is not None:
+                    self.reward_cache.put(cache_key, reward)
             # save param and topology if successful
             if reward > 0:
                 if state2 not in self.successful_params.keys():
@@ -96,6 +125,10 @@ class AdaptationTree(CircuiTree):
             print(reward)
             return reward
 
+    def early_stopping_key(self, state: str, *args, **kwargs) -> str:
+        """Rewards are pooled by topology, matching the parameter set order in `param_table`."""
+        return state if state is None else self.convert_state(state)
+
     def get_mean_reward(self, state: str) -> float:
         if state is None:
             return 0
@@ -118,10 +151,9 @@ class AdaptationTree(CircuiTree):
         visits = self.graph.nodes[state]["visits"]
         return visits > 0 and reward / visits >= self.Q_threshold
 
-    # todo: maybe build the database from the tree to avoid searching for matching topologies each time
     def convert_state(self, state: str) -> str:
-        # state = find_matching_topology(state, self.param_table.keys())
-        return state.split('::')[1]
+        topology = state.split('::')[1]
+        return self.topology_registry.match(topology) or topology
 
 
 # tree = AdaptationTree(root='ABO::AOa_BOi_OBa', grammar=grammar, n_samples=1e4, generate_param_sets=True)
@@ -134,13 +166,13 @@ save_dir = Path("./tree-backups")
 save_dir.mkdir(exist_ok=True)
 
 def save_tree_callback(tree: AdaptationTree, iteration: int, *args, **kwargs):
-    """Saves the BistabilityTree to two files, a `.gml` file containing the
-    graph and a `.json` file with the other attributes."""
+    """Saves the BistabilityTree to two files, a binary `.ctree` checkpoint of the
+    graph and a file with the other attributes."""
     if iteration % 1_000 == 0:
         stem = f"{today}_adaptation_search_{iteration}"
-        gml_file = save_dir.joinpath(f"{stem}.gml")
+        gml_file = save_dir.joinpath(f"{stem}.ctree")
         json_file = save_dir.joinpath(f"{stem}.json")
-        tree.to_file(gml_file, json_file)
+        tree.to_file(gml_file, json_file, format="columnar")
         # todo: might be a duplicate
         with open(save_dir.joinpath(f"{stem}_successful_params_dict.pkl"), 'wb') as pickle_file:
             pickle.dump(tree.successful_params, pickle_file)
@@ -1,7 +1,7 @@
 ## todo: given the number of nodes, determine the number of topologies,
 # Complexity: 3**N**2 , actions = inhibit, activate, none , N = number of nodes
+from functools import lru_cache
 from itertools import product, permutations
-import networkx as nx
 import numpy as np
 import string
 
@@ -36,32 +36,122 @@ def generate_topologies_with_optional_pairs(nodes, actions):
 
     return topologies
 
+def interactions_of(topology):
+    """
+    The interactions of a topology or of a full state (e.g. "*ABO::ABa_BOi"), as a list of 3-character
+    strings. Empty topologies have no interactions.
+    """
+    interactions = topology.split('::')[-1]
+    return interactions.split('_') if interactions else []
+
+
+def pack_topologies(topologies, nodes=None):
+    """
+    Pack topologies into bitmask adjacency arrays, for vectorized graph checks.
+
+    Parameters:
+    topologies (iterable): Topology strings, with or without the "components::" prefix.
+    nodes (str or list): Node names, at most 32. By default, the uppercase letters in the topologies.
+
+    Returns:
+    tuple: (adjacency, present, nodes), where adjacency has shape (n_topologies, n_nodes) and dtype uint32,
+    with bit j of adjacency[t, i] set if node i regulates node j in topology t, present[t] has the bits of the
+    nodes that take part in an interaction of topology t, and nodes lists the node names.
+    """
+    parsed = [interactions_of(t) for t in topologies]
+    if nodes is None:
+        nodes = sorted({c for interactions in parsed for pair in interactions for c in pair[:2]})
+    nodes = list(nodes)
+    if len(nodes) > 32:
+        raise ValueError("At most 32 nodes can be packed into bitmasks.")
+    index = {node: i for i, node in enumerate(nodes)}
+    bit = {node: 1 << i for i, node in enumerate(nodes)}
+
+    # pack with Python ints, which is much faster than item-wise array updates
+    rows = []
+    present = []
+    for interactions in parsed:
+        row = [0] * len(nodes)
+        nodes_present = 0
+        for pair in interactions:
+            row[index[pair[0]]] |= bit[pair[1]]
+            nodes_present |= bit[pair[0]] | bit[pair[1]]
+        rows.append(row)
+        present.append(nodes_present)
+    adjacency = np.array(rows, dtype=np.uint32).reshape(len(parsed), len(nodes))
+    return adjacency, np.array(present, dtype=np.uint32), nodes
+
+
+def transitive_closure(adjacency):
+    """
+    Transitive closure of packed adjacency arrays from `pack_topologies` (Warshall's algorithm on bitsets,
+    vectorized over topologies). Bit j of the result [t, i] is set if there is a path of length >= 1 from node
+    i to node j in topology t.
+    """
+    reach = adjacency.copy()
+    for k in range(adjacency.shape[1]):
+        # every node that reaches k also reaches everything k reaches
+        reaches_k = ((reach >> np.uint32(k)) & np.uint32(1)).astype(bool)
+        reach |= np.where(reaches_k, reach[:, k:k + 1], np.uint32(0))
+    return reach
+
+
+def has_path_mask(topologies, source, destination):
+    """
+    Vectorized path check: a boolean array marking the topologies with a direct or indirect path from source
+    to destination. As with `networkx.has_path`, both nodes must take part in the topology.
+    """
+    adjacency, present, nodes = pack_topologies(topologies)
+    if source not in nodes or destination not in nodes:
+        return np.zeros(len(adjacency), dtype=bool)
+    src, dst = nodes.index(source), nodes.index(destination)
+    reach = transitive_closure(adjacency)[:, src]
+    if src == dst:
+        return ((present >> np.uint32(src)) & np.uint32(1)).astype(bool)
+    return ((reach >> np.uint32(dst)) & np.uint32(1)).astype(bool)
+
+
+def weakly_connected_mask(topologies):
+    """
+    Vectorized connectivity check: a boolean array marking the non-empty topologies whose graph is weakly
+    connected.
+    """
+    adjacency, present, nodes = pack_topologies(topologies)
+    n = len(nodes)
+    # symmetrize: j is adjacent to i if i regulates j or j regulates i
+    bits = np.uint32(1) << np.arange(n, dtype=np.uint32)
+    regulates = ((adjacency[:, :, None] & bits) != 0)
+    undirected = (regulates | regulates.transpose(0, 2, 1))
+    symmetric = (undirected * bits).sum(axis=-1, dtype=np.uint32)
+    reach = transitive_closure(symmetric)
+
+    # every node must be reachable from the lowest present node
+    first = np.zeros(len(present), dtype=int)
+    nonempty = present != 0
+    first[nonempty] = np.log2(present[nonempty] & -present[nonempty].astype(np.int64)).astype(int)
+    component = reach[np.arange(len(present)), first] | (np.uint32(1) << first.astype(np.uint32))
+    return nonempty & ((component & present) == present)
+
+
+@lru_cache(maxsize=65536)
+def _has_path(key, source, destination):
+    return bool(has_path_mask([key], source, destination)[0])
+
+
 def filter_topology_with_path(topology, source, destination):
     """
     Check if a given topology has a direct or indirect path between source and destination nodes.
 
     Parameters:
-    topology (str): The topology string.
+    topology (str): The topology string, with or without the "components::" prefix of a state.
     source (str): The source node name.
     destination (str): The destination node name.
 
     Returns:
     bool: True if there is a path between the source and destination nodes, otherwise False.
     """
-    graph = nx.DiGraph()
-    # Split the topology string using the underscore to get each edge description
-    pairs = topology.split('_')
-    for pair in pairs:
-        src = pair[0]
-        dst = pair[1]
-        graph.add_edge(src, dst)
-
-    # Ensure the source and destination nodes are in the graph
-    if source in graph and destination in graph:
-        # Check if there's a path between the source and destination
-        return nx.has_path(graph, source, destination)
-
-    return False
+    # results are cached by the canonical interaction set, so each topology is checked once
+    return _has_path(topology_key('_'.join(interactions_of(topology))), source, destination)
 
 
 def filter_topologies_with_path(topologies, source, destination):
@@ -76,24 +166,9 @@ def filter_topologies_with_path(topologies, source, destination):
     Returns:
     list: List of topology strings that have a path between the source and destination nodes.
     """
-    valid_topologies = []
-
-    for topology in topologies:
-        graph = nx.DiGraph()
-        # Split the topology string using the underscore to get each edge description
-        pairs = topology.split('_')
-        for pair in pairs:
-            src = pair[0]
-            dst = pair[1]
-            graph.add_edge(src, dst)
-
-        # Ensure the source and destination nodes are in the graph
-        if source in graph and destination in graph:
-            # Check if there's a path between the source and destination
-            if nx.has_path(graph, source, destination):
-                valid_topologies.append(topology)
-
-    return valid_topologies
+    topologies = list(topologies)
+    mask = has_path_mask(topologies, source, destination)
+    return [t for t, keep in zip(topologies, mask) if keep]
 
 
 def filter_connected_topologies(topologies):
@@ -106,24 +181,9 @@ def filter_connected_topologies(topologies):
     Returns:
     list: List of topology strings that are fully connected.
     """
-    valid_topologies = []
-
-    for topology in topologies:
-        if topology == '':
-            continue
-        graph = nx.DiGraph()
-        # Split the topology string using the underscore to get each edge description
-        pairs = topology.split('_')
-        for pair in pairs:
-            src = pair[0]
-            dst = pair[1]
-            graph.add_edge(src, dst)
-
-        # Check if the entire graph is weakly connected
-        if nx.is_weakly_connected(graph):
-            valid_topologies.append(topology)
-
-    return valid_topologies
+    topologies = list(topologies)
+    mask = weakly_connected_mask(topologies)
+    return [t for t, keep in zip(topologies, mask) if keep]
 
 # Example usage
 # nodes = ['A', 'B', 'C']
@@ -160,6 +220,63 @@ def build_param_idx_table(nodes, rg, n_samples=1e4, top=None):
     return dict(zip(valid_topologies, param_order.tolist()))
 
 
+class PermutationTable:
+    """
+    Lazy replacement for the dict built by `build_param_idx_table`. Each topology's order of parameter set
+    indices is a permutation of range(n_samples) derived on demand from `seed` and the topology string, so no
+    table is held in memory and every process with the same seed sees the same orders. The most recently used
+    permutations are cached as int32 arrays.
+
+    Parameters:
+    topologies (iterable): Topology strings, as the keys of `build_param_idx_table`.
+    n_samples (int): Number of parameter sets to permute.
+    seed (int): Seed from which all permutations are derived.
+    cache_size (int): Number of permutations to keep in memory.
+    """
+
+    def __init__(self, topologies, n_samples, seed, cache_size=1024):
+        self.topologies = list(topologies)
+        self.n_samples = int(n_samples)
+        self.seed = int(seed)
+        self.cache_size = cache_size
+        self._known = set(self.topologies)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.topologies)
+
+    def __contains__(self, topology):
+        return topology in self._known
+
+    def __iter__(self):
+        return iter(self.topologies)
+
+    def keys(self):
+        return list(self.topologies)
+
+    def __getitem__(self, topology):
+        """Returns the order of parameter set indices for a topology."""
+        order = self._cache.pop(topology, None)
+        if order is None:
+            if topology not in self._known:
+                raise KeyError(topology)
+            rg = np.random.default_rng([self.seed, *topology.encode()])
+            order = rg.permutation(self.n_samples).astype(np.int32)
+            if len(self._cache) >= self.cache_size:
+                del self._cache[next(iter(self._cache))]
+        # re-inserting keeps the dict in order of last use
+        self._cache[topology] = order
+        return order
+
+    def to_dict(self):
+        return dict(topologies=self.topologies, n_samples=self.n_samples, seed=self.seed,
+                    cache_size=self.cache_size)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+
 def count_unique_uppercase_letters(input_str):
     """
     Count the number of unique uppercase letters in a given string.
@@ -214,6 +331,69 @@ def topologies_to_num_params(topologies):
     return num_params
 
 
+def topology_key(topology):
+    """
+    Canonical key of a topology's interaction set, independent of the order in which the
+    interactions are listed.
+
+    Parameters:
+    topology (str): Interactions separated by underscores, e.g. "BOi_ABa".
+
+    Returns:
+    str: The interactions, sorted and joined by underscores, e.g. "ABa_BOi".
+    """
+    return '_'.join(sorted(topology.split('_')))
+
+
+class TopologyRegistry:
+    """
+    Index of topologies, built once, that maps the canonical key of each topology's
+    interaction set to an integer topology id. Lookups, deduplication and matching are
+    hash lookups instead of scans over all topologies.
+
+    Parameters:
+    topologies (iterable): Topology strings (interactions only, without "::"). Topologies
+    with the same interaction set are registered once, under the first spelling seen.
+    """
+
+    def __init__(self, topologies):
+        self._ids = {}
+        registered = []
+        for topology in topologies:
+            key = topology_key(topology)
+            if key not in self._ids:
+                self._ids[key] = len(registered)
+                registered.append(topology)
+        self.topologies = np.array(registered, dtype=str)
+
+    def __len__(self):
+        return len(self.topologies)
+
+    def __contains__(self, topology):
+        return topology_key(topology) in self._ids
+
+    def id_of(self, topology):
+        """Returns the id of a topology, or -1 if it is not registered."""
+        return self._ids.get(topology_key(topology), -1)
+
+    def ids(self, topologies):
+        """Returns an array with the id of each topology (-1 if not registered)."""
+        return np.fromiter((self.id_of(t) for t in topologies), dtype=np.int64)
+
+    def match(self, topology):
+        """Returns the registered spelling of a topology, or None if it is not registered."""
+        topology_id = self.id_of(topology)
+        return None if topology_id < 0 else str(self.topologies[topology_id])
+
+    def unique(self, topologies):
+        """Returns the distinct interaction sets among the given topologies, in order of
+        first appearance."""
+        unique_topologies = {}
+        for topology in topologies:
+            unique_topologies.setdefault(topology_key(topology), topology)
+        return list(unique_topologies.values())
+
+
 def find_matching_topology(string, target_list):
     """
     Check if the items in a given string can be reordered to match any string in the provided list,
@@ -221,7 +401,8 @@ def find_matching_topology(string, target_list):
 
     Parameters:
     string (str): The string containing items separated by underscores.
-    target_list (list): List of strings to compare against.
+    target_list (list or TopologyRegistry): List of strings to compare against. Passing a
+    TopologyRegistry built once from the list makes each lookup O(1).
 
     Returns:
     str or None: The matching topology if the items can be reordered to match any string in the list,
@@ -230,6 +411,10 @@ def find_matching_topology(string, target_list):
     # Split the input string into components
     h = string.split('::')[0]
     items = string.split('::')[1].split('_')
+    if isinstance(target_list, TopologyRegistry):
+        target = target_list.match(string.split('::')[1])
+        return string if target is None else '::'.join([h, target])
+
     # Sort the items for easier comparison
     sorted_items = sorted(items)
 
@@ -1,5 +1,6 @@
 import numpy as np
 # from numpy.fft import fft, ifft
+from scipy.fft import irfft, next_fast_len, rfft
 from scipy.signal import find_peaks
 import matplotlib.pyplot as plt
 
@@ -11,14 +12,78 @@ def autocorr(x):
     return norm_result[norm_result.size//2:]
 
 
+def autocorr_batch(data):
+    """Normalized autocorrelation at lags 0..T-1 of a batch of trajectories of shape (n_sims, T, n_species),
+    computed for all trajectories and species at once with FFTs. Same as `autocorr` per column."""
+    x = data - data.mean(axis=1, keepdims=True)
+    T = x.shape[1]
+    # zero-pad to at least 2T - 1 points so the circular correlation equals the linear one
+    n_fft = next_fast_len(2 * T - 1, real=True)
+    spectrum = rfft(x, n=n_fft, axis=1)
+    result = irfft(spectrum * spectrum.conj(), n=n_fft, axis=1)[:, :T]
+    # the autocorrelation is largest at lag 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return result / result[:, :1]
+
+
+def sustained_oscillation_batch(data):
+    """Vectorized `sustained_oscillation` for trajectories of shape (n_sims, T, n_species). Returns a boolean
+    array of shape (n_sims,)."""
+    # like ndarray.min, a NaN autocorrelation (a constant trajectory) makes the comparison False
+    return autocorr_batch(data).min(axis=(1, 2)) < -.4
+
+
 def sustained_oscillation(data):
     """Classify if there are sustained oscillations based on autocorrelation."""
     # Compute the autocorrelation
-    acorr = np.apply_along_axis(autocorr, 0, data)
-    if acorr.min() < -.4:
-        return True
-    else:
-        return False
+    return bool(sustained_oscillation_batch(np.asarray(data)[None])[0])
+
+
+def find_peaks_batch(x):
+    """Local maxima of each row of x, of shape (n_sims, T), as a boolean mask of the same shape. Matches
+    `scipy.signal.find_peaks(row)` without conditions: a peak is a sample (or the middle sample of a flat
+    plateau) whose neighbours on both sides are strictly lower."""
+    n_sims, T = x.shape
+    peaks = np.zeros((n_sims, T), dtype=bool)
+    if T < 3:
+        return peaks
+    step = np.sign(np.diff(x, axis=1))
+    # index of the last nonzero step at or before each position, skipping over plateaus
+    positions = np.broadcast_to(np.arange(T - 1), step.shape)
+    last_change = np.maximum.accumulate(np.where(step != 0, positions, -1), axis=1)
+    previous = np.full_like(last_change, -1)
+    previous[:, 1:] = last_change[:, :-1]
+    rising = np.take_along_axis(step, np.maximum(previous, 0), axis=1) > 0
+    # a fall at step j that follows a rise at step p ends a peak spanning samples p + 1 .. j
+    rows, falls = np.nonzero((step < 0) & (previous >= 0) & rising)
+    peaks[rows, (previous[rows, falls] + 1 + falls) // 2] = True
+    return peaks
+
+
+def damped_oscillation_batch(out, out2, out_node=-1, threshold=0.001):
+    """Vectorized `damped_oscillation` for trajectories of shape (n_sims, T, n_species) before (out) and after
+    (out2) the input step. Returns a boolean array of shape (n_sims,)."""
+    steady_state = out[:, -1, out_node]
+    response = out2[:, :, out_node]
+    peaks = find_peaks_batch(response)
+    rows = np.arange(len(response))
+
+    # the first two peaks of each trajectory
+    first = peaks.argmax(axis=1)
+    second_mask = peaks.copy()
+    second_mask[rows, first] = False
+    second = second_mask.argmax(axis=1)
+    enough_peaks = peaks.sum(axis=1) >= 2
+
+    # trough between the first two peaks
+    t = np.arange(response.shape[1])
+    between = (t >= first[:, None]) & (t < second[:, None])
+    trough_1 = np.where(between, response, np.inf).min(axis=1)
+    O_peak1 = response[rows, first] - steady_state
+    O_peak2 = steady_state - trough_1
+    damped = (O_peak2 > .5 * O_peak1) | (np.abs(O_peak1 - O_peak2) <= threshold)
+    # continue if criteria is passed, or if there are not enough peaks to determine oscillatory behavior
+    return ~enough_peaks | damped
 
 # plt.plot(acorr[:,0])
 # plt.plot(acorr[:,1])
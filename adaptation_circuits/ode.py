@@ -1,6 +1,8 @@
 import numpy as np
+from functools import cached_property
 from typing import Optional
 from scipy.integrate import odeint
+from scipy.optimize import root
 import matplotlib.pyplot as plt
 
 # todo: there is a problem here -- if the circuit has only B and C -- then the inh/act may have a 2 but the
@@ -50,11 +52,414 @@ def system_dynamics(pop0, t, components, activations, inhibitions, k_cat, K_hill
     return pop_update
 
 
-def solve_dynamics(pop0, time, components, activations, inhibitions, k_cat, K_hill, inpt):
+class CompiledTopology:
+    """Precomputed form of `system_dynamics` for one topology.
+
+    The regulators of each component are stored once as count matrices, and the input
+    and basal terms are folded in as an extra regulator (the last column of k_cat and
+    K_hill) with a constant population of 1. The semantics are the same as
+    `system_dynamics`: repeated interactions add up, the input activates component 0,
+    components other than the input node with no activators get basal activation,
+    and components with no inhibitors get basal inhibition.
+
+    `compile` returns the right-hand side and its exact Jacobian for one parameter set,
+    for use with `odeint`; the Jacobian spares stiff solvers from estimating it by finite
+    differences. `bind`, `rhs` and `jacobian` evaluate the same for stacks of parameter
+    sets and populations at once, with leading dimensions that broadcast."""
+
+    def __init__(self, components, activations, inhibitions, basal=.5, input_node=0):
+        n = components
+        activations = np.asarray(activations, dtype=int).reshape(-1, 2)
+        inhibitions = np.asarray(inhibitions, dtype=int).reshape(-1, 2)
+
+        # counts[i, j] = number of times j regulates i
+        act_counts = np.zeros((n, n))
+        np.add.at(act_counts, (activations[:, 1], activations[:, 0]), 1)
+        inh_counts = np.zeros((n, n))
+        np.add.at(inh_counts, (inhibitions[:, 1], inhibitions[:, 0]), 1)
+        self._set_counts(act_counts, inh_counts, basal, input_node)
+
+    def _set_counts(self, act_counts, inh_counts, basal, input_node):
+        # count matrices may have leading (batch) dimensions
+        n = act_counts.shape[-1]
+        self.n_species = n
+        self.basal = basal
+        self.input_node = input_node
+        self.act_counts = act_counts
+        self.inh_counts = inh_counts
+
+        idx = np.arange(n)
+        self.input_mask = (idx == 0).astype(float)
+        self.basal_act = basal * ((act_counts.sum(axis=-1) == 0) & (idx > input_node))
+        self.basal_inh = basal * (inh_counts.sum(axis=-1) == 0)
+
+        # columns of k_cat/K_hill used by each regulator, with -1 for input/basal
+        self.param_cols = np.append(idx, -1)
+
+    def member(self, i):
+        """The topology of member i of a batch. All members share this topology."""
+        return self
+
+    def bind(self, k_cat, K_hill, inpt=.5):
+        """Returns the weights (k_act, K_act, k_inh, K_inh), each of shape
+        (..., n, n + 1), for parameters of shape (..., 2, m + 1, m + 1)."""
+        n, cols = self.n_species, self.param_cols
+        k_cat = np.asarray(k_cat, dtype=float)[..., :n, :][..., cols]
+        K_hill = np.asarray(K_hill, dtype=float)[..., :n, :][..., cols]
+
+        inpt = np.asarray(inpt, dtype=float)[..., None]
+        input_weights = inpt * self.input_mask + self.basal_act
+        act_counts = np.broadcast_to(self.act_counts, input_weights.shape[:-1] + (n, n))
+        act_weights = np.concatenate([act_counts, input_weights[..., None]], axis=-1)
+        inh_weights = np.concatenate([self.inh_counts, self.basal_inh[..., None]], axis=-1)
+        return (k_cat[..., 0, :, :] * act_weights, K_hill[..., 0, :, :],
+                k_cat[..., 1, :, :] * inh_weights, K_hill[..., 1, :, :])
+
+    @staticmethod
+    def rhs(pop, k_act, K_act, k_inh, K_inh):
+        """Derivative of populations of shape (..., n) given the weights from `bind`."""
+        regulators = np.concatenate([pop, np.ones(pop.shape[:-1] + (1,))], axis=-1)[..., None, :]
+        free = (1 - pop)[..., None]
+        bound = pop[..., None]
+        activation = (k_act * regulators * (free / (free + K_act))).sum(axis=-1)
+        inhibition = (k_inh * regulators * (bound / (bound + K_inh))).sum(axis=-1)
+        return activation - inhibition
+
+    @staticmethod
+    def jacobian(pop, k_act, K_act, k_inh, K_inh):
+        """Jacobian J[..., i, j] = d(dpop_i/dt) / dpop_j of the derivative computed by
+        `rhs`, for populations of shape (..., n) given the weights from `bind`."""
+        n = pop.shape[-1]
+        regulators = np.concatenate([pop, np.ones(pop.shape[:-1] + (1,))], axis=-1)[..., None, :]
+        free = (1 - pop)[..., None]
+        bound = pop[..., None]
+        # each regulator j contributes linearly to the rate of i...
+        jac = (k_act * (free / (free + K_act)) - k_inh * (bound / (bound + K_inh)))[..., :n]
+        # ...and the saturation of every term depends on i itself
+        diagonal = -(k_act * regulators * (K_act / (free + K_act) ** 2)).sum(axis=-1) \
+            - (k_inh * regulators * (K_inh / (bound + K_inh) ** 2)).sum(axis=-1)
+        idx = np.arange(n)
+        jac[..., idx, idx] += diagonal
+        return jac
+
+    @cached_property
+    def _terms(self):
+        """Indices (act_rows, act_cols, inh_rows, inh_cols) of the activation and inhibition terms that can be
+        nonzero, where row i is regulated by column j of the weights from `bind`. They depend only on the topology,
+        so they are found once and reused by every `compile`."""
+        act = np.concatenate([self.act_counts, (self.input_mask + self.basal_act)[:, None]], axis=-1)
+        inh = np.concatenate([self.inh_counts, self.basal_inh[:, None]], axis=-1)
+        return np.nonzero(act) + np.nonzero(inh)
+
+    def compile(self, k_cat, K_hill, inpt=.5):
+        """Returns functions f(pop, t) and jac(pop, t) computing the derivative and its exact Jacobian for one
+        parameter set, for use with `odeint` (jac as its `Dfun`). Only the terms listed by `_terms` are evaluated,
+        as flat arrays summed with `np.bincount`. For the small networks searched here this is about twice as fast as
+        `rhs` and `jacobian`, which evaluate every one of the (n, n + 1) weights."""
+        n = self.n_species
+        act_rows, act_cols, inh_rows, inh_cols = self._terms
+        k_act, K_act, k_inh, K_inh = self.bind(k_cat, K_hill, inpt)
+        rows = np.concatenate([act_rows, inh_rows])
+        cols = np.concatenate([act_cols, inh_cols])
+        k = np.concatenate([k_act[act_rows, act_cols], -k_inh[inh_rows, inh_cols]])
+        K = np.concatenate([K_act[act_rows, act_cols], K_inh[inh_rows, inh_cols]])
+        # each term saturates in s = offset + slope * pop_i: the free fraction (1 - pop_i) for
+        # activation and the bound fraction pop_i for inhibition
+        is_act = np.arange(len(rows)) < len(act_rows)
+        offset = is_act.astype(float)
+        slope = np.where(is_act, -1., 1.)
+
+        # each regulator j < n of i contributes to J[i, j], and every term to J[i, i]
+        regulated = cols < n
+        jac_idx = np.concatenate([rows[regulated] * n + cols[regulated], rows * (n + 1)])
+
+        def f(pop, t):
+            s = offset + slope * pop[rows]
+            return np.bincount(rows, k * np.append(pop, 1.)[cols] * s / (s + K), minlength=n)
+
+        def jac(pop, t):
+            s = offset + slope * pop[rows]
+            entries = np.concatenate([(k * s / (s + K))[regulated],
+                                      k * slope * np.append(pop, 1.)[cols] * K / (s + K) ** 2])
+            return np.bincount(jac_idx, entries, minlength=n * n).reshape(n, n)
+
+        return f, jac
+
+
+class TopologyStack(CompiledTopology):
+    """A batch of topologies with the same number of species, stored as masked
+    adjacency tensors: act_counts and inh_counts have shape (batch, n, n), and member
+    b of the batch regulates i by j act_counts[b, i, j] times. `bind` pairs member b
+    with parameter set b, so a stack can be passed to `solve_dynamics_batch` as the
+    topology to integrate many (topology, parameter set) pairs in one solve."""
+
+    def __init__(self, act_counts, inh_counts, basal=.5, input_node=0):
+        act_counts = np.asarray(act_counts, dtype=float)
+        inh_counts = np.asarray(inh_counts, dtype=float)
+        if act_counts.ndim != 3 or act_counts.shape != inh_counts.shape:
+            raise ValueError("act_counts and inh_counts must both have shape (batch, n, n).")
+        self._set_counts(act_counts, inh_counts, basal, input_node)
+
+    @classmethod
+    def from_topologies(cls, topologies):
+        """Stack compiled topologies, one per member of the batch."""
+        topologies = list(topologies)
+        first = topologies[0]
+        if any(t.n_species != first.n_species for t in topologies):
+            raise ValueError("All topologies in a stack must have the same number of species.")
+        if any((t.basal, t.input_node) != (first.basal, first.input_node) for t in topologies):
+            raise ValueError("All topologies in a stack must have the same basal rate and input node.")
+        return cls(np.stack([t.act_counts for t in topologies]), np.stack([t.inh_counts for t in topologies]),
+                   basal=first.basal, input_node=first.input_node)
+
+    def __len__(self):
+        return self.act_counts.shape[0]
+
+    def member(self, i):
+        topology = CompiledTopology.__new__(CompiledTopology)
+        topology._set_counts(self.act_counts[i], self.inh_counts[i], self.basal, self.input_node)
+        return topology
+
+    def compile(self, k_cat, K_hill, inpt=.5):
+        raise TypeError("Compile one member of the stack at a time, e.g. `stack.member(i).compile(...)`.")
+
+
+def solve_dynamics(pop0, time, components, activations, inhibitions, k_cat, K_hill, inpt, topology=None):
     # todo: maybe cant have input as an array ...
     # print(k_cat.shape, K_hill.shape)
-    result = odeint(system_dynamics, pop0, time,
-                    args=(components, activations, inhibitions, k_cat, K_hill, inpt))
+    if topology is None:
+        topology = CompiledTopology(components, activations, inhibitions)
+    f, jac = topology.compile(k_cat, K_hill, inpt)
+    result = odeint(f, pop0, time, Dfun=jac)
     return result
 
 
+def max_rate(f, pop, t=0.):
+    """Largest absolute rate of change, max |dpop/dt|, at a population."""
+    return np.abs(f(pop, t)).max()
+
+
+def solve_until_steady(f, pop0, time, tol=1e-6, chunk=500, jac=None):
+    """Integrate f(pop, t) with odeint over `time`, `chunk` time points at a time, and stop at the end of the
+    first chunk where max |dpop/dt| < tol. Returns the trajectory up to that point, so its length is a multiple
+    of `chunk` plus one, or len(time) if the system never settles. `jac(pop, t)` is passed to odeint as Dfun."""
+    out = [np.atleast_2d(np.asarray(pop0, dtype=float))]
+    pop = out[0][0]
+    for start in range(0, len(time) - 1, chunk):
+        segment = odeint(f, pop, time[start:start + chunk + 1], Dfun=jac)
+        out.append(segment[1:])
+        pop = segment[-1]
+        if max_rate(f, pop, time[min(start + chunk, len(time) - 1)]) < tol:
+            break
+    return np.concatenate(out)
+
+
+def numerical_jacobian(f, pop, t=0., eps=1e-7):
+    """Forward-difference Jacobian of f(pop, t), with J[i, j] = d f_i / d pop_j."""
+    pop = np.asarray(pop, dtype=float)
+    f0 = f(pop, t)
+    jac = np.empty((len(f0), len(pop)))
+    for j in range(len(pop)):
+        h = eps * max(1., abs(pop[j]))
+        shifted = pop.copy()
+        shifted[j] += h
+        jac[:, j] = (f(shifted, t) - f0) / h
+    return jac
+
+
+def find_steady_state(f, pop0, tol=1e-6, jac=None):
+    """Solve f(pop) = 0 directly, starting from pop0, with a Newton-type method (MINPACK hybrd). Returns the
+    steady state if it was found, lies in [0, 1], and is stable (all eigenvalues of the Jacobian have negative
+    real part), otherwise None. `jac(pop, t)` is used for the Jacobian if given."""
+    jac = jac or (lambda pop, t: numerical_jacobian(f, pop, t))
+    solution = root(lambda pop: f(pop, 0.), pop0, jac=lambda pop: jac(pop, 0.), method="hybr")
+    pop = solution.x
+    if not solution.success or max_rate(f, pop) >= tol or pop.min() < -tol or pop.max() > 1 + tol:
+        return None
+    if np.linalg.eigvals(jac(pop, 0.)).real.max() >= 0:
+        return None
+    return pop
+
+
+
+
+
+# Dormand-Prince 5(4) coefficients
+_DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+_DP_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+# difference between the 5th and 4th order solutions
+_DP_E = np.array([71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40])
+
+
+def _rk4_step(f, y, fy, h, jac=None):
+    k2 = f(y + h / 2 * fy)
+    k3 = f(y + h / 2 * k2)
+    k4 = f(y + h * k3)
+    y_new = y + h / 6 * (fy + 2 * k2 + 2 * k3 + k4)
+    return y_new, f(y_new), None
+
+
+def _dopri5_step(f, y, fy, h, jac=None):
+    k = [fy]
+    for a in _DP_A[1:]:
+        k.append(f(y + h * sum(a_j * k_j for a_j, k_j in zip(a, k) if a_j)))
+    # the last stage is evaluated at the 5th order solution (first same as last)
+    y_new = y + h * sum(a_j * k_j for a_j, k_j in zip(_DP_A[-1], k) if a_j)
+    error = h * sum(e_j * k_j for e_j, k_j in zip(_DP_E, k) if e_j)
+    return y_new, k[-1], error
+
+
+# ROS2 (Verwer et al., 1999), L-stable for stiff systems
+_ROS2_GAMMA = 1 + 1 / np.sqrt(2)
+
+
+def _ros2_step(f, y, fy, h, jac):
+    # both stages solve with the same matrix W = I - gamma * h * J
+    w = np.eye(y.shape[-1]) - _ROS2_GAMMA * h[..., None] * jac(y)
+    k1 = np.linalg.solve(w, fy[..., None])[..., 0]
+    k2 = np.linalg.solve(w, (f(y + h * k1) - 2 * k1)[..., None])[..., 0]
+    y_new = y + h * (1.5 * k1 + 0.5 * k2)
+    # difference from the embedded first order solution y + h * k1
+    error = h * 0.5 * (k1 + k2)
+    return y_new, f(y_new), error
+
+
+# exponent of the step size controller, from the order of the error estimate
+_ERROR_EXPONENT = dict(rk45=-1 / 5, ros2=-1 / 2)
+
+
+def _hermite(y0, f0, y1, f1, h, s):
+    """Cubic Hermite interpolation between two steps, at fractions s of the step."""
+    s2, s3 = s * s, s * s * s
+    return ((2 * s3 - 3 * s2 + 1) * y0 + (s3 - 2 * s2 + s) * h * f0
+            + (-2 * s3 + 3 * s2) * y1 + (s3 - s2) * h * f1)
+
+
+def integrate_batch(f, y0, time, method="rk45", rtol=1e-6, atol=1e-9, dt=None, max_steps=100_000, jac=None):
+    """Integrate a batch of independent ODE systems dy/dt = f(y, idx), where y has
+    shape (batch, n) and idx selects the members of the batch being evaluated.
+
+    Each member takes its own steps: with method "rk45" (Dormand-Prince, adaptive
+    step size), "ros2" (linearly implicit Rosenbrock, adaptive step size, for stiff
+    systems; requires the Jacobian `jac(y, idx)` of shape (batch, n, n)) or "rk4"
+    (fixed step `dt`). All members are advanced together with
+    array operations, and solutions are interpolated onto the shared `time` points
+    with cubic Hermite interpolation. Returns an array of shape (len(time), batch,
+    n) and a boolean array marking members that reached the end within `max_steps`
+    steps (the rest of their trajectory is NaN)."""
+    steps = dict(rk45=_dopri5_step, ros2=_ros2_step, rk4=_rk4_step)
+    if method not in steps:
+        raise ValueError(f"Unknown method: {method}. Must be one of {list(steps)}.")
+    if method == "rk4" and dt is None:
+        raise ValueError("Method 'rk4' requires a step size `dt`.")
+    if method == "ros2" and jac is None:
+        raise ValueError("Method 'ros2' requires a Jacobian `jac`.")
+    step = steps[method]
+
+    time = np.asarray(time, dtype=float)
+    y = np.array(y0, dtype=float)
+    batch, n = y.shape
+    out = np.full((len(time), batch, n), np.nan)
+    out[0] = y
+    t_end = time[-1]
+    t = np.full(batch, time[0])
+    next_idx = np.ones(batch, dtype=int)
+    all_idx = np.arange(batch)
+    fy = f(y, all_idx)
+
+    if method == "rk4":
+        h = np.full(batch, float(dt))
+    else:
+        # initial step from the scale of the solution and its derivative
+        scale = atol + rtol * np.abs(y)
+        d0 = np.sqrt(np.mean((y / scale) ** 2, axis=1))
+        d1 = np.sqrt(np.mean((fy / scale) ** 2, axis=1))
+        h = np.where((d0 < 1e-5) | (d1 < 1e-5), 1e-6, 0.01 * d0 / np.maximum(d1, 1e-300))
+
+    active = np.full(batch, len(time) > 1)
+    for _ in range(max_steps):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        t_a, y_a, f_a = t[idx], y[idx], fy[idx]
+        h_a = np.minimum(h[idx], t_end - t_a)[:, None]
+
+        def f_active(y_stage):
+            return f(y_stage, idx)
+
+        def jac_active(y_stage):
+            return jac(y_stage, idx)
+
+        y_new, f_new, error = step(f_active, y_a, f_a, h_a, jac_active)
+
+        if error is None:
+            accept = np.ones(idx.size, dtype=bool)
+        else:
+            scale = atol + rtol * np.maximum(np.abs(y_a), np.abs(y_new))
+            err = np.sqrt(np.mean((error / scale) ** 2, axis=1))
+            accept = err <= 1
+            factor = np.clip(0.9 * np.maximum(err, 1e-10) ** _ERROR_EXPONENT[method], 0.2, 10.0)
+            h[idx] = np.where(accept, factor, np.minimum(factor, 1.0)) * h_a[:, 0]
+
+        # interpolate accepted steps onto the time points they cover
+        acc = np.flatnonzero(accept)
+        members = idx[acc]
+        t_new = t_a[acc] + h_a[acc, 0]
+        lo = next_idx[members]
+        hi = np.searchsorted(time, t_new, side="right")
+        hi[t_new >= t_end] = len(time)
+        counts = np.maximum(hi - lo, 0)
+        if counts.sum():
+            rows = np.repeat(acc, counts)
+            k = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            s = ((time[k] - t_a[rows]) / h_a[rows, 0])[:, None]
+            out[k, idx[rows]] = _hermite(y_a[rows], f_a[rows], y_new[rows], f_new[rows], h_a[rows], s)
+        next_idx[members] = np.maximum(hi, lo)
+
+        t[members] = t_new
+        y[members] = y_new[acc]
+        fy[members] = f_new[acc]
+        active[members[t_new >= t_end]] = False
+
+    return out, ~active
+
+
+def solve_dynamics_batch(pop0, time, topology, k_cat, K_hill, inpt, method="rk45", rtol=1e-6, atol=1e-9, dt=None,
+                         max_steps=100_000):
+    """Integrate one topology for a stack of parameter sets at once. k_cat and K_hill
+    have shape (batch, 2, m + 1, m + 1) and pop0 has shape (batch, n) or (n,). Returns
+    the trajectories, of shape (len(time), batch, n), and a boolean array marking the
+    members that were integrated successfully. See `integrate_batch`.
+
+    If `topology` is a `TopologyStack`, member b of the batch integrates topology b
+    with parameter set b (a single parameter set of shape (2, m + 1, m + 1) is shared
+    by all members)."""
+    weights = np.broadcast_arrays(*topology.bind(k_cat, K_hill, inpt))
+    batch = weights[0].shape[0]
+    pop0 = np.broadcast_to(pop0, (batch, topology.n_species))
+
+    # the weights of the active members are gathered once per step, not per stage
+    gathered = {}
+
+    def gather(idx):
+        if gathered.get("idx") is not idx:
+            gathered["idx"] = idx
+            gathered["weights"] = [w[idx] for w in weights]
+        return gathered["weights"]
+
+    def f(pop, idx):
+        return topology.rhs(pop, *gather(idx))
+
+    def jac(pop, idx):
+        return topology.jacobian(pop, *gather(idx))
+
+    return integrate_batch(f, pop0, time, method=method, rtol=rtol, atol=atol, dt=dt, max_steps=max_steps,
+                           jac=jac)
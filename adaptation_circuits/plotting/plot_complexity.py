@@ -1,21 +1,31 @@
+from pathlib import Path
 from adaptation_circuits.adaptation_tree import AdaptationTree, grammar
 import matplotlib.pyplot as plt
+import numpy as np
 from circuitree.viz import plot_network
 from circuitree.models import SimpleNetworkGrammar
 
-tree = AdaptationTree.from_file(graph_gml="../tree-backups/240518_adaptation_search_0.gml",
-                                attrs_npz="../tree-backups/240518_adaptation_search_0.npz",
-                                grammar_cls=SimpleNetworkGrammar)
-# Top 10 designs with at least 10 visits
-def robustness(state):
-    r = tree.graph.nodes[state].get("reward", 0)
-    v = tree.graph.nodes[state].get("visits", 1)
-    return r / v
+backup = Path("../tree-backups/240518_adaptation_search_0")
 
+# GML backups can only be loaded eagerly, so convert the backup to the columnar
+# format once. Later runs load its columns lazily, and the search graph is only
+# built when it is first needed, for the complexity plot
+if not backup.with_suffix(".ctree").exists():
+    AdaptationTree.from_file(graph_gml=backup.with_suffix(".gml"),
+                             attrs_npz=backup.with_suffix(".npz"),
+                             grammar_cls=SimpleNetworkGrammar).to_file(backup, format="columnar")
+tree = AdaptationTree.from_file(graph_gml=backup.with_suffix(".ctree"),
+                                attrs_npz=backup.with_suffix(".npz"),
+                                grammar_cls=SimpleNetworkGrammar,
+                                lazy=True)
 
+# Top 10 designs with at least 10 visits
 # Recall that only the "terminal" states are fully assembled circuits
-states = [s for s in tree.terminal_states if tree.graph.nodes[s]["visits"] > 10]
-top_10_states = sorted(states, key=robustness, reverse=True)[:10]
+space = tree.lazy_space
+candidates = np.flatnonzero((space.node_visits > 10) & space.terminal_mask(grammar.is_terminal))
+robustness = space.node_reward[candidates] / space.node_visits[candidates]
+top_10 = candidates[np.argsort(-robustness, kind="stable")[:10]]
+top_10_states = space.states[top_10].tolist()
 
 # Plot the top 10
 fig = plt.figure(figsize=(12, 5))
@@ -33,8 +43,8 @@ for i, state in enumerate(top_10_states):
         offset=0.75,
         padding=0.4
     )
-    r = tree.graph.nodes[state]["reward"]
-    v = tree.graph.nodes[state]["visits"]
+    r = space.node_reward[top_10[i]]
+    v = space.node_visits[top_10[i]]
     ax.set_title(f"{r / v:.2f} (n={v})")
     ax.set_xlim(-1.5, 1.5)
     ax.set_ylim(-1.0, 1.8)
@@ -19,3 +19,14 @@ def compute_precision_sensitivity(inpt, out, out2, out_node=-1):
     return precision, sensitivity
 
 
+def compute_precision_sensitivity_batch(inpt, out, out2, out_node=-1):
+    """Vectorized `compute_precision_sensitivity` for trajectories of shape (n_sims, T, n_species). Returns the
+    arrays (precision, sensitivity), each of shape (n_sims,)."""
+    O_1 = out[:, -1, out_node]
+    O_peak1 = np.abs(out2[:, :, out_node].max(axis=1) - O_1)
+    O_peak = np.abs(out2[:, -20:, out_node].min(axis=1) - O_1)
+    delta_I = abs(inpt[1] - inpt[0]) /inpt[0]
+    with np.errstate(divide='ignore'):
+        precision = ((O_peak / O_1) / delta_I )**-1
+    sensitivity = (O_peak1 / O_1) / delta_I
+    return precision, sensitivity
@@ -1,10 +1,16 @@
+import json
+from pathlib import Path
 import numpy as np
+from scipy.stats import qmc
 
 # k ~ 0.1-10, K ~.001-100
 k_range = (.1, 10)
 K_range = (.001, 100)
 PARAM_RANGES= [k_range, K_range]
-# todo: sample with latin hypercube sampling, double check that these are correct
+# both ranges span several orders of magnitude, so they are sampled uniformly in log10 space
+PARAM_SCALES = ["log", "log"]
+SAMPLING_METHODS = ["lhs", "sobol", "halton", "random"]
+
 
 def sample_ode_params(components, seed):
     m = components
@@ -24,26 +30,60 @@ def sample_ode_params(components, seed):
     return k_cat, K_thresh
 
 
-def latin_hypercube_sampling(n_samples, rg, n_params, param_ranges=PARAM_RANGES):  # n_params= forward and reverse
+def sample_unit_hypercube(n_samples, n_dims, rg, method="lhs"):
+    """Samples of shape (n_samples, n_dims) in [0, 1). "lhs" is a stratified Latin hypercube (each dimension has
+    exactly one sample in each of n_samples equal strata), "sobol" and "halton" are scrambled quasi-Monte Carlo
+    sequences (Sobol' points are best balanced when n_samples is a power of 2), and "random" is plain uniform
+    sampling."""
+    if method == "random":
+        return rg.uniform(0, 1, size=(n_samples, n_dims))
+    if method == "lhs":
+        sampler = qmc.LatinHypercube(d=n_dims, seed=rg)
+    elif method == "sobol":
+        sampler = qmc.Sobol(d=n_dims, scramble=True, seed=rg)
+    elif method == "halton":
+        sampler = qmc.Halton(d=n_dims, scramble=True, seed=rg)
+    else:
+        raise ValueError(f"Unknown sampling method: {method}. Must be one of {SAMPLING_METHODS}.")
+    return sampler.random(n_samples)
+
+
+def scale_samples(unit_samples, param_range, scale="log"):
+    """Map samples in [0, 1) onto a parameter range, uniformly ("linear") or uniformly in log10 space ("log")."""
+    min_val, max_val = param_range
+    if scale == "log":
+        min_val, max_val = np.log10(min_val), np.log10(max_val)
+        return np.power(10, min_val + unit_samples * (max_val - min_val))
+    if scale == "linear":
+        return min_val + unit_samples * (max_val - min_val)
+    raise ValueError(f"Unknown scale: {scale}. Must be 'linear' or 'log'.")
+
+
+def latin_hypercube_sampling(n_samples, rg, n_params, param_ranges=PARAM_RANGES, param_scales=PARAM_SCALES):  # n_params= forward and reverse
     # Check if param_ranges has the correct length
-    if len(param_ranges) != n_params:
-        raise ValueError("Length of param_ranges must match n_params")
-    # Create an empty array to hold the parameter sets
-    samples = np.zeros((n_samples, n_params))
-    # Fill in the samples array with scaled Latin Hypercube samples
+    if len(param_ranges) != n_params or len(param_scales) != n_params:
+        raise ValueError("Length of param_ranges and param_scales must match n_params")
+    # stratified samples in [0, 1], one column per parameter
+    samples = sample_unit_hypercube(n_samples, n_params, rg, method="lhs")
+    # Scale and shift samples to the given range for each parameter
     for i in range(n_params):
-        # Generate uniformly distributed samples within [0, 1]
-        param_samples = rg.uniform(0,1, size=n_samples)
-        # Scale and shift samples to the given range for the parameter
-        min_val, max_val = param_ranges[i]
-        param_samples = min_val + param_samples * (max_val - min_val)
-        # Shuffle the samples to ensure Latin Hypercube property
-        rg.shuffle(param_samples)
-        # Assign the shuffled samples to the appropriate column in the samples array
-        samples[:, i] = param_samples
+        samples[:, i] = scale_samples(samples[:, i], param_ranges[i], param_scales[i])
     return samples
 
 
+def sample_parameter_sets(shape, n_samples, rg, method="lhs", param_ranges=PARAM_RANGES, param_scales=PARAM_SCALES):
+    """Sample parameter sets of shape (len(param_ranges), *shape, n_samples). Each parameter set is one point of
+    the sampling design over all len(param_ranges) * prod(shape) entries, so with "lhs", "sobol" or "halton" the
+    n_samples sets cover the joint parameter space evenly. Entry [p, ...] is scaled to param_ranges[p]."""
+    if len(param_ranges) != len(param_scales):
+        raise ValueError("Length of param_ranges and param_scales must match")
+    n_entries = int(np.prod(shape))
+    unit = sample_unit_hypercube(n_samples, len(param_ranges) * n_entries, rg, method=method)
+    # (n_samples, param, *shape) -> (param, *shape, n_samples)
+    unit = np.moveaxis(unit.reshape(n_samples, len(param_ranges), *shape), 0, -1)
+    return np.stack([scale_samples(unit[p], param_ranges[p], param_scales[p]) for p in range(len(param_ranges))])
+
+
 def make_input_vals(init_val=.5, perc_increase=.2):
     """returns a tuple of input vals"""
     inpt = (init_val, init_val+init_val*perc_increase)
@@ -52,18 +92,101 @@ def make_input_vals(init_val=.5, perc_increase=.2):
 # todo: how to tell when it has reached steady state? measure slopes of the curves and see if they are <.001 ?
 
 
-def generate_samples(max_components, rg, n_samples, n_params=2):
+def generate_component_samples(components, rg, n_samples, n_params=2, method="lhs"):
+    """Parameter sets for circuits with `components` components, of shape (2[k/K], n_params, m, m, n_samples)
+    with m = components + 1. See `sample_parameter_sets`."""
+    m = components+1
+    # consider forward and reverse rxn
+    return sample_parameter_sets((n_params, m, m), int(n_samples), rg, method=method)
+
+
+def generate_samples(max_components, rg, n_samples, n_params=2, method="lhs"):
     sample_per_component = {}
     for i in range(1, max_components+1):
-        m = i+1
-        sampling = latin_hypercube_sampling(n_samples*2*m*m, rg, n_params=n_params)  # consider forward and reverse rxn
-        k_cat = sampling[:, 0].reshape(n_params,m,m, n_samples)[np.newaxis]
-        K_thresh = sampling[:, 1].reshape(n_params,m,m, n_samples)[np.newaxis]
-        sample_per_component[i] = np.vstack([k_cat, K_thresh])
+        sample_per_component[i] = generate_component_samples(i, rg, n_samples, n_params=n_params, method=method)
     # access the params sample_per_component[i][:,0] and unlist k_cat, K_thresh
     return sample_per_component
 
 
+class ParameterBank:
+    """
+    Parameter sets stored on disk as one .npy file per component count, with the same layout as the dict
+    returned by `generate_samples`: bank[i] has shape (2[k/K], n_params, i+1, i+1, n_samples). Files are
+    memory-mapped read-only when first accessed, so opening a bank costs no memory and worker processes share
+    the pages of the operating system's file cache.
+
+    Use `ParameterBank.create` to sample and write a bank, and `ParameterBank(directory)` to open one.
+    """
+
+    META_FILE = "bank.json"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        meta = json.loads(self.directory.joinpath(self.META_FILE).read_text())
+        self.max_components = meta["max_components"]
+        self.n_samples = meta["n_samples"]
+        self.n_params = meta["n_params"]
+        self.seed = meta["seed"]
+        self.method = meta.get("method", "lhs")
+        self._arrays = {}
+
+    @classmethod
+    def create(cls, directory, max_components, n_samples, seed, n_params=2, method="lhs"):
+        """Sample parameter sets for 1 to `max_components` components with a generator seeded by `seed`, and
+        write them to `directory`. Only one component count is held in memory at a time. The samples are the
+        same as `generate_samples(max_components, np.random.default_rng(seed), n_samples, n_params, method)`."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        rg = np.random.default_rng(seed)
+        for i in range(1, max_components+1):
+            np.save(directory.joinpath(cls._file_name(i)),
+                    generate_component_samples(i, rg, int(n_samples), n_params=n_params, method=method))
+        # metadata is written last, so an interrupted bank cannot be opened
+        meta = dict(max_components=max_components, n_samples=int(n_samples), n_params=n_params, seed=int(seed),
+                    method=method)
+        directory.joinpath(cls.META_FILE).write_text(json.dumps(meta))
+        return cls(directory)
+
+    @classmethod
+    def open_or_create(cls, directory, max_components, n_samples, seed, n_params=2, method="lhs"):
+        """Opens the bank in `directory`, creating it first if it does not exist."""
+        if Path(directory).joinpath(cls.META_FILE).exists():
+            bank = cls(directory)
+            if (bank.max_components, bank.n_samples, bank.n_params, bank.method) != \
+                    (max_components, int(n_samples), n_params, method):
+                raise ValueError(f"The parameter bank in {directory} does not match the requested "
+                                 f"max_components, n_samples, n_params and method.")
+            return bank
+        return cls.create(directory, max_components, n_samples, seed, n_params=n_params, method=method)
+
+    @staticmethod
+    def _file_name(components):
+        return f"params_{components}.npy"
+
+    def __getitem__(self, components):
+        array = self._arrays.get(components)
+        if array is None:
+            if not 1 <= components <= self.max_components:
+                raise KeyError(components)
+            array = np.load(self.directory.joinpath(self._file_name(components)), mmap_mode="r")
+            self._arrays[components] = array
+        return array
+
+    def keys(self):
+        return list(range(1, self.max_components+1))
+
+    def __getstate__(self):
+        # memory maps are reopened rather than pickled
+        return dict(directory=str(self.directory))
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    def to_dict(self):
+        return dict(directory=str(self.directory), max_components=self.max_components,
+                    n_samples=self.n_samples, n_params=self.n_params, seed=self.seed, method=self.method)
+
+
 # def make_param_db():
 
 # print('done')
@@ -1,10 +1,13 @@
 import numpy as np
-from adaptation_circuits.ode import solve_dynamics
-from adaptation_circuits.reward import compute_precision_sensitivity
+from adaptation_circuits.ode import CompiledTopology, TopologyStack, solve_dynamics, solve_dynamics_batch, \
+    solve_until_steady, find_steady_state
+from adaptation_circuits.reward import compute_precision_sensitivity, compute_precision_sensitivity_batch
 from adaptation_circuits.sample_params import make_input_vals, sample_ode_params
-from adaptation_circuits.filter_oscillation import damped_oscillation, sustained_oscillation
+from adaptation_circuits.filter_oscillation import damped_oscillation, sustained_oscillation, damped_oscillation_batch, \
+    sustained_oscillation_batch
 from circuitree import SimpleNetworkGrammar
-from adaptation_circuits.enumerate_topologies import count_unique_uppercase_letters, convert_to_sequential, filter_topology_with_path
+from adaptation_circuits.enumerate_topologies import count_unique_uppercase_letters, convert_to_sequential, filter_topology_with_path, \
+    has_path_mask
 
 
 class TFNetworkModel:
@@ -15,7 +18,18 @@ class TFNetworkModel:
             # max_iter_per_timestep,  # makes sure it doesn't run forever, not implemented yet
             inpt_perc_increase=.2,
             params=None,
+            steady_state="fixed",
+            steady_state_tol=1e-9,
     ):
+        # how the circuit is brought to steady state before and after the input step:
+        #   "fixed"  -- integrate over the full stabilize_tp/eval_tp time courses
+        #   "event"  -- integrate until max |dx/dt| < steady_state_tol
+        #   "newton" -- solve for a stable steady state directly (falling back to "event"), then integrate the
+        #               response to the input step as in "event"
+        if steady_state not in ("fixed", "event", "newton"):
+            raise ValueError(f"Unknown steady_state mode: {steady_state}. Must be 'fixed', 'event' or 'newton'.")
+        self.steady_state = steady_state
+        self.steady_state_tol = steady_state_tol
 
         self.genotype = genotype
 
@@ -48,20 +62,18 @@ class TFNetworkModel:
         if filter_topology_with_path(self.genotype, source='A', destination='O'):
             print(self.genotype)
             # convert activations and inhibitions to numbers, # todo: still does not work
-            activations = convert_to_sequential(self.activations, self.components_as_num, self.max_components) \
-                if self.n_species < self.max_components else self.activations
-            inhibitions = convert_to_sequential(self.inhibitions, self.components_as_num, self.max_components) \
-                if self.n_species < self.max_components else self.inhibitions
+            activations, inhibitions = self._sequential_topology()
+            # precompute the regulators once for both simulations
+            topology = CompiledTopology(self.n_species, activations, inhibitions)
 
-            out = solve_dynamics(self.pop0, self.stabilize_tp, self.n_species, activations, inhibitions,
-                                 self.k_cat, self.K_thresh, self.inpt[0])
+            out = self._stabilize(topology)
             # exclude sustained oscillation -- todo: this doesnt work
-            if sustained_oscillation(out):
+            # (a steady state solved for directly is a single time point and cannot oscillate)
+            if len(out) > 1 and sustained_oscillation(out):
                 plot_dynamics(out)
                 return 0
             # else:  # continue
-            out2 = solve_dynamics(out[-1], self.eval_tp, self.n_species, activations, inhibitions, self.k_cat,
-                                  self.K_thresh, self.inpt[1])
+            out2 = self._respond(topology, out[-1])
             # check for sustained oscillation as well?
             if damped_oscillation(out, out2):
                 precision, sensitivity = compute_precision_sensitivity(self.inpt, out, out2)
@@ -80,6 +92,87 @@ class TFNetworkModel:
         else:
             return 0
 
+    def _stabilize(self, topology):
+        """Dynamics before the input step, ending at steady state (unless the circuit never settles)."""
+        if self.steady_state == "fixed":
+            return solve_dynamics(self.pop0, self.stabilize_tp, None, None, None, self.k_cat, self.K_thresh,
+                                  self.inpt[0], topology=topology)
+        f, jac = topology.compile(self.k_cat, self.K_thresh, self.inpt[0])
+        if self.steady_state == "newton":
+            pop = find_steady_state(f, self.pop0, tol=self.steady_state_tol, jac=jac)
+            if pop is not None:
+                return pop[None]
+        return solve_until_steady(f, self.pop0, self.stabilize_tp, tol=self.steady_state_tol, jac=jac)
+
+    def _respond(self, topology, pop0):
+        """Dynamics after the input step, starting from the steady state pop0."""
+        if self.steady_state == "fixed":
+            return solve_dynamics(pop0, self.eval_tp, None, None, None, self.k_cat, self.K_thresh, self.inpt[1],
+                                  topology=topology)
+        f, jac = topology.compile(self.k_cat, self.K_thresh, self.inpt[1])
+        return solve_until_steady(f, pop0, self.eval_tp, tol=self.steady_state_tol, jac=jac)
+
+    def _sequential_topology(self):
+        activations = convert_to_sequential(self.activations, self.components_as_num, self.max_components) \
+            if self.n_species < self.max_components else self.activations
+        inhibitions = convert_to_sequential(self.inhibitions, self.components_as_num, self.max_components) \
+            if self.n_species < self.max_components else self.inhibitions
+        return activations, inhibitions
+
+    def _solve_batch(self, pop0, time, topology, k_cat, K_hill, inpt, **kwargs):
+        """Batched solve, re-running members the batch integrator gave up on (e.g. stiff parameter sets) with
+        odeint."""
+        out, ok = solve_dynamics_batch(pop0, time, topology, k_cat, K_hill, inpt, **kwargs)
+        pop0 = np.broadcast_to(pop0, (k_cat.shape[0], self.n_species))
+        for i in np.flatnonzero(~ok):
+            out[:, i] = solve_dynamics(pop0[i], time, None, None, None, k_cat[i], K_hill[i], inpt,
+                                       topology=topology.member(i))
+        return out
+
+    def run_ode_batch(self, param_sets, chunksize=256, method="ros2", rtol=1e-5, atol=1e-8, dt=None,
+                      max_steps=5000):
+        """Evaluate the reward of this topology for many parameter sets at once. param_sets has shape
+        (2[k/K], 2, m+1, m+1, n_sets), like a slice of AdaptationTree.param_sets. The ODEs are integrated
+        `chunksize` parameter sets at a time with solve_dynamics_batch, and each set is then filtered and
+        scored as in run_ode_with_params (without plotting). Returns an int array of rewards."""
+        n_sets = param_sets.shape[-1]
+        rewards = np.zeros(n_sets, dtype=int)
+        if not filter_topology_with_path(self.genotype, source='A', destination='O'):
+            return rewards
+        activations, inhibitions = self._sequential_topology()
+        topology = CompiledTopology(self.n_species, activations, inhibitions)
+        kwargs = dict(method=method, rtol=rtol, atol=atol, dt=dt, max_steps=max_steps)
+
+        for start in range(0, n_sets, chunksize):
+            chunk = slice(start, min(start + chunksize, n_sets))
+            k_cat = np.moveaxis(param_sets[0, ..., chunk], -1, 0)
+            K_hill = np.moveaxis(param_sets[1, ..., chunk], -1, 0)
+            rewards[chunk] = self._score_batch(topology, k_cat, K_hill, **kwargs)
+        return rewards
+
+    def _score_batch(self, topology, k_cat, K_hill, **kwargs):
+        """Rewards of a batch of parameter sets of shape (batch, 2, m+1, m+1), with the filters and thresholds of
+        run_ode_with_params. `topology` is a CompiledTopology or a TopologyStack of the same batch size."""
+        rewards = np.zeros(k_cat.shape[0], dtype=int)
+        # solvers return (T, batch, n), the classifiers take (batch, T, n)
+        out = np.moveaxis(self._solve_batch(self.pop0, self.stabilize_tp, topology, k_cat, K_hill, self.inpt[0],
+                                            **kwargs), 1, 0)
+        # only the sets without sustained oscillations are simulated after the input step
+        idx = np.flatnonzero(~sustained_oscillation_batch(out))
+        if idx.size == 0:
+            return rewards
+        if isinstance(topology, TopologyStack):
+            topology = TopologyStack(topology.act_counts[idx], topology.inh_counts[idx], topology.basal,
+                                     topology.input_node)
+        out, k_cat, K_hill = out[idx], k_cat[idx], K_hill[idx]
+        out2 = np.moveaxis(self._solve_batch(out[:, -1], self.eval_tp, topology, k_cat, K_hill, self.inpt[1],
+                                             **kwargs), 1, 0)
+        damped = damped_oscillation_batch(out, out2)
+        precision, sensitivity = compute_precision_sensitivity_batch(self.inpt, out, out2)
+        with np.errstate(divide='ignore'):
+            rewards[idx] = damped & (np.log10(precision) >= 1) & (np.log10(sensitivity) >= -5)
+        return rewards
+
     def initialize_ode_params(self, n_species):
         self.k_cat, self.K_thresh = sample_ode_params(n_species, self.rg)
 
@@ -88,6 +181,34 @@ class TFNetworkModel:
         pass
 
 
+def run_ode_topology_batch(genotypes, param_sets, inpt_perc_increase=.2, chunksize=256, **kwargs):
+    """Evaluate the rewards of many (topology, parameter set) pairs at once. param_sets has shape
+    (2[k/K], 2, m+1, m+1, len(genotypes)), with one parameter set per genotype. Genotypes with the same number of
+    species are stacked as masked adjacency tensors (TopologyStack) and integrated together, `chunksize` pairs at a
+    time. Genotypes without a path from input to output get a reward of 0, as in run_ode_with_params. Keyword
+    arguments are passed to solve_dynamics_batch. Returns an int array of rewards."""
+    rewards = np.zeros(len(genotypes), dtype=int)
+    groups = {}
+    # genotypes without an input-output path are rejected together, before any model is built
+    for i in np.flatnonzero(has_path_mask(genotypes, source='A', destination='O')):
+        model = TFNetworkModel(None, genotypes[i], inpt_perc_increase=inpt_perc_increase,
+                               params=(param_sets[0, ..., i], param_sets[1, ..., i]))
+        groups.setdefault(model.n_species, []).append((i, model))
+
+    kwargs = dict(dict(method="ros2", rtol=1e-5, atol=1e-8, max_steps=5000), **kwargs)
+    for members in groups.values():
+        for start in range(0, len(members), chunksize):
+            chunk = members[start:start + chunksize]
+            idx = np.array([i for i, _ in chunk])
+            stack = TopologyStack.from_topologies(CompiledTopology(m.n_species, *m._sequential_topology())
+                                                  for _, m in chunk)
+            k_cat = np.moveaxis(param_sets[0][..., idx], -1, 0)
+            K_hill = np.moveaxis(param_sets[1][..., idx], -1, 0)
+            # the time points, input and initial state only depend on the number of species
+            rewards[idx] = chunk[0][1]._score_batch(stack, k_cat, K_hill, **kwargs)
+    return rewards
+
+
 import matplotlib.pyplot as plt
 def plot_dynamics(out):
     plt.plot(out[:,0], label='A')
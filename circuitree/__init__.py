@@ -1,5 +1,15 @@
+from .checkpoint import *
 from .circuitree import *
+from .design_space import *
+from .early_stopping import *
+from .enumeration import *
+from .executors import *
+from .export import *
 from .grammar import *
+from .journal import *
 from .models import *
 from .modularity import *
+from .reward_cache import *
+from .serialization import *
 from .utils import *
+from .virtual_loss import *
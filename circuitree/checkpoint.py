@@ -0,0 +1,353 @@
+"""Checkpointing of the search graph during long-running searches."""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from io import BytesIO
+import os
+from pathlib import Path
+from time import perf_counter
+from typing import (
+    TYPE_CHECKING,
+    ContextManager,
+    Hashable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+)
+import networkx as nx
+import numpy as np
+
+from .design_space import (
+    DesignSpace,
+    save_graph_columnar,
+    save_space_columnar,
+)
+
+if TYPE_CHECKING:
+    from .circuitree import CircuiTree
+
+__all__ = [
+    "BackgroundCheckpointer",
+    "CheckpointStats",
+    "DeltaCheckpointer",
+    "load_delta_checkpoint",
+    "load_delta_space",
+    "read_deltas",
+]
+
+SNAPSHOT_NAME = "snapshot.ctree"
+DELTA_LOG_NAME = "deltas.log"
+
+
+def is_delta_checkpoint(path: str | Path) -> bool:
+    path = Path(path)
+    return path.joinpath(SNAPSHOT_NAME).exists()
+
+
+class DeltaCheckpointer:
+    """
+    DeltaCheckpointer
+    =================
+    Writes incremental checkpoints of a CircuiTree's search graph to a directory. The
+    first call to ``save()`` writes a full columnar snapshot of the graph. Subsequent
+    calls append a compact record of only the nodes and edges modified since the last
+    save to a log file, so the cost of a checkpoint is proportional to the work done
+    since the previous one rather than to the size of the tree. Every
+    ``compact_every`` deltas, the log is compacted into a new full snapshot.
+
+    Records store the current (absolute) visits and reward of each modified node and
+    edge, so replaying them is idempotent. A checkpoint directory can be loaded with
+    ``load_delta_checkpoint()`` or ``CircuiTree.from_file()``.
+
+    Example usage as a search callback::
+
+        checkpointer = DeltaCheckpointer("./search.ckpt", compact_every=20)
+
+        def save_callback(tree, iteration, *args):
+            if iteration % 500 == 0:
+                checkpointer.save(tree)
+    """
+
+    def __init__(self, directory: str | Path, compact_every: int = 10):
+        self.directory = Path(directory)
+        self.compact_every = compact_every
+        self.n_deltas = 0
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.directory.joinpath(SNAPSHOT_NAME)
+
+    @property
+    def log_path(self) -> Path:
+        return self.directory.joinpath(DELTA_LOG_NAME)
+
+    def save(self, tree: "CircuiTree", compact: bool = False) -> Path:
+        """Save the changes to the tree's graph since the last call. Writes a full
+        snapshot instead if there is no snapshot yet, if the log has reached
+        ``compact_every`` deltas, or if ``compact`` is True. Returns the path written
+        to."""
+        needs_snapshot = (
+            compact
+            or tree._dirty_nodes is None
+            or not self.snapshot_path.exists()
+            or self.n_deltas >= self.compact_every
+        )
+        if needs_snapshot:
+            return self.write_snapshot(tree)
+
+        nodes, edges = tree.pop_changes()
+        self.write_delta(tree.graph, nodes, edges)
+        return self.log_path
+
+    def write_snapshot(self, tree: "CircuiTree") -> Path:
+        """Write a full snapshot of the graph and truncate the delta log."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tree.track_changes()
+        tree.pop_changes()
+
+        # Remove the log first. Replaying old deltas onto a newer snapshot would
+        # roll back its statistics, while an old snapshot without its deltas is
+        # merely stale.
+        self.log_path.unlink(missing_ok=True)
+        save_graph_columnar(tree.graph, self.snapshot_path)
+        self.n_deltas = 0
+        return self.snapshot_path
+
+    def write_delta(
+        self,
+        graph: nx.DiGraph,
+        nodes: Iterable[Hashable],
+        edges: Iterable[tuple[Hashable, Hashable]],
+    ) -> None:
+        """Append a record with the current visits and reward of the given nodes and
+        edges to the log."""
+        nodes = list(nodes)
+        edges = list(edges)
+        node_attrs = [graph.nodes[n] for n in nodes]
+        edge_attrs = [graph.edges[e] for e in edges]
+        columns = [
+            np.array([str(n) for n in nodes], dtype=str),
+            np.array([a["visits"] for a in node_attrs], dtype=np.int64),
+            np.array([a["reward"] for a in node_attrs], dtype=np.float64),
+            np.array([(str(p), str(c)) for p, c in edges], dtype=str).reshape(-1, 2),
+            np.array([a["visits"] for a in edge_attrs], dtype=np.int64),
+            np.array([a["reward"] for a in edge_attrs], dtype=np.float64),
+        ]
+
+        # Write the whole record at once so that a crash cannot leave a partial
+        # record in the middle of the log
+        buffer = BytesIO()
+        for column in columns:
+            np.save(buffer, column)
+        with self.log_path.open("ab") as f:
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        self.n_deltas += 1
+
+
+def read_deltas(log_path: str | Path) -> Iterator[tuple[np.ndarray, ...]]:
+    """Yield the records in a delta log as tuples of arrays (node names, node visits,
+    node rewards, edges as name pairs, edge visits, edge rewards). An incomplete
+    record at the end of the log is ignored."""
+    log_path = Path(log_path)
+    if not log_path.exists():
+        return
+    with log_path.open("rb") as f:
+        end = os.fstat(f.fileno()).st_size
+        while f.tell() < end:
+            try:
+                record = tuple(np.load(f) for _ in range(6))
+            except (ValueError, EOFError, OSError):
+                return
+            yield record
+
+
+def _find(keys: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Returns the index of each query in `keys`, or -1 if it is not present."""
+    if len(keys) == 0:
+        return np.full(len(queries), -1, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    pos = np.searchsorted(keys, queries, sorter=order)
+    ids = order[np.minimum(pos, len(keys) - 1)]
+    return np.where(keys[ids] == queries, ids, -1)
+
+
+def _last_occurrences(keys: np.ndarray) -> np.ndarray:
+    """Returns the index of the last occurrence of each distinct key, in order."""
+    _, reverse_idx = np.unique(keys[::-1], return_index=True, axis=0)
+    return np.sort(len(keys) - 1 - reverse_idx)
+
+
+def load_delta_space(
+    directory: str | Path,
+    mmap_mode: Optional[str] = None,
+    columns: Optional[Iterable[str]] = None,
+) -> DesignSpace:
+    """Load a directory written by ``DeltaCheckpointer`` as a DesignSpace, by loading
+    the latest snapshot and merging the logged deltas into its arrays. If `columns`
+    is given, only those statistics columns are read from the snapshot (see
+    ``DesignSpace.load()``)."""
+    directory = Path(directory)
+    space = DesignSpace.load(
+        directory.joinpath(SNAPSHOT_NAME), mmap_mode=mmap_mode, columns=columns
+    )
+    records = list(read_deltas(directory.joinpath(DELTA_LOG_NAME)))
+    if not records:
+        return space
+
+    # Later records hold the latest statistics, so only the last one is kept
+    nodes, node_visits, node_reward, edges, edge_visits, edge_reward = (
+        np.concatenate(column) for column in zip(*records)
+    )
+    keep = _last_occurrences(nodes)
+    nodes, node_visits, node_reward = nodes[keep], node_visits[keep], node_reward[keep]
+    keep = _last_occurrences(edges)
+    edges, edge_visits, edge_reward = edges[keep], edge_visits[keep], edge_reward[keep]
+
+    # Append nodes that are new since the snapshot, including edge endpoints
+    states = space.states
+    names = np.concatenate([nodes, edges.ravel()])
+    new_names = names[_find(states, names) < 0]
+    if new_names.size:
+        new_names = new_names[np.sort(np.unique(new_names, return_index=True)[1])]
+        states = np.concatenate([states, new_names])
+    n_new = len(states) - space.n_nodes
+    node_ids = _find(states, nodes)
+    edge_ids = _find(states, edges.ravel()).reshape(-1, 2)
+
+    # Append edges that are new since the snapshot
+    old_keys = (space.edges[:, 0] << 32) | space.edges[:, 1]
+    idx = _find(old_keys, (edge_ids[:, 0] << 32) | edge_ids[:, 1])
+    is_new = idx < 0
+    idx[is_new] = space.n_edges + np.arange(is_new.sum())
+
+    merged = DesignSpace(
+        states,
+        np.concatenate([space.edges, edge_ids[is_new]]),
+        node_visits=np.concatenate([space.node_visits, np.zeros(n_new, np.int64)]),
+        node_reward=np.concatenate([space.node_reward, np.zeros(n_new)]),
+        edge_visits=np.concatenate([space.edge_visits, np.zeros(is_new.sum(), np.int64)]),
+        edge_reward=np.concatenate([space.edge_reward, np.zeros(is_new.sum())]),
+    )
+    merged.node_visits[node_ids] = node_visits
+    merged.node_reward[node_ids] = node_reward
+    merged.edge_visits[idx] = edge_visits
+    merged.edge_reward[idx] = edge_reward
+    return merged
+
+
+def load_delta_checkpoint(directory: str | Path) -> nx.DiGraph:
+    """Load a search graph from a directory written by ``DeltaCheckpointer``, by
+    loading the latest snapshot and replaying the logged deltas on top of it. To keep
+    the snapshot memory-mapped, use ``load_delta_space()`` instead."""
+    return load_delta_space(directory).to_networkx()
+
+
+@dataclass
+class CheckpointStats:
+    """Timing and size of one checkpoint. ``snapshot_seconds`` is the time spent
+    copying the graph in the calling thread, ``write_seconds`` the time spent
+    writing in the background, and ``latency_seconds`` the time from the request to
+    the checkpoint being on disk."""
+
+    path: Path
+    snapshot_seconds: float
+    write_seconds: float
+    latency_seconds: float
+    bytes_written: int
+
+
+class BackgroundCheckpointer:
+    """
+    BackgroundCheckpointer
+    ======================
+    Saves checkpoints of a CircuiTree's search graph without waiting for them to be
+    written. A call to ``save()`` takes an array snapshot of the graph (a
+    ``DesignSpace`` copy of its structure and statistics) in the calling thread and
+    then writes it in the columnar ``.ctree`` format from a background thread while
+    the search continues.
+
+    The snapshot must not race with updates to the graph. Calling ``save()`` from a
+    search callback is safe, since the search thread is busy taking the snapshot. If
+    other threads modify the tree, pass a ``context`` that excludes them while the
+    snapshot is taken, such as a ``threading.Lock`` they also hold during updates or
+    the ``backup_context()`` of a ``parallel_utils.ManagedEvent`` they wait on.
+
+    Only one save is in flight at a time. If a save is requested while the previous
+    one is still being written, ``on_busy="wait"`` blocks until it finishes
+    (back-pressure), while ``on_busy="skip"`` drops the new request. The timing and
+    size of each completed checkpoint are recorded in ``history``.
+    """
+
+    def __init__(self, on_busy: Literal["wait", "skip"] = "wait"):
+        if on_busy not in ("wait", "skip"):
+            raise ValueError("Argument `on_busy` must be `wait` or `skip`.")
+        self.on_busy = on_busy
+        self.history: list[CheckpointStats] = []
+        self.n_skipped = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._in_flight: Optional[Future] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._in_flight is not None and not self._in_flight.done()
+
+    def save(
+        self,
+        tree: "CircuiTree",
+        path: str | Path,
+        context: Optional[ContextManager] = None,
+    ) -> Optional[Future]:
+        """Snapshot the tree's graph and write it to `path` in the background. If a
+        `context` manager is given, the snapshot is taken inside it. Returns a Future
+        that resolves to the CheckpointStats, or None if the save was skipped because
+        the previous one is still in flight."""
+        requested = perf_counter()
+        if self.busy:
+            if self.on_busy == "skip":
+                self.n_skipped += 1
+                return None
+            self._in_flight.result()
+
+        with nullcontext() if context is None else context:
+            space = DesignSpace.from_networkx(tree.graph)
+        snapshot_seconds = perf_counter() - requested
+        self._in_flight = self._executor.submit(
+            self._write, space, path, tree.root, requested, snapshot_seconds
+        )
+        return self._in_flight
+
+    def _write(
+        self,
+        space: DesignSpace,
+        path: str | Path,
+        root: Hashable,
+        requested: float,
+        snapshot_seconds: float,
+    ) -> CheckpointStats:
+        write_start = perf_counter()
+        target = save_space_columnar(space, path, root=root)
+        end = perf_counter()
+        stats = CheckpointStats(
+            path=target,
+            snapshot_seconds=snapshot_seconds,
+            write_seconds=end - write_start,
+            latency_seconds=end - requested,
+            bytes_written=sum(f.stat().st_size for f in target.iterdir()),
+        )
+        self.history.append(stats)
+        return stats
+
+    def wait(self) -> Optional[CheckpointStats]:
+        """Block until the save in flight (if any) is written and return its stats."""
+        if self._in_flight is None:
+            return None
+        return self._in_flight.result()
+
+    def close(self) -> None:
+        """Wait for the save in flight and stop the background thread."""
+        self.wait()
+        self._executor.shutdown()
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from functools import partial
 from itertools import cycle, chain, islice, repeat
 import json
@@ -8,10 +9,29 @@ import numpy as np
 import networkx as nx
 import pandas as pd
 from scipy import stats
+from time import perf_counter
 import warnings
 
 from .modularity import tree_modularity, tree_modularity_estimate
 from .grammar import CircuitGrammar
+from .checkpoint import is_delta_checkpoint, load_delta_checkpoint, load_delta_space
+from .enumeration import enumerate_states_parallel, iter_terminal_states
+from .executors import RewardExecutor
+from .export import iter_edge_table, iter_node_table, write_table
+from .journal import IterationJournal
+from .early_stopping import EarlyStopping
+from .reward_cache import RewardCache
+from .virtual_loss import ConstantVirtualLoss, VirtualLoss
+from .serialization import is_attributes_dir, load_attributes, save_attributes
+from .design_space import (
+    DesignSpace,
+    DesignSpaceCache,
+    build_design_space,
+    is_columnar_graph,
+    load_graph_columnar,
+    load_space_columnar,
+    save_graph_columnar,
+)
 
 __all__ = ["CircuiTree"]
 
@@ -21,23 +41,35 @@ def ucb_score(
     parent,
     node,
     exploration_constant: Optional[float] = np.sqrt(2),
+    unobserved_visits: int = 0,
+    unobserved_parent_visits: int = 0,
     **kw,
 ):
+    """The UCB score of an edge. Visits whose rewards have not arrived yet
+    (`unobserved_visits` of the edge and `unobserved_parent_visits` of the parent)
+    count towards the exploration term, but not the mean reward."""
     attrs = graph.edges[parent, node]
 
-    visits = attrs["visits"]
+    observed_visits = attrs["visits"]
+    visits = observed_visits + unobserved_visits
     if visits == 0:
         return np.inf
     reward = attrs["reward"]
-    parent_visits = graph.nodes[parent]["visits"]
+    parent_visits = graph.nodes[parent]["visits"] + unobserved_parent_visits
 
-    mean_reward = reward / visits
+    # An edge whose only visits are in flight has no observed reward yet
+    mean_reward = reward / observed_visits if observed_visits else 0.0
     exploration_term = exploration_constant * np.sqrt(np.log(parent_visits) / visits)
     ucb = mean_reward + exploration_term
     return ucb
 
 
 class CircuiTree(ABC):
+    # Search graph, and the columns it is built from when loaded lazily with
+    # from_file(lazy=True)
+    _graph: Optional[nx.DiGraph] = None
+    _lazy_space: Optional[DesignSpace] = None
+
     def __init__(
         self,
         grammar: CircuitGrammar,
@@ -47,6 +79,9 @@ class CircuiTree(ABC):
         graph: Optional[nx.DiGraph] = None,
         tree_shape: Optional[Literal["tree", "dag"]] = None,
         compute_unique: bool = True,
+        reward_cache: Optional[RewardCache] = None,
+        virtual_loss: Optional[VirtualLoss] = None,
+        early_stopping: Optional[EarlyStopping] = None,
         **kwargs,
     ):
         # Initialize RNG
@@ -87,29 +122,119 @@ class CircuiTree(ABC):
         else:
             self.exploration_constant = exploration_constant
 
+        # Optional cache of rewards, see `reward_cache_key()`
+        self.reward_cache = reward_cache
+
+        # How selection paths are penalized while their rewards are evaluated
+        if virtual_loss is None:
+            virtual_loss = ConstantVirtualLoss(n_vl=1)
+        self.virtual_loss = virtual_loss
+
+        # Optional strategy that stops computing rewards for well-estimated states,
+        # see `early_stopping_key()`
+        self.early_stopping = early_stopping
+
         self._non_serializable_attrs = [
             "_non_serializable_attrs",
             "rg",
+            "reward_cache",
+            "virtual_loss",
+            "early_stopping",
             "graph",
+            "_graph",
+            "_lazy_space",
+            "_dirty_nodes",
+            "_dirty_edges",
         ]
 
+        # Nodes and edges modified since the last call to pop_changes(). Tracking is
+        # off (None) unless enabled with track_changes(), e.g. for delta checkpoints.
+        self._dirty_nodes: Optional[set] = None
+        self._dirty_edges: Optional[set] = None
+
         if kwargs.get('enumerate_topologies', False):
-            # todo: enumerate all topologies
-            self.grow_tree(str(root) if type(root) == np.ndarray else root)
-            self.unique_topologies = get_topologies_from_tree(np.array(self.graph.nodes))
+            # Enumerate the design space into arrays (or load it from the cache),
+            # then populate the graph from them so that saved trees contain it
+            self.design_space = self.grow_tree(
+                str(root) if type(root) == np.ndarray else root,
+                compact=True,
+                cache=kwargs.get("design_space_cache"),
+            )
+            self.design_space.to_networkx(self.graph)
+            self.unique_topologies = get_topologies_from_tree(self.design_space.states)
+            self._non_serializable_attrs.append("design_space")
 
 
     @abstractmethod
     def get_reward(self, state) -> float | int:
         raise NotImplementedError
 
+    @property
+    def graph(self) -> nx.DiGraph:
+        """The search graph. If the tree was loaded with `from_file(lazy=True)`, the
+        graph is built from the loaded columns the first time it is accessed."""
+        if self._graph is None and self._lazy_space is not None:
+            self._graph = self._lazy_space.to_networkx()
+            self._graph.root = self.root
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph: nx.DiGraph) -> None:
+        self._graph = graph
+
+    @property
+    def lazy_space(self) -> Optional[DesignSpace]:
+        """The columns loaded by `from_file(lazy=True)` as a DesignSpace, or None.
+        Read-only analyses (e.g. ranking states by reward) can use these arrays
+        directly without building the search graph."""
+        return self._lazy_space
+
+    def reward_cache_key(self, state: Hashable, *args, **kwargs) -> Optional[Hashable]:
+        """Returns the key under which the reward for a call to `get_reward()` with
+        the same arguments is stored in `reward_cache`, or None if the reward should
+        not be cached. Rewards are only cached if this is overridden to return a key
+        that determines the reward, e.g. the canonical state and a sample index."""
+        return None
+
+    def early_stopping_key(self, state: Hashable, *args, **kwargs) -> Hashable:
+        """Returns the key under which `early_stopping` pools the rewards of a call to
+        `get_reward()`. By default, all rewards of the same state are pooled."""
+        return state
+
+    def get_cached_reward(self, state: Hashable, *args, **kwargs) -> float | int:
+        """Calls `get_reward()`, first looking up the reward in `reward_cache` if one
+        is set and `reward_cache_key()` returns a key. If an `early_stopping` strategy
+        has stopped sampling the state, its estimated reward is returned instead."""
+        if self.early_stopping is None:
+            return self._get_cached_reward(state, *args, **kwargs)
+        key = self.early_stopping_key(state, *args, **kwargs)
+        if self.early_stopping.is_stopped(key):
+            return self.early_stopping.estimate(key)
+        reward = self._get_cached_reward(state, *args, **kwargs)
+        self.early_stopping.update(key, reward)
+        return reward
+
+    def _get_cached_reward(self, state: Hashable, *args, **kwargs) -> float | int:
+        if self.reward_cache is None:
+            return self.get_reward(state, *args, **kwargs)
+        key = self.reward_cache_key(state, *args, **kwargs)
+        if key is None:
+            return self.get_reward(state, *args, **kwargs)
+        return self.reward_cache.get_or_compute(
+            key, lambda: self.get_reward(state, *args, **kwargs)
+        )
+
     @property
     def default_attrs(self):
         return dict(visits=0, reward=0)
 
     @property
     def terminal_states(self):
-        return (node for node in self.graph.nodes if self.grammar.is_terminal(node))
+        if self._graph is None and self._lazy_space is not None:
+            nodes = self._lazy_space.states.tolist()
+        else:
+            nodes = self.graph.nodes
+        return (node for node in nodes if self.grammar.is_terminal(node))
 
     def _do_action(self, state: Hashable, action: Hashable):
         new_state = self.grammar.do_action(state, action)
@@ -212,10 +337,39 @@ class CircuiTree(ABC):
         if not self.graph.has_node(child):
             self.graph.add_node(child, **self.default_attrs)
         self.graph.add_edge(parent, child, **self.default_attrs)
+        if self._dirty_nodes is not None:
+            self._dirty_nodes.add(child)
+            self._dirty_edges.add((parent, child))
+
+    def track_changes(self, enable: bool = True) -> None:
+        """Start (or stop) recording which nodes and edges of the graph are modified
+        during search. Used to write checkpoints that contain only the changes since
+        the last save (see `checkpoint.DeltaCheckpointer`)."""
+        if not enable:
+            self._dirty_nodes = None
+            self._dirty_edges = None
+        elif self._dirty_nodes is None:
+            self._dirty_nodes = set()
+            self._dirty_edges = set()
+
+    def pop_changes(self) -> tuple[set[Hashable], set[tuple[Hashable, Hashable]]]:
+        """Return the nodes and edges modified since the last call and reset them."""
+        if self._dirty_nodes is None:
+            raise RuntimeError("Changes are not being tracked. Call track_changes().")
+        nodes, edges = self._dirty_nodes, self._dirty_edges
+        self._dirty_nodes = set()
+        self._dirty_edges = set()
+        return nodes, edges
 
     def get_ucb_score(self, parent, child):
         if self.graph.has_edge(parent, child):
-            return ucb_score(self.graph, parent, child, self.exploration_constant)
+            return ucb_score(
+                self.graph,
+                parent,
+                child,
+                self.exploration_constant,
+                *self.virtual_loss.unobserved_visits(parent, child),
+            )
         else:
             return np.inf
 
@@ -230,19 +384,24 @@ class CircuiTree(ABC):
             child = parent
             self.graph.nodes[child][attr] += value
 
+        if self._dirty_nodes is not None:
+            self._dirty_nodes.update(path)
+            self._dirty_edges.update(zip(path[:-1], path[1:]))
+
     def backpropagate_visit(self, selection_path: list) -> None:
         """Update the visit count for each node and edge in the selection path.
         Visit update happens before simulation and reward calculation, so until the
         reward is computed and backpropagated, there is 'virtual loss' on each node in
-        the selection path."""
-        self._backpropagate(selection_path, "visits", 1)
+        the selection path. How the loss is applied is set by the `virtual_loss`
+        strategy (by default, one visit with zero reward)."""
+        self.virtual_loss.apply(self, selection_path)
 
     def backpropagate_reward(self, selection_path: list, reward: float | int):
         """Update the reward for each node and edge in the selection path.
         Visit update happens before simulation and reward calculation, so until the
         reward is computed and backpropagated, there is 'virtual loss' on each node in
-        the selection path."""
-        self._backpropagate(selection_path, "reward", reward)
+        the selection path. The `virtual_loss` strategy removes it here."""
+        self.virtual_loss.complete(self, selection_path, reward)
 
     def traverse(self, **kwargs):
         # Select the next state to sample and the terminal state to be simulated.
@@ -252,20 +411,64 @@ class CircuiTree(ABC):
 
         # Between backprop of visit and reward, we incur virtual loss
         self.backpropagate_visit(selection_path)
-        reward = self.get_reward(sim_node, **kwargs)
+        reward = self.get_cached_reward(sim_node, **kwargs)
         self.backpropagate_reward(selection_path, reward)
 
         return selection_path, reward, sim_node
 
     def grow_tree(
-        self, root=None, n_visits: int = 0, print_updates=False, print_every=1000
+        self,
+        root=None,
+        n_visits: int = 0,
+        print_updates=False,
+        print_every=1000,
+        nprocs: int = 1,
+        compact: bool = False,
+        cache: Optional[DesignSpaceCache | str | Path] = None,
     ):  #len(self.graph.nodes)
+        """Add every state reachable from `root` to the search graph. If `compact` is
+        True, the graph is left unchanged and the design space is instead returned as
+        a DesignSpace of edge-list arrays, which can be converted with
+        `DesignSpace.to_networkx()` when needed.
+
+        If a `cache` (a DesignSpaceCache or a cache directory) is given, the design
+        space is loaded from it if available, and stored in it otherwise."""
+        if cache is not None:
+            if not isinstance(cache, DesignSpaceCache):
+                cache = DesignSpaceCache(cache)
+            space = cache.get_or_build(
+                self.grammar,
+                self.root if root is None else root,
+                compute_unique=self.compute_unique,
+                n_visits=n_visits,
+                nprocs=nprocs,
+            )
+            if compact:
+                return space
+            if root is None:
+                self.graph.add_node(self.root, visits=n_visits, reward=0)
+            space.to_networkx(self.graph)
+            return
+
+        if compact:
+            return build_design_space(
+                self.grammar,
+                self.root if root is None else root,
+                compute_unique=self.compute_unique,
+                n_visits=n_visits,
+                nprocs=nprocs,
+            )
+
         if root is None:
             root = self.root
             if print_updates:
                 print(f"Adding root: {root}")
             self.graph.add_node(root, visits=n_visits, reward=0)
 
+        if nprocs > 1:
+            self._grow_tree_parallel(root, n_visits, nprocs, progress=print_updates)
+            return
+
         stack = [(root, action) for action in self.grammar.get_actions(root)]
         n_added = 1
         # stack is a list of entries, evaluates to true while there are still entries
@@ -289,6 +492,29 @@ class CircuiTree(ABC):
                 if not self.graph.has_edge(node, next_node):
                     self.graph.add_edge(node, next_node, visits=n_visits, reward=0)
 
+    def _grow_tree_parallel(
+        self, root: Hashable, n_visits: int, nprocs: int, progress: bool = False
+    ):
+        """Add the whole design space below `root` to the graph, enumerating it with
+        multiple processes. Existing nodes and edges keep their attributes."""
+        states, edges = enumerate_states_parallel(
+            self.grammar,
+            root,
+            compute_unique=self.compute_unique,
+            nprocs=nprocs,
+            progress=progress,
+        )
+        self.graph.add_nodes_from(
+            (s, dict(visits=n_visits, reward=0))
+            for s in states[1:]
+            if s not in self.graph
+        )
+        self.graph.add_edges_from(
+            (p, c, dict(visits=n_visits, reward=0))
+            for p, c in edges
+            if not self.graph.has_edge(p, c)
+        )
+
     def bfs_iterator(self, root=None, shuffle=False):
         root = self.root if root is None else root
         layers = (l for l in nx.bfs_layers(self.graph, root))
@@ -346,6 +572,8 @@ class CircuiTree(ABC):
             self.graph.nodes[node]["visits"] += 1
             reward = self.get_reward(node, **run_kwargs)
             self.graph.nodes[node]["reward"] += reward
+            if self._dirty_nodes is not None:
+                self._dirty_nodes.add(node)
 
             if callback is not None and i % callback_every == 0:
                 _ = callback(self.graph, node, reward)
@@ -358,7 +586,11 @@ class CircuiTree(ABC):
         progress_bar: bool = False,
         run_kwargs: Optional[dict] = None,
         callback_before_start: bool = True,
+        journal: Optional[IterationJournal] = None,
     ) -> None:
+        """Run `n_steps` iterations of MCTS. If a `journal` is given, every iteration
+        is recorded to it (see `journal.IterationJournal`), and it is flushed when
+        the search finishes."""
 
         # Optionally set up a progress bar
         if progress_bar:
@@ -374,21 +606,36 @@ class CircuiTree(ABC):
 
         # Run the search
         run_kwargs = {} if run_kwargs is None else run_kwargs
+        self.virtual_loss.reset_metrics()
         print(f"Starting MCTS search with {n_steps} iterations.")
         if callback is None:
-            self._run_mcts(self, iterator, **run_kwargs)
+            self._run_mcts(self, iterator, journal=journal, **run_kwargs)
         else:
             self._run_mcts_with_callback(
-                self, iterator, callback, callback_every, **run_kwargs
+                self, iterator, callback, callback_every, journal=journal, **run_kwargs
             )
+        if journal is not None:
+            journal.flush()
         return
 
     @staticmethod
-    def _run_mcts(tree: "CircuiTree", iterator: Iterable[int], **kwargs) -> None:
+    def _run_mcts(
+        tree: "CircuiTree",
+        iterator: Iterable[int],
+        journal: Optional[IterationJournal] = None,
+        thread_idx: int = 0,
+        **kwargs,
+    ) -> None:
         """Run the MCTS search algorithm on the given CircuiTree object. Can be used to
-        run the search in parallel threads or processes."""
-        for _ in iterator:
-            tree.traverse(**kwargs)
+        run the search in parallel threads or processes, in which case `thread_idx`
+        identifies the thread in the journal."""
+        if journal is None:
+            for _ in iterator:
+                tree.traverse(**kwargs)
+        else:
+            for _ in iterator:
+                selection_path, reward, sim_node = tree.traverse(**kwargs)
+                journal.record(selection_path, sim_node, reward, thread_idx)
 
     @staticmethod
     def _run_mcts_with_callback(
@@ -396,13 +643,18 @@ class CircuiTree(ABC):
         iterator: Iterable[int],
         callback: Optional[Callable],
         callback_every: int,
+        journal: Optional[IterationJournal] = None,
+        thread_idx: int = 0,
         **kwargs,
     ) -> None:
         """Run the MCTS search algorithm on the given CircuiTree object, calling a
         callback function every `callback_every` iterations. Can be used to run the
-        search in parallel threads or processes."""
+        search in parallel threads or processes, in which case `thread_idx`
+        identifies the thread in the journal."""
         for i in iterator:
             selection_path, reward, sim_node = tree.traverse(**kwargs)
+            if journal is not None:
+                journal.record(selection_path, sim_node, reward, thread_idx)
             if callback is not None and i % callback_every == 0:
                 callback(tree, i, selection_path, sim_node, reward)
 
@@ -415,6 +667,7 @@ class CircuiTree(ABC):
         callback_before_start: bool = True,
         run_kwargs: Optional[dict] = None,
         logger: Optional[Any] = None,
+        journal: Optional[IterationJournal] = None,
     ) -> None:
 
         # Check if the `gevent` package is installed
@@ -435,6 +688,7 @@ class CircuiTree(ABC):
                 callback_every=callback_every,
                 callback=callback,
                 run_kwargs=run_kwargs,
+                journal=journal,
             )
             return
 
@@ -459,12 +713,20 @@ class CircuiTree(ABC):
         if logger is not None:
             run_kwargs["logger"] = logger
             logger.info()
+        self.virtual_loss.reset_metrics()
         print(start_msg)
 
         if callback is None:
             gthreads = [
-                gevent.spawn(self._run_mcts, self, range(n), **run_kwargs)
-                for n in n_per_thread
+                gevent.spawn(
+                    self._run_mcts,
+                    self,
+                    range(n),
+                    journal=journal,
+                    thread_idx=thread_idx,
+                    **run_kwargs,
+                )
+                for thread_idx, n in enumerate(n_per_thread)
             ]
             gevent.joinall(gthreads)
         else:
@@ -475,14 +737,173 @@ class CircuiTree(ABC):
                     range(n),
                     callback,
                     callback_every,
+                    journal=journal,
+                    thread_idx=thread_idx,
                     **run_kwargs,
                 )
-                for n in n_per_thread
+                for thread_idx, n in enumerate(n_per_thread)
             ]
             gevent.joinall(gthreads)
 
+        if journal is not None:
+            journal.flush()
         return
 
+    def _next_reward_args(self, state: Hashable) -> tuple:
+        """Positional arguments passed to `get_reward()` after the state."""
+        return ()
+
+    def _submit_reward(
+        self, executor: RewardExecutor, state: Hashable, *args, **kwargs
+    ) -> Future:
+        """Submit a reward evaluation, serving it from `early_stopping` or
+        `reward_cache` if possible."""
+        if self.early_stopping is not None:
+            stopping_key = self.early_stopping_key(state, *args, **kwargs)
+            if self.early_stopping.is_stopped(stopping_key):
+                future = Future()
+                future.set_result(self.early_stopping.estimate(stopping_key))
+                return future
+            future = self._submit_cached_reward(executor, state, *args, **kwargs)
+            stopping = self.early_stopping
+            future.add_done_callback(
+                lambda f: f.exception() is None
+                and stopping.update(stopping_key, f.result())
+            )
+            return future
+        return self._submit_cached_reward(executor, state, *args, **kwargs)
+
+    def _submit_cached_reward(
+        self, executor: RewardExecutor, state: Hashable, *args, **kwargs
+    ) -> Future:
+        key = None
+        if self.reward_cache is not None:
+            key = self.reward_cache_key(state, *args, **kwargs)
+        if key is not None and (reward := self.reward_cache.get(key)) is not None:
+            future = Future()
+            future.set_result(reward)
+            return future
+
+        future = executor.submit_reward(self, state, *args, **kwargs)
+        if key is not None:
+            cache = self.reward_cache
+            future.add_done_callback(
+                lambda f: f.exception() is None and cache.put(key, f.result())
+            )
+        return future
+
+    def search_mcts_async(
+        self,
+        n_steps: int,
+        executor: RewardExecutor,
+        max_in_flight: int = 1,
+        timeout: Optional[float] = None,
+        callback: Optional[Callable] = None,
+        callback_every: int = 1,
+        run_kwargs: Optional[dict] = None,
+        journal: Optional[IterationJournal] = None,
+    ) -> None:
+        """Run `n_steps` iterations of MCTS, evaluating rewards with an `executor`
+        (see `executors.RewardExecutor`) instead of inline. Up to `max_in_flight`
+        evaluations are submitted at once, and each reward is backpropagated as soon
+        as it completes, in whatever order evaluations finish. Until then, its
+        selection path carries a virtual loss (see `backpropagate_visit()`).
+
+        If `timeout` is given, an evaluation that has been running for more than
+        `timeout` seconds is abandoned: it is cancelled if possible, its visits are
+        removed from the tree, and it counts towards `n_steps` without a reward.
+
+        If an evaluation raises an exception, the pending evaluations are cancelled
+        (those already running are left to finish, but their rewards are
+        discarded), the virtual loss of every unfinished selection path is removed
+        from the tree, and the exception is re-raised.
+
+        The callback is called as in `search_mcts`, as each reward is completed.
+        The rate at which concurrent selections collide on a state that is already
+        being evaluated is available from `tree.virtual_loss.metrics()`."""
+        if max_in_flight < 1:
+            raise ValueError("Argument `max_in_flight` must be at least 1.")
+        run_kwargs = {} if run_kwargs is None else run_kwargs
+        self.virtual_loss.reset_metrics()
+        print(
+            f"Starting MCTS search with {n_steps} iterations "
+            f"({max_in_flight} evaluations in flight)."
+        )
+
+        # Maps each pending evaluation to its selection path, simulated state, and
+        # submission time
+        in_flight: dict[Future, tuple[list, Hashable, float]] = {}
+        n_submitted = 0
+        n_completed = 0
+        n_timed_out = 0
+        while n_completed < n_steps:
+            while n_submitted < n_steps and len(in_flight) < max_in_flight:
+                selection_path = self.select_and_expand()
+                sim_node = self.get_random_terminal_descendant(selection_path[-1])
+                self.backpropagate_visit(selection_path)
+                args = self._next_reward_args(sim_node)
+                future = self._submit_reward(executor, sim_node, *args, **run_kwargs)
+                in_flight[future] = (selection_path, sim_node, perf_counter())
+                n_submitted += 1
+
+            # Wait for the next evaluation to finish or for the oldest to expire
+            wait_time = None
+            if timeout is not None:
+                oldest = min(submitted for _, _, submitted in in_flight.values())
+                wait_time = max(0.0, oldest + timeout - perf_counter())
+            done, _ = wait(in_flight, timeout=wait_time, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                selection_path, sim_node, _ = in_flight.pop(future)
+                try:
+                    reward = future.result()
+                except BaseException:
+                    # Leave the tree as if the failed and pending evaluations had
+                    # never been selected, then propagate the error
+                    self.virtual_loss.cancel(self, selection_path)
+                    self._abandon_evaluations(in_flight)
+                    if journal is not None:
+                        journal.flush()
+                    raise
+                self.backpropagate_reward(selection_path, reward)
+                if journal is not None:
+                    journal.record(selection_path, sim_node, reward)
+                if callback is not None and n_completed % callback_every == 0:
+                    callback(self, n_completed, selection_path, sim_node, reward)
+                n_completed += 1
+
+            if timeout is not None:
+                now = perf_counter()
+                expired = [
+                    f for f, (*_, submitted) in in_flight.items()
+                    if now - submitted > timeout
+                ]
+                for future in expired:
+                    future.cancel()
+                    selection_path, *_ = in_flight.pop(future)
+                    self.virtual_loss.cancel(self, selection_path)
+                    n_timed_out += 1
+                    n_completed += 1
+
+        if journal is not None:
+            journal.flush()
+        if n_timed_out:
+            warnings.warn(
+                f"{n_timed_out} of {n_steps} reward evaluations timed out after "
+                f"{timeout} s and were abandoned."
+            )
+        return
+
+    def _abandon_evaluations(
+        self, in_flight: dict[Future, tuple[list, Hashable, float]]
+    ) -> None:
+        """Cancel the pending evaluations of an asynchronous search and remove their
+        visits from the tree."""
+        for future, (selection_path, *_) in in_flight.items():
+            future.cancel()
+            self.virtual_loss.cancel(self, selection_path)
+        in_flight.clear()
+
     def is_success(self, state: Hashable) -> bool:
         """Returns whether or not a state is successful. Used to infer which patterns
         lead to more successes (i.e. motif candidates)."""
@@ -492,6 +913,64 @@ class CircuiTree(ABC):
         """Return a shallow copy of the graph. Use copy.deepcopy() for a deep copy."""
         return self.graph.copy()
 
+    def _export_source(self) -> DesignSpace | nx.DiGraph:
+        # Export the loaded columns of a lazily loaded tree without building the graph
+        if self._graph is None and self._lazy_space is not None:
+            return self._lazy_space
+        return self.graph
+
+    def _success_for_export(self, success: bool) -> Optional[Callable]:
+        # The "success" column is omitted if `is_success` is not implemented
+        if success and type(self).is_success is not CircuiTree.is_success:
+            return self.is_success
+        return None
+
+    def to_tables(
+        self, success: bool = True
+    ) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        """Return the node and edge tables of the search graph as dicts of column
+        arrays, which can be passed directly to `pd.DataFrame`.
+
+        The node table has columns "state", "visits", "reward", "depth" (number of
+        moves from the root, or -1 if unknown), "terminal", and "success" (if `success` is True and
+        `is_success` is implemented; False for non-terminal states). The edge table
+        has columns "parent", "child", "visits", and "reward"."""
+        source = self._export_source()
+        is_success = self._success_for_export(success)
+        nodes = next(
+            iter_node_table(source, self.root, self.grammar.is_terminal, is_success)
+        )
+        edges = next(iter_edge_table(source))
+        return nodes, edges
+
+    def export_tables(
+        self,
+        path: str | Path,
+        format: Literal["parquet", "feather"] = "parquet",
+        chunksize: int = 1_000_000,
+        success: bool = True,
+    ) -> tuple[Path, Path]:
+        """Write the node and edge tables (see `to_tables`) to `{path}_nodes` and
+        `{path}_edges` Parquet or Feather files (with the format's extension
+        appended), which requires `pyarrow`. Rows are read from the graph, or from
+        the loaded columns of a lazily loaded tree, and written in chunks of
+        `chunksize` rows to bound peak memory for large trees. Returns the paths to
+        the node and edge files."""
+        path = Path(path)
+        source = self._export_source()
+        is_success = self._success_for_export(success)
+        node_chunks = iter_node_table(
+            source, self.root, self.grammar.is_terminal, is_success, chunksize
+        )
+        nodes_target = write_table(
+            node_chunks, path.parent / f"{path.name}_nodes", format=format
+        )
+        edge_chunks = iter_edge_table(source, chunksize)
+        edges_target = write_table(
+            edge_chunks, path.parent / f"{path.name}_edges", format=format
+        )
+        return nodes_target, edges_target
+
     def get_attributes(self, attrs_copy: Optional[Iterable[str]]) -> dict:
         """Return a dictionary of the object's attributes. If `attrs_copy` is not
         provided, all attributes are returned except those in the
@@ -532,6 +1011,8 @@ class CircuiTree(ABC):
         json_file: Optional[str | Path] = None,
         save_attrs: Optional[Iterable[str]] = None,
         compress: bool = False,
+        format: Literal["gml", "columnar"] = "gml",
+        attrs_format: Literal["npz", "typed"] = "npz",
         **kwargs,
     ):
         """Save the CircuiTree object to a gml file and optionally a json file
@@ -539,6 +1020,19 @@ class CircuiTree(ABC):
         specify which attributes to save. If `compress` is True, the gml file is
         compressed with gzip.
 
+        If `format` is "columnar", the graph is instead saved in a binary format: a
+        `.ctree` directory containing a table of node names and NumPy columns of
+        edges and of node and edge visits and rewards (see `DesignSpace`). This is
+        much faster to write and read than GML for large graphs and can be
+        memory-mapped when loading. Only the "visits" and "reward" attributes are
+        saved in this format.
+
+        If `attrs_format` is "typed", attributes are saved to a `.attrs` directory
+        with `serialization.save_attributes()` instead of an `.npz` file. Arrays are
+        stored natively, dicts of lists as CSR arrays, and counters as key/count
+        columns, with JSON only for small metadata. Nothing is pickled, and large
+        arrays can be memory-mapped rather than read into memory when loaded.
+
         A saved CircuiTree object can be loaded with the `from_file` class method.
 
         The grammar is saved by calling its `to_dict()` method, which returns a
@@ -547,11 +1041,18 @@ class CircuiTree(ABC):
         create the grammar object upon loading."""
 
         # Save the graph
-        if compress:
-            gml_target = Path(gml_file).with_suffix(".gml.gz")
+        if format == "columnar":
+            gml_target = save_graph_columnar(self.graph, gml_file)
+        elif format == "gml":
+            if compress:
+                gml_target = Path(gml_file).with_suffix(".gml.gz")
+            else:
+                gml_target = Path(gml_file).with_suffix(".gml")
+            nx.write_gml(self.graph, gml_target, **kwargs)
         else:
-            gml_target = Path(gml_file).with_suffix(".gml")
-        nx.write_gml(self.graph, gml_target, **kwargs)
+            raise ValueError(
+                f"Invalid format: {format}. Must be one of ['gml', 'columnar']."
+            )
 
         # Save the other attributes
         if json_file is not None:
@@ -560,6 +1061,13 @@ class CircuiTree(ABC):
             # with json_target.open("w") as f:
             #     json.dump(attrs, f, indent=4)
             # return npz_target
+            if attrs_format == "typed":
+                return gml_target, save_attributes(attrs, json_file)
+            elif attrs_format != "npz":
+                raise ValueError(
+                    f"Invalid attrs_format: {attrs_format}. "
+                    "Must be one of ['npz', 'typed']."
+                )
             npz_target = Path(json_file).with_suffix(".npz")
             np.savez(npz_target, **attrs)
             return gml_target, npz_target
@@ -572,12 +1080,35 @@ class CircuiTree(ABC):
         graph_gml: str | Path | None,
         attrs_json: Optional[str | Path] = None,
         attrs_npz: Optional[str | Path] =  None,
+        attrs_dir: Optional[str | Path] = None,
         grammar_cls: Optional[CircuitGrammar] = None,
         grammar_kwargs: Optional[dict] = None,
+        mmap_mode: Optional[str] = None,
+        lazy: bool = False,
+        columns: Optional[Iterable[str]] = None,
+        terminal_only: bool = False,
+        max_depth: Optional[int] = None,
         **kwargs,
     ):
         """Load a CircuiTree from a gml file and a JSON file containing the object's
-        attributes, typically saved with the `to_file` method.
+        attributes, typically saved with the `to_file` method. The graph can also be
+        a `.ctree` directory saved with `to_file(..., format="columnar")` or a
+        directory of delta checkpoints written by `checkpoint.DeltaCheckpointer`.
+
+        If `lazy` is True (columnar graphs and delta checkpoints only), the graph's
+        columns are loaded into a DesignSpace, available as `tree.lazy_space`, and
+        the networkx graph is only built the first time `tree.graph` is accessed.
+        The columns are memory-mapped with `mmap_mode` until then.
+        `columns` selects which statistics to load (any of "node_visits",
+        "node_reward", "edge_visits", "edge_reward"; default all). The nodes can be
+        restricted to terminal states with `terminal_only` and/or to states at most
+        `max_depth` moves from the root, in which case only the edges between the
+        remaining nodes are kept. This makes read-only analyses much faster to start
+        and lighter on memory.
+
+        Attributes saved with `to_file(..., attrs_format="typed")` are loaded from
+        the `.attrs` directory `attrs_dir` (or `attrs_npz`). Its arrays are
+        memory-mapped if `mmap_mode` is given (e.g. "r").
 
         The grammar attribute is loaded by looking for a key "grammar" in the JSON file,
         whose value should be a dict `grammar_kwargs` used to create a grammar object.
@@ -590,10 +1121,14 @@ class CircuiTree(ABC):
         if attrs_json is not None:
             with open(attrs_json, "r") as f:
                 kwargs.update(json.load(f))
+        if attrs_npz is not None and is_attributes_dir(attrs_npz):
+            attrs_dir, attrs_npz = attrs_npz, None
         if attrs_npz is not None:
             with np.load(attrs_npz, allow_pickle=True) as f:
                 for k, v in f.items():
                     kwargs[k] = v
+        if attrs_dir is not None:
+            kwargs.update(load_attributes(attrs_dir, mmap_mode=mmap_mode))
 
         # Make the grammar object
         # Get kwargs from the grammar_kwargs in this function and/or from the json
@@ -620,10 +1155,69 @@ class CircuiTree(ABC):
         grammar_kwargs.pop("_non_serializable_attrs", None)
 
         grammar = _grammar_cls(**grammar_kwargs)
-        graph = None if graph_gml is None else nx.read_gml(graph_gml)
+        if lazy:
+            return cls._from_file_lazy(
+                graph_gml,
+                grammar,
+                mmap_mode=mmap_mode,
+                columns=columns,
+                terminal_only=terminal_only,
+                max_depth=max_depth,
+                **kwargs,
+            )
+        elif columns is not None or terminal_only or max_depth is not None:
+            raise ValueError(
+                "Arguments `columns`, `terminal_only`, and `max_depth` require "
+                "`lazy=True`."
+            )
+
+        if graph_gml is None:
+            graph = None
+        elif is_delta_checkpoint(graph_gml):
+            graph = load_delta_checkpoint(graph_gml)
+        elif is_columnar_graph(graph_gml):
+            graph = load_graph_columnar(graph_gml)
+        else:
+            graph = nx.read_gml(graph_gml)
 
         return cls(grammar=grammar, graph=graph, **kwargs)
 
+    @classmethod
+    def _from_file_lazy(
+        cls,
+        graph_path: str | Path,
+        grammar: CircuitGrammar,
+        mmap_mode: Optional[str] = "r",
+        columns: Optional[Iterable[str]] = None,
+        terminal_only: bool = False,
+        max_depth: Optional[int] = None,
+        **kwargs,
+    ) -> "CircuiTree":
+        if graph_path is not None and is_delta_checkpoint(graph_path):
+            space = load_delta_space(graph_path, mmap_mode=mmap_mode, columns=columns)
+        elif graph_path is not None and is_columnar_graph(graph_path):
+            space = load_space_columnar(graph_path, mmap_mode=mmap_mode, columns=columns)
+        else:
+            raise ValueError(
+                "Lazy loading requires a columnar graph (`to_file(..., "
+                "format='columnar')`) or a delta checkpoint directory."
+            )
+
+        # The graph is replaced by the lazily built one
+        tree = cls(grammar=grammar, graph=nx.DiGraph(), **kwargs)
+        if terminal_only or max_depth is not None:
+            mask = np.ones(space.n_nodes, dtype=bool)
+            if max_depth is not None:
+                depth = space.depth(tree.root)
+                mask &= (depth >= 0) & (depth <= max_depth)
+            if terminal_only:
+                mask &= space.terminal_mask(grammar.is_terminal)
+            space = space.subset(mask)
+
+        tree._graph = None
+        tree._lazy_space = space
+        return tree
+
     def sample_terminal_states(
         self,
         n_samples: int,
@@ -856,41 +1450,80 @@ class CircuiTree(ABC):
 
         return samples
 
+    def iter_terminal_states(
+        self,
+        root: Optional[Hashable] = None,
+        visited: Optional[Any] = None,
+        max_iter: Optional[int] = None,
+    ) -> Iterable[Hashable]:
+        """Yield each terminal state reachable from the given root state once, without
+        holding the set of terminal states in memory. By default, visited states are
+        tracked with a packed ``StateHashSet``. To stream very large design spaces to
+        disk with checkpointing, see ``enumeration.write_terminal_states()``."""
+        root = self.root if root is None else root
+        return iter_terminal_states(
+            self.grammar,
+            root,
+            compute_unique=self.compute_unique,
+            visited=visited,
+            max_iter=max_iter,
+            do_action=self._do_action,
+        )
+
     def enumerate_terminal_states(
         self,
         root: Optional[Hashable] = None,
         progress: bool = False,
         max_iter: int = None,
+        nprocs: int = 1,
+        cache: Optional[DesignSpaceCache | str | Path] = None,
     ) -> Iterable[Hashable]:
-        """Enumerate all terminal states reachable from the given root state."""
+        """Enumerate all terminal states reachable from the given root state. If
+        `nprocs` > 1, the design space is enumerated in parallel and `max_iter` is
+        ignored. If a `cache` is given, the states are read from the cached design
+        space (see `grow_tree()`)."""
 
         root = self.root if root is None else root
-        max_iter = np.inf if max_iter is None else max_iter
+        if cache is not None:
+            space = self.grow_tree(root, compact=True, nprocs=nprocs, cache=cache)
+            terminal_set = set(
+                space.states[space.terminal_mask(self.grammar.is_terminal)].tolist()
+            )
+            print(f"Found {len(terminal_set)} terminal states.")
+            return terminal_set
+
+        if nprocs > 1:
+            states, _ = enumerate_states_parallel(
+                self.grammar,
+                root,
+                compute_unique=self.compute_unique,
+                nprocs=nprocs,
+                progress=progress,
+            )
+            terminal_set = set(filter(self.grammar.is_terminal, states))
+            print(f"Found {len(terminal_set)} terminal states.")
+            return terminal_set
+
         if progress:
             from tqdm import tqdm
 
             pbar = tqdm(max_iter, desc="Enumerating terminal states...")
             _callback = lambda: pbar.update(1)
         else:
-            _callback = lambda: None
-
-        # Use a post-order traversal to enumerate all terminal states
-        visited = set()
-        terminal_set = set()
-        stack = [root]
-        k = 0
-        while stack and k < max_iter:
-            state = stack.pop()
-            visited.add(state)
-            if self.grammar.is_terminal(state):
-                terminal_set.add(state)
-            else:
-                descendants = set(
-                    self._do_action(state, a) for a in self.grammar.get_actions(state)
-                )
-                stack.extend(descendants - visited)
-            k += 1
-            _callback()
+            _callback = None
+
+        # Use a depth-first traversal to enumerate all terminal states
+        terminal_set = set(
+            iter_terminal_states(
+                self.grammar,
+                root,
+                compute_unique=self.compute_unique,
+                visited=set(),
+                max_iter=max_iter,
+                callback=_callback,
+                do_action=self._do_action,
+            )
+        )
 
         print(f"Found {len(terminal_set)} terminal states.")
         return terminal_set
@@ -1259,6 +1892,9 @@ def contingency_test(
 
 def get_topologies_from_tree(top_arr):
     """ from array of topologies generated by grow_tree, return a list of unique topologies """
-    top_lst = [item.split("::")[1] for item in top_arr]
-    uniq_top_lst = list(set(top_lst))
-    return uniq_top_lst
+    top_arr = np.asarray(top_arr, dtype=str)
+    if top_arr.size == 0:
+        return []
+    # Split "components::interactions" for all states at once and keep the interactions
+    top_lst = np.char.partition(top_arr, "::")[:, 2]
+    return np.unique(top_lst).tolist()
@@ -0,0 +1,459 @@
+"""Compact, array-based representation of a search graph."""
+
+from array import array
+from functools import cached_property
+from hashlib import sha256
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Callable, Hashable, Iterable, Optional
+import networkx as nx
+import numpy as np
+
+from .enumeration import _expand_state, enumerate_states_parallel
+from .grammar import CircuitGrammar
+from .utils import replace_directory
+
+__all__ = [
+    "DesignSpace",
+    "build_design_space",
+    "DesignSpaceCache",
+    "save_graph_columnar",
+    "save_space_columnar",
+    "load_graph_columnar",
+    "load_space_columnar",
+]
+
+
+class DesignSpace:
+    """
+    DesignSpace
+    ===========
+    A search graph stored as flat arrays rather than a ``networkx.DiGraph``. Node ``i``
+    is the state ``states[i]`` and edge ``j`` connects ``edges[j, 0]`` (parent id) to
+    ``edges[j, 1]`` (child id). Visits and rewards are stored as columns aligned with
+    ``states`` and ``edges``.
+
+    Building a large design space this way is much faster and uses much less memory
+    than creating one attribute dict per node and edge. Call ``to_networkx()`` to
+    convert it to the graph format used during search.
+    """
+
+    _structure_columns = ("states", "edges")
+    _stats_columns = ("node_visits", "node_reward", "edge_visits", "edge_reward")
+
+    def __init__(
+        self,
+        states: np.ndarray,
+        edges: np.ndarray,
+        node_visits: Optional[np.ndarray] = None,
+        node_reward: Optional[np.ndarray] = None,
+        edge_visits: Optional[np.ndarray] = None,
+        edge_reward: Optional[np.ndarray] = None,
+    ):
+        self.states = np.asarray(states)
+        self.edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        n_nodes = len(self.states)
+        n_edges = len(self.edges)
+        self.node_visits = _column_or_zeros(node_visits, n_nodes, np.int64)
+        self.node_reward = _column_or_zeros(node_reward, n_nodes, np.float64)
+        self.edge_visits = _column_or_zeros(edge_visits, n_edges, np.int64)
+        self.edge_reward = _column_or_zeros(edge_reward, n_edges, np.float64)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.states)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edges)
+
+    def __repr__(self) -> str:
+        return f"DesignSpace(n_nodes={self.n_nodes}, n_edges={self.n_edges})"
+
+    @cached_property
+    def index(self) -> dict[str, int]:
+        """Mapping from each state to its node id."""
+        return {s: i for i, s in enumerate(self.states.tolist())}
+
+    def terminal_mask(self, is_terminal: Callable[[Hashable], bool]) -> np.ndarray:
+        """Boolean mask of the nodes that are terminal states."""
+        return np.fromiter(
+            (is_terminal(s) for s in self.states.tolist()),
+            dtype=bool,
+            count=self.n_nodes,
+        )
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph) -> "DesignSpace":
+        """Create a DesignSpace from a search graph with "visits" and "reward"
+        attributes on its nodes and edges."""
+        states = list(graph.nodes)
+        index = {s: i for i, s in enumerate(states)}
+        node_attrs = graph.nodes
+        node_visits = np.fromiter(
+            (node_attrs[s].get("visits", 0) for s in states),
+            dtype=np.int64,
+            count=len(states),
+        )
+        node_reward = np.fromiter(
+            (node_attrs[s].get("reward", 0) for s in states),
+            dtype=np.float64,
+            count=len(states),
+        )
+
+        n_edges = graph.number_of_edges()
+        edges = np.empty((n_edges, 2), dtype=np.int64)
+        edge_visits = np.empty(n_edges, dtype=np.int64)
+        edge_reward = np.empty(n_edges, dtype=np.float64)
+        for j, (parent, child, attrs) in enumerate(graph.edges(data=True)):
+            edges[j] = index[parent], index[child]
+            edge_visits[j] = attrs.get("visits", 0)
+            edge_reward[j] = attrs.get("reward", 0)
+
+        return cls(
+            np.array(states, dtype=str),
+            edges,
+            node_visits=node_visits,
+            node_reward=node_reward,
+            edge_visits=edge_visits,
+            edge_reward=edge_reward,
+        )
+
+    def node_id(self, state: Hashable) -> int:
+        """Returns the node id of a state. Unlike ``index``, this does not build a
+        dict of all states, so it is cheap for memory-mapped arrays."""
+        ids = np.flatnonzero(self.states == str(state))
+        if ids.size == 0:
+            raise KeyError(state)
+        return int(ids[0])
+
+    def depth(self, root: Hashable) -> np.ndarray:
+        """Returns the depth of each node, i.e. the number of edges on the shortest
+        path from ``root``, or -1 for nodes that are not reachable from it. If
+        ``root`` is not in the space (e.g. after keeping only terminal states), every
+        node is unreachable."""
+        depth = np.full(self.n_nodes, -1, dtype=np.int64)
+        try:
+            root_id = self.node_id(root)
+        except KeyError:
+            return depth
+        depth[root_id] = 0
+
+        # Sort edges by parent, so the children of a node are a contiguous range
+        order = np.argsort(self.edges[:, 0], kind="stable")
+        parents = self.edges[order, 0]
+        children = self.edges[order, 1]
+
+        frontier = np.array([root_id], dtype=np.int64)
+        d = 0
+        while frontier.size:
+            d += 1
+            start = np.searchsorted(parents, frontier, side="left")
+            n_children = np.searchsorted(parents, frontier, side="right") - start
+            offsets = np.cumsum(n_children) - n_children
+            idx = np.repeat(start - offsets, n_children) + np.arange(n_children.sum())
+            frontier = np.unique(children[idx])
+            frontier = frontier[depth[frontier] < 0]
+            depth[frontier] = d
+        return depth
+
+    def subset(self, nodes: np.ndarray) -> "DesignSpace":
+        """Returns a DesignSpace with only the given nodes (a boolean mask or an array
+        of node ids) and the edges between them. Node ids are renumbered in order."""
+        mask = np.zeros(self.n_nodes, dtype=bool)
+        mask[nodes] = True
+        new_ids = np.cumsum(mask) - 1
+        edge_mask = mask[self.edges[:, 0]] & mask[self.edges[:, 1]]
+        return DesignSpace(
+            self.states[mask],
+            new_ids[self.edges[edge_mask]],
+            node_visits=self.node_visits[mask],
+            node_reward=self.node_reward[mask],
+            edge_visits=self.edge_visits[edge_mask],
+            edge_reward=self.edge_reward[edge_mask],
+        )
+
+    def to_networkx(self, graph: Optional[nx.DiGraph] = None) -> nx.DiGraph:
+        """Convert to a ``networkx.DiGraph`` with "visits" and "reward" attributes on
+        each node and edge. If a graph is given, nodes and edges are added to it, and
+        any that already exist keep their attributes."""
+        graph = nx.DiGraph() if graph is None else graph
+        states = self.states.tolist()
+        node_visits = self.node_visits.tolist()
+        node_reward = self.node_reward.tolist()
+        graph.add_nodes_from(
+            (s, {"visits": v, "reward": r})
+            for s, v, r in zip(states, node_visits, node_reward)
+            if s not in graph
+        )
+        edge_visits = self.edge_visits.tolist()
+        edge_reward = self.edge_reward.tolist()
+        graph.add_edges_from(
+            (states[p], states[c], {"visits": v, "reward": r})
+            for (p, c), v, r in zip(self.edges.tolist(), edge_visits, edge_reward)
+            if not graph.has_edge(states[p], states[c])
+        )
+        return graph
+
+    def save(self, directory: str | Path, stats: bool = True) -> Path:
+        """Save the arrays to a directory of ``.npy`` files, which can be loaded (and
+        memory-mapped) with ``DesignSpace.load()``. If `stats` is False, only the
+        states and edges are saved."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        columns = self._structure_columns
+        if stats:
+            columns = columns + self._stats_columns
+        for name in columns:
+            np.save(directory.joinpath(f"{name}.npy"), getattr(self, name))
+        return directory
+
+    @classmethod
+    def load(
+        cls,
+        directory: str | Path,
+        mmap_mode: Optional[str] = None,
+        columns: Optional[Iterable[str]] = None,
+    ) -> "DesignSpace":
+        """Load a DesignSpace saved with ``save()``. With ``mmap_mode="r"``, the
+        arrays are memory-mapped, so processes loading the same files share pages.
+        If `columns` is given, only those statistics columns (e.g. "node_visits" and
+        "node_reward") are loaded. Statistics that were not saved or not loaded are
+        initialized to zero."""
+        directory = Path(directory)
+        stats_columns = cls._stats_columns
+        if columns is not None:
+            columns = tuple(columns)
+            if unknown := set(columns) - set(stats_columns):
+                raise ValueError(
+                    f"Unknown columns: {', '.join(sorted(unknown))}. "
+                    f"Must be in {list(stats_columns)}."
+                )
+            stats_columns = columns
+
+        columns = {}
+        for name in cls._structure_columns + stats_columns:
+            path = directory.joinpath(f"{name}.npy")
+            if path.exists():
+                columns[name] = np.load(path, mmap_mode=mmap_mode)
+        return cls(**columns)
+
+
+## Columnar checkpoint format for search graphs
+
+COLUMNAR_SUFFIX = ".ctree"
+COLUMNAR_FORMAT_VERSION = 1
+
+
+def is_columnar_graph(path: str | Path) -> bool:
+    path = Path(path)
+    return path.suffix == COLUMNAR_SUFFIX or path.joinpath("meta.json").exists()
+
+
+def save_graph_columnar(graph: nx.DiGraph, path: str | Path) -> Path:
+    """Save a search graph as a ``.ctree`` directory containing a table of node names
+    and NumPy columns of edges and node/edge visits and rewards. Returns the path to
+    the directory. The previous checkpoint at the same path, if any, is replaced only
+    once the new one has been written."""
+    space = DesignSpace.from_networkx(graph)
+    return save_space_columnar(space, path, root=getattr(graph, "root", None))
+
+
+def save_space_columnar(
+    space: DesignSpace, path: str | Path, root: Optional[Hashable] = None
+) -> Path:
+    """Save a DesignSpace (e.g. an array snapshot of a search graph) in the same
+    ``.ctree`` format as ``save_graph_columnar()``."""
+    target = Path(path).with_suffix(COLUMNAR_SUFFIX)
+    tmp_dir = Path(tempfile.mkdtemp(dir=target.parent, prefix=f".{target.name}-"))
+    try:
+        space.save(tmp_dir, stats=True)
+        meta = dict(
+            format_version=COLUMNAR_FORMAT_VERSION,
+            root=root,
+            n_nodes=space.n_nodes,
+            n_edges=space.n_edges,
+        )
+        with tmp_dir.joinpath("meta.json").open("w") as f:
+            json.dump(meta, f, default=str)
+        replace_directory(tmp_dir, target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target
+
+
+def load_graph_columnar(path: str | Path) -> nx.DiGraph:
+    """Load a search graph saved with ``save_graph_columnar()``. Every column is
+    copied into the graph, so to keep the columns memory-mapped, load a DesignSpace
+    with ``load_space_columnar()`` instead."""
+    return DesignSpace.load(path).to_networkx()
+
+
+def load_space_columnar(
+    path: str | Path,
+    mmap_mode: Optional[str] = None,
+    columns: Optional[Iterable[str]] = None,
+) -> DesignSpace:
+    """Load a search graph saved with ``save_graph_columnar()`` as a DesignSpace,
+    without building a networkx graph. With a `mmap_mode`, the columns stay
+    memory-mapped for as long as the DesignSpace is used. See ``DesignSpace.load()``."""
+    return DesignSpace.load(path, mmap_mode=mmap_mode, columns=columns)
+
+
+def _column_or_zeros(
+    column: Optional[np.ndarray], length: int, dtype: type
+) -> np.ndarray:
+    if column is None:
+        return np.zeros(length, dtype=dtype)
+    column = np.asarray(column)
+    if len(column) != length:
+        raise ValueError(f"Expected a column of length {length}, got {len(column)}.")
+    return column
+
+
+def build_design_space(
+    grammar: CircuitGrammar,
+    root: Hashable,
+    compute_unique: bool = True,
+    n_visits: int = 0,
+    nprocs: int = 1,
+) -> DesignSpace:
+    """Enumerate every state reachable from ``root`` and every edge between them
+    into a ``DesignSpace``, without creating a networkx graph. All node and edge
+    visits are set to ``n_visits`` and all rewards to zero. If ``nprocs`` > 1, the
+    space is enumerated in parallel with ``enumerate_states_parallel()``."""
+    if nprocs > 1:
+        states, edge_list = enumerate_states_parallel(
+            grammar, root, compute_unique=compute_unique, nprocs=nprocs
+        )
+        index = {s: i for i, s in enumerate(states)}
+        parents = array("q", (index[p] for p, _ in edge_list))
+        children = array("q", (index[c] for _, c in edge_list))
+    else:
+        states = [root]
+        index = {root: 0}
+        parents = array("q")
+        children = array("q")
+        stack = [root]
+        while stack:
+            state = stack.pop()
+            if grammar.is_terminal(state):
+                continue
+            parent_id = index[state]
+            for child in _expand_state(grammar, state, compute_unique):
+                child_id = index.get(child)
+                if child_id is None:
+                    child_id = len(states)
+                    index[child] = child_id
+                    states.append(child)
+                    stack.append(child)
+                parents.append(parent_id)
+                children.append(child_id)
+
+    edges = np.column_stack(
+        [np.frombuffer(parents, dtype=np.int64), np.frombuffer(children, dtype=np.int64)]
+    )
+    space = DesignSpace(np.array(states, dtype=str), edges)
+    space.node_visits[:] = n_visits
+    space.edge_visits[:] = n_visits
+    return space
+
+
+class DesignSpaceCache:
+    """
+    DesignSpaceCache
+    ================
+    A persistent, content-addressed cache of enumerated design spaces. Each entry is
+    keyed by a hash of the grammar's ``to_dict()``, the root state, and whether
+    states are canonicalized, and is stored as a directory of ``.npy`` files. Entries
+    are memory-mapped when loaded, so processes (e.g. pool workers) that load the
+    same design space share its pages instead of re-enumerating it.
+
+    By default, entries are stored in ``$CIRCUITREE_CACHE_DIR`` or
+    ``~/.cache/circuitree/design_spaces``.
+    """
+
+    # Grammar attributes that do not change the design space
+    _ignored_grammar_attrs = ("cache_maxsize",)
+
+    def __init__(self, cache_dir: Optional[str | Path] = None, mmap_mode: str = "r"):
+        if cache_dir is None:
+            cache_dir = os.environ.get(
+                "CIRCUITREE_CACHE_DIR",
+                Path.home().joinpath(".cache", "circuitree", "design_spaces"),
+            )
+        self.cache_dir = Path(cache_dir)
+        self.mmap_mode = mmap_mode
+
+    def key(
+        self, grammar: CircuitGrammar, root: Hashable, compute_unique: bool = True
+    ) -> str:
+        grammar_dict = {
+            k: v
+            for k, v in grammar.to_dict().items()
+            if k not in self._ignored_grammar_attrs
+        }
+        contents = json.dumps(
+            dict(grammar=grammar_dict, root=root, compute_unique=compute_unique),
+            sort_keys=True,
+            default=str,
+        )
+        return sha256(contents.encode()).hexdigest()
+
+    def get(
+        self, grammar: CircuitGrammar, root: Hashable, compute_unique: bool = True
+    ) -> Optional[DesignSpace]:
+        """Returns the cached design space, or None if it is not in the cache."""
+        entry = self.cache_dir.joinpath(self.key(grammar, root, compute_unique))
+        if not entry.exists():
+            return None
+        return DesignSpace.load(entry, mmap_mode=self.mmap_mode)
+
+    def put(
+        self,
+        space: DesignSpace,
+        grammar: CircuitGrammar,
+        root: Hashable,
+        compute_unique: bool = True,
+    ) -> Path:
+        """Store a design space in the cache. The entry is written to a temporary
+        directory and then renamed, so concurrent readers never see partial files."""
+        entry = self.cache_dir.joinpath(self.key(grammar, root, compute_unique))
+        if entry.exists():
+            return entry
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-"))
+        try:
+            space.save(tmp_dir, stats=False)
+            tmp_dir.rename(entry)
+        except OSError:
+            # Another process stored the same entry first
+            if not entry.exists():
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return entry
+
+    def get_or_build(
+        self,
+        grammar: CircuitGrammar,
+        root: Hashable,
+        compute_unique: bool = True,
+        n_visits: int = 0,
+        nprocs: int = 1,
+    ) -> DesignSpace:
+        """Load the design space from the cache, enumerating and storing it first if
+        it is missing."""
+        space = self.get(grammar, root, compute_unique)
+        if space is None:
+            space = build_design_space(
+                grammar, root, compute_unique=compute_unique, nprocs=nprocs
+            )
+            self.put(space, grammar, root, compute_unique)
+        if n_visits:
+            space.node_visits[:] = n_visits
+            space.edge_visits[:] = n_visits
+        return space
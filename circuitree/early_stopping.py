@@ -0,0 +1,166 @@
+"""Sequential early stopping of reward sampling for terminal states."""
+
+from collections import Counter
+from threading import Lock
+from typing import Hashable
+import numpy as np
+from scipy import stats
+
+__all__ = [
+    "EarlyStopping",
+    "BetaEarlyStopping",
+    "SPRTEarlyStopping",
+]
+
+
+class EarlyStopping:
+    """
+    EarlyStopping
+    =============
+    Base class for strategies that stop sampling rewards for a terminal state once
+    its success probability is estimated well enough. Rewards are treated as the
+    outcomes of Bernoulli trials (a reward of 1 is a success, 0 a failure, and
+    fractional rewards count fractionally), with a Beta(``prior_successes``,
+    ``prior_failures``) prior on the success probability.
+
+    Pass a strategy to ``CircuiTree(early_stopping=...)``. Before a reward is
+    computed, the tree asks ``is_stopped(key)`` for the key returned by
+    ``CircuiTree.early_stopping_key()``. Once a state is stopped, its reward is served
+    from the posterior mean (``estimate()``) instead of calling ``get_reward()``, so
+    expensive evaluations are spent on states whose outcome is still uncertain.
+    Subclasses implement ``should_stop()``.
+
+    ``metrics()`` reports how many rewards were computed and how many were served.
+    """
+
+    def __init__(self, min_samples: int = 10, prior: tuple[float, float] = (1.0, 1.0)):
+        if min_samples < 1:
+            raise ValueError("Argument `min_samples` must be at least 1.")
+        self.min_samples = min_samples
+        self.prior_successes, self.prior_failures = prior
+        self.successes: Counter = Counter()
+        self.trials: Counter = Counter()
+        self.stopped: set = set()
+        self.n_computed = 0
+        self.n_served = 0
+        self._lock = Lock()
+
+    def is_stopped(self, key: Hashable) -> bool:
+        return key in self.stopped
+
+    def update(self, key: Hashable, reward: float | int) -> None:
+        """Record a computed reward and decide whether to stop sampling the key."""
+        with self._lock:
+            self.n_computed += 1
+            self.successes[key] += min(max(float(reward), 0.0), 1.0)
+            self.trials[key] += 1
+            if self.trials[key] >= self.min_samples and self.should_stop(
+                self.successes[key], self.trials[key]
+            ):
+                self.stopped.add(key)
+
+    def estimate(self, key: Hashable) -> float:
+        """The posterior mean success probability, served as the reward of a
+        stopped key."""
+        with self._lock:
+            self.n_served += 1
+            return self.posterior_mean(key)
+
+    def posterior(self, key: Hashable) -> tuple[float, float]:
+        """Parameters (a, b) of the Beta posterior of the success probability."""
+        successes = self.successes[key]
+        failures = self.trials[key] - successes
+        return self.prior_successes + successes, self.prior_failures + failures
+
+    def posterior_mean(self, key: Hashable) -> float:
+        a, b = self.posterior(key)
+        return a / (a + b)
+
+    def should_stop(self, successes: float, trials: int) -> bool:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Forget all recorded rewards and stopping decisions."""
+        with self._lock:
+            self.successes.clear()
+            self.trials.clear()
+            self.stopped.clear()
+            self.n_computed = 0
+            self.n_served = 0
+
+    def metrics(self) -> dict[str, float | int]:
+        n_total = self.n_computed + self.n_served
+        return dict(
+            n_computed=self.n_computed,
+            n_served=self.n_served,
+            n_stopped=len(self.stopped),
+            served_fraction=self.n_served / n_total if n_total else 0.0,
+        )
+
+
+class BetaEarlyStopping(EarlyStopping):
+    """Stops once the central credible interval of the success probability, with
+    probability mass `credibility`, is narrower than `width`. Also stops once the
+    interval lies entirely below `below` (if given), so that states that almost
+    never succeed are not sampled until their estimate is tight."""
+
+    def __init__(
+        self,
+        width: float = 0.1,
+        credibility: float = 0.95,
+        below: float | None = None,
+        min_samples: int = 10,
+        prior: tuple[float, float] = (1.0, 1.0),
+    ):
+        if not 0 < credibility < 1:
+            raise ValueError("Argument `credibility` must be between 0 and 1.")
+        self.width = width
+        self.credibility = credibility
+        self.below = below
+        super().__init__(min_samples=min_samples, prior=prior)
+
+    def should_stop(self, successes: float, trials: int) -> bool:
+        a = self.prior_successes + successes
+        b = self.prior_failures + trials - successes
+        tail = (1 - self.credibility) / 2
+        lower, upper = stats.beta.ppf([tail, 1 - tail], a, b)
+        if self.below is not None and upper < self.below:
+            return True
+        return upper - lower < self.width
+
+
+class SPRTEarlyStopping(EarlyStopping):
+    """Wald's sequential probability ratio test of H0: p = `p0` against H1: p = `p1`
+    (with p0 < p1) on the success probability p. Sampling stops as soon as either
+    hypothesis is accepted with error rates `alpha` (accepting H1 when H0 is true)
+    and `beta` (accepting H0 when H1 is true). Typically, p1 is the success rate
+    that makes a state interesting and p0 one that does not."""
+
+    def __init__(
+        self,
+        p0: float = 0.01,
+        p1: float = 0.05,
+        alpha: float = 0.05,
+        beta: float = 0.05,
+        min_samples: int = 10,
+        prior: tuple[float, float] = (1.0, 1.0),
+    ):
+        if not 0 < p0 < p1 < 1:
+            raise ValueError("Arguments must satisfy 0 < p0 < p1 < 1.")
+        self.p0 = p0
+        self.p1 = p1
+        self.alpha = alpha
+        self.beta = beta
+        self.upper_bound = np.log((1 - beta) / alpha)
+        self.lower_bound = np.log(beta / (1 - alpha))
+        super().__init__(min_samples=min_samples, prior=prior)
+
+    def log_likelihood_ratio(self, successes: float, trials: int) -> float:
+        failures = trials - successes
+        return successes * np.log(self.p1 / self.p0) + failures * np.log(
+            (1 - self.p1) / (1 - self.p0)
+        )
+
+    def should_stop(self, successes: float, trials: int) -> bool:
+        llr = self.log_likelihood_ratio(successes, trials)
+        return llr >= self.upper_bound or llr <= self.lower_bound
@@ -0,0 +1,315 @@
+"""Memory-efficient enumeration of the states in a grammar's design space."""
+
+from hashlib import blake2b
+from pathlib import Path
+from multiprocessing import cpu_count
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional
+import numpy as np
+
+from .grammar import CircuitGrammar
+
+__all__ = [
+    "state_hash",
+    "StateHashSet",
+    "iter_terminal_states",
+    "write_terminal_states",
+    "read_terminal_states",
+    "enumerate_states_parallel",
+]
+
+
+def state_hash(state: Hashable) -> int:
+    """Returns a 64-bit hash of a state. Unlike the built-in ``hash()``, the value is
+    stable across processes and interpreter sessions, so it can be checkpointed."""
+    digest = blake2b(str(state).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class StateHashSet:
+    """A set of visited states that stores only a 64-bit hash of each state in a
+    packed open-addressing table (linear probing). Uses ~16 bytes per state instead
+    of a full Python string, at the cost of a negligible probability of a hash
+    collision (~n^2 / 2^65 for n states)."""
+
+    _EMPTY = np.uint64(0)
+
+    def __init__(self, capacity: int = 1024, max_load: float = 0.5):
+        capacity = 1 << max(int(np.ceil(np.log2(max(capacity, 8)))), 3)
+        self.max_load = max_load
+        self._table = np.zeros(capacity, dtype=np.uint64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _key(state: Hashable) -> np.uint64:
+        # Zero marks an empty slot, so it is remapped to a valid key
+        return np.uint64(state_hash(state) or 1)
+
+    def _find_slot(self, table: np.ndarray, key: np.uint64) -> int:
+        mask = len(table) - 1
+        i = int(key) & mask
+        while True:
+            slot = table[i]
+            if slot == key or slot == self._EMPTY:
+                return i
+            i = (i + 1) & mask
+
+    def _grow(self):
+        keys = self.keys()
+        self._table = np.zeros(len(self._table) * 2, dtype=np.uint64)
+        for key in keys:
+            self._table[self._find_slot(self._table, key)] = key
+
+    def add(self, state: Hashable) -> bool:
+        """Add a state to the set. Returns True if the state was not already present."""
+        key = self._key(state)
+        i = self._find_slot(self._table, key)
+        if self._table[i] == key:
+            return False
+        self._table[i] = key
+        self._size += 1
+        if self._size > self.max_load * len(self._table):
+            self._grow()
+        return True
+
+    def __contains__(self, state: Hashable) -> bool:
+        key = self._key(state)
+        return self._table[self._find_slot(self._table, key)] == key
+
+    def keys(self) -> np.ndarray:
+        """Returns the packed hashes of all states in the set."""
+        return self._table[self._table != self._EMPTY]
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray, max_load: float = 0.5) -> "StateHashSet":
+        hash_set = cls(capacity=int(len(keys) / max_load) + 1, max_load=max_load)
+        for key in np.asarray(keys, dtype=np.uint64):
+            hash_set._table[hash_set._find_slot(hash_set._table, key)] = key
+        hash_set._size = len(keys)
+        return hash_set
+
+
+def _expand_state(
+    grammar: CircuitGrammar,
+    state: Hashable,
+    compute_unique: bool = True,
+    do_action: Optional[Callable[[Hashable, Any], Hashable]] = None,
+) -> list[Hashable]:
+    """Returns the distinct children of a state. If given, ``do_action(state, action)``
+    is used to apply each action instead of the grammar (and ``compute_unique`` is
+    ignored)."""
+    children = []
+    for action in grammar.get_actions(state):
+        if do_action is not None:
+            child = do_action(state, action)
+        else:
+            child = grammar.do_action(state, action)
+            if compute_unique:
+                child = grammar.get_unique_state(child)
+        children.append(child)
+    return list(dict.fromkeys(children))
+
+
+def iter_terminal_states(
+    grammar: CircuitGrammar,
+    root: Hashable,
+    compute_unique: bool = True,
+    visited: Optional[Any] = None,
+    stack: Optional[list[Hashable]] = None,
+    max_iter: Optional[int] = None,
+    callback: Optional[Callable[[], Any]] = None,
+    do_action: Optional[Callable[[Hashable, Any], Hashable]] = None,
+) -> Iterator[Hashable]:
+    """Yield every terminal state reachable from ``root`` exactly once, using a
+    depth-first traversal. The set of visited states can be any object with ``add()``
+    and ``__contains__`` (by default a packed ``StateHashSet``). The ``stack`` and
+    ``visited`` objects are modified in place, so the traversal can be resumed from
+    them after the generator is closed. Actions are applied with ``do_action`` if
+    given (for instance ``CircuiTree._do_action``), and with the grammar otherwise."""
+    if visited is None:
+        visited = StateHashSet()
+    if stack is None:
+        stack = [root]
+        visited.add(root)
+    max_iter = np.inf if max_iter is None else max_iter
+
+    k = 0
+    while stack and k < max_iter:
+        state = stack.pop()
+        if grammar.is_terminal(state):
+            yield state
+        else:
+            for child in _expand_state(grammar, state, compute_unique, do_action):
+                if child not in visited:
+                    visited.add(child)
+                    stack.append(child)
+        k += 1
+        if callback is not None:
+            callback()
+
+
+def _save_enumeration_checkpoint(
+    checkpoint: Path, stack: list[Hashable], visited: StateHashSet, n_chunks: int
+):
+    tmp = checkpoint.with_suffix(".tmp.npz")
+    np.savez(
+        tmp,
+        stack=np.array([str(s) for s in stack]),
+        visited=visited.keys(),
+        n_chunks=n_chunks,
+    )
+    tmp.replace(checkpoint)
+
+
+def write_terminal_states(
+    grammar: CircuitGrammar,
+    root: Hashable,
+    out_dir: str | Path,
+    compute_unique: bool = True,
+    chunksize: int = 100_000,
+    progress: bool = False,
+    do_action: Optional[Callable[[Hashable, Any], Hashable]] = None,
+) -> int:
+    """Enumerate all terminal states reachable from ``root`` and write them to
+    ``out_dir`` in chunks of ``chunksize`` states, each stored as a fixed-width
+    string array in a numbered ``.npy`` file. Memory use is bounded by the chunk size,
+    the traversal stack, and the packed set of visited states.
+
+    A checkpoint of the traversal is saved after every chunk. If ``out_dir`` already
+    contains a checkpoint, the enumeration resumes from it. Returns the number of
+    chunks written. Chunks can be read back with ``read_terminal_states()``. See
+    ``iter_terminal_states()`` for ``do_action``."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = out_dir.joinpath("checkpoint.npz")
+
+    if checkpoint.exists():
+        with np.load(checkpoint) as f:
+            stack = f["stack"].tolist()
+            visited = StateHashSet.from_keys(f["visited"])
+            n_chunks = int(f["n_chunks"])
+    else:
+        stack = [root]
+        visited = StateHashSet()
+        visited.add(root)
+        n_chunks = 0
+
+    if not stack:
+        return n_chunks
+
+    if progress:
+        from tqdm import tqdm
+
+        pbar = tqdm(desc="Enumerating terminal states", initial=n_chunks * chunksize)
+
+    chunk = []
+    terminals = iter_terminal_states(
+        grammar, root, compute_unique, visited=visited, stack=stack, do_action=do_action
+    )
+    for state in terminals:
+        chunk.append(str(state))
+        if progress:
+            pbar.update(1)
+        if len(chunk) == chunksize:
+            np.save(out_dir.joinpath(f"terminals_{n_chunks:05d}.npy"), np.array(chunk))
+            n_chunks += 1
+            chunk = []
+            _save_enumeration_checkpoint(checkpoint, stack, visited, n_chunks)
+
+    if chunk:
+        np.save(out_dir.joinpath(f"terminals_{n_chunks:05d}.npy"), np.array(chunk))
+        n_chunks += 1
+    _save_enumeration_checkpoint(checkpoint, stack, visited, n_chunks)
+
+    return n_chunks
+
+
+def read_terminal_states(
+    out_dir: str | Path, mmap_mode: Optional[str] = "r"
+) -> Iterable[np.ndarray]:
+    """Yield the chunks of terminal states written by ``write_terminal_states()``.
+    By default, chunks are memory-mapped rather than read into memory."""
+    for chunk_file in sorted(Path(out_dir).glob("terminals_*.npy")):
+        yield np.load(chunk_file, mmap_mode=mmap_mode)
+
+
+## Parallel enumeration
+
+# Grammar used by each worker process, set once by the pool initializer
+_worker_grammar: Optional[CircuitGrammar] = None
+_worker_compute_unique: bool = True
+
+
+def _init_expand_worker(grammar: CircuitGrammar, compute_unique: bool):
+    global _worker_grammar, _worker_compute_unique
+    _worker_grammar = grammar
+    _worker_compute_unique = compute_unique
+
+
+def _expand_states_in_worker(
+    states: list[Hashable],
+) -> list[tuple[Hashable, list[Hashable]]]:
+    """Expand a batch of states, returning each state with its distinct children."""
+    return [
+        (state, _expand_state(_worker_grammar, state, _worker_compute_unique))
+        for state in states
+    ]
+
+
+def enumerate_states_parallel(
+    grammar: CircuitGrammar,
+    root: Hashable,
+    compute_unique: bool = True,
+    nprocs: Optional[int] = None,
+    chunksize: int = 256,
+    progress: bool = False,
+) -> tuple[list[Hashable], list[tuple[Hashable, Hashable]]]:
+    """Enumerate all states reachable from ``root`` and the edges between them, using
+    ``nprocs`` worker processes. The state space is explored one depth layer at a
+    time. The non-terminal states of each layer are split into batches of
+    ``chunksize`` states, which are expanded in parallel.
+
+    Only the expansion is parallel. Children are deduplicated serially in the parent
+    process against a single set of visited states, which is cheap compared to
+    applying actions and computing unique states, but means that the parent holds
+    every state in memory.
+
+    Returns a list of states (in the order they were discovered) and a list of
+    (parent, child) edges, which together describe the same graph as
+    ``CircuiTree.grow_tree()``."""
+    from multiprocessing import Pool
+
+    nprocs = cpu_count() if nprocs is None else nprocs
+    if progress:
+        from tqdm import tqdm
+
+        pbar = tqdm(desc="Enumerating states", initial=1)
+
+    visited = {root}
+    states = [root]
+    edges = []
+    frontier = [root]
+    with Pool(
+        nprocs, initializer=_init_expand_worker, initargs=(grammar, compute_unique)
+    ) as pool:
+        while frontier:
+            layer = [state for state in frontier if not grammar.is_terminal(state)]
+            batches = [
+                layer[i : i + chunksize] for i in range(0, len(layer), chunksize)
+            ]
+
+            frontier = []
+            for expanded in pool.imap_unordered(_expand_states_in_worker, batches):
+                for parent, children in expanded:
+                    for child in children:
+                        edges.append((parent, child))
+                        if child not in visited:
+                            visited.add(child)
+                            states.append(child)
+                            frontier.append(child)
+                if progress:
+                    pbar.update(len(states) - pbar.n)
+
+    return states, edges
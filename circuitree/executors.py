@@ -0,0 +1,172 @@
+"""Backends for evaluating rewards asynchronously during search."""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import pickle
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Optional
+
+if TYPE_CHECKING:
+    from .circuitree import CircuiTree
+
+__all__ = [
+    "RewardExecutor",
+    "InlineRewardExecutor",
+    "ThreadPoolRewardExecutor",
+    "ProcessPoolRewardExecutor",
+    "FuturesRewardExecutor",
+]
+
+
+class RewardExecutor(ABC):
+    """
+    RewardExecutor
+    ==============
+    Interface for a backend that evaluates rewards, used by
+    ``CircuiTree.search_mcts_async()``. ``submit_reward()`` starts evaluating the
+    reward of a terminal state and returns a ``concurrent.futures.Future`` that
+    resolves to the reward. By default, the reward is ``tree.get_reward(state,
+    *args, **kwargs)``, so swapping backends does not require changing
+    ``get_reward()``.
+
+    Executors can be used as context managers, which shut them down on exit.
+    """
+
+    @abstractmethod
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Start evaluating ``fn(*args, **kwargs)`` and return a Future."""
+        raise NotImplementedError
+
+    def submit_reward(
+        self, tree: "CircuiTree", state: Hashable, *args, **kwargs
+    ) -> Future:
+        """Start evaluating the reward of a state and return a Future."""
+        return self.submit(tree.get_reward, state, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+    def __enter__(self) -> "RewardExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+
+
+class InlineRewardExecutor(RewardExecutor):
+    """Evaluates each reward immediately in the calling thread. Equivalent to the
+    serial search, and useful for debugging."""
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class ThreadPoolRewardExecutor(RewardExecutor):
+    """Evaluates rewards in a pool of threads that share the tree. Best suited to
+    rewards that release the GIL (e.g. NumPy/SciPy code or I/O-bound calls to
+    another service). Note that ``get_reward()`` must then be thread-safe."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+# Tree used by each worker process, set once by the pool initializer
+_worker_tree: Optional["CircuiTree"] = None
+
+
+def _init_reward_worker(tree_bytes: bytes) -> None:
+    global _worker_tree
+    _worker_tree = pickle.loads(tree_bytes)
+
+
+def _get_reward_in_worker(state: Hashable, *args, **kwargs) -> Any:
+    return _worker_tree.get_reward(state, *args, **kwargs)
+
+
+class ProcessPoolRewardExecutor(RewardExecutor):
+    """Evaluates rewards in a pool of worker processes. The tree is pickled and sent
+    to each worker once, when the pool is started by the first call to
+    ``submit_reward()``, so afterwards only the state and reward are sent per
+    evaluation. Each worker calls ``get_reward()`` on its own copy of the tree, so
+    changes that ``get_reward()`` makes to the tree are not seen by the search."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tree_id: Optional[int] = None
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def submit_reward(
+        self, tree: "CircuiTree", state: Hashable, *args, **kwargs
+    ) -> Future:
+        if self._executor is not None and self._tree_id != id(tree):
+            raise ValueError("This executor's workers were started for another tree.")
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_reward_worker,
+                initargs=(pickle.dumps(tree),),
+            )
+            self._tree_id = id(tree)
+        return self._executor.submit(_get_reward_in_worker, state, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._tree_id = None
+
+
+def _as_concurrent_future(future: Any) -> Future:
+    """Wrap a future-like object with ``add_done_callback()``, ``exception()`` and
+    ``result()`` methods (e.g. a ``dask.distributed`` future) as a
+    ``concurrent.futures.Future``."""
+    if isinstance(future, Future):
+        return future
+
+    wrapped = Future()
+
+    def _copy_outcome(f):
+        if (exc := f.exception()) is not None:
+            wrapped.set_exception(exc)
+        else:
+            wrapped.set_result(f.result())
+
+    future.add_done_callback(_copy_outcome)
+    return wrapped
+
+
+class FuturesRewardExecutor(RewardExecutor):
+    """Submits rewards to any client with a ``submit(fn, *args, **kwargs)`` method
+    that returns a future, such as a ``dask.distributed.Client`` or a
+    ``concurrent.futures`` executor. If `reward_fn` is given, it is submitted as
+    ``reward_fn(state, *args, **kwargs)`` instead of the tree's ``get_reward``,
+    which avoids sending the tree to remote workers."""
+
+    def __init__(self, client: Any, reward_fn: Optional[Callable] = None):
+        self.client = client
+        self.reward_fn = reward_fn
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return _as_concurrent_future(self.client.submit(fn, *args, **kwargs))
+
+    def submit_reward(
+        self, tree: "CircuiTree", state: Hashable, *args, **kwargs
+    ) -> Future:
+        if self.reward_fn is None:
+            return self.submit(tree.get_reward, state, *args, **kwargs)
+        return self.submit(self.reward_fn, state, *args, **kwargs)
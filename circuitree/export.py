@@ -0,0 +1,182 @@
+"""Export of search statistics as column arrays and Parquet/Feather tables."""
+
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Hashable, Iterable, Iterator, Literal, Optional
+import networkx as nx
+import numpy as np
+
+from .design_space import DesignSpace
+
+__all__ = [
+    "iter_node_table",
+    "iter_edge_table",
+    "write_table",
+]
+
+TABLE_SUFFIXES = {"parquet": ".parquet", "feather": ".feather"}
+
+
+def _chunk_slices(n: int, chunksize: Optional[int]) -> Iterator[slice]:
+    # Always yield at least one (possibly empty) chunk, so the schema is written
+    chunksize = max(n, 1) if chunksize is None else chunksize
+    for start in range(0, max(n, 1), chunksize):
+        yield slice(start, start + chunksize)
+
+
+def _iter_chunks(items: Iterable, n: int, chunksize: Optional[int]) -> Iterator[list]:
+    items = iter(items)
+    for chunk in _chunk_slices(n, chunksize):
+        yield list(islice(items, chunk.stop - chunk.start))
+
+
+def _depth_lookup(
+    source: DesignSpace | nx.DiGraph, root: Hashable
+) -> Callable[[slice, list], np.ndarray]:
+    """Returns a function that maps a chunk of nodes (as a slice of node ids and a
+    list of states) to their depths, or -1 for nodes that are unreachable from
+    `root`, including every node if `root` is missing."""
+    if isinstance(source, DesignSpace):
+        depth = source.depth(root)
+        return lambda chunk, states: depth[chunk]
+    if root in source:
+        depth = nx.single_source_shortest_path_length(source, root)
+    else:
+        depth = {}
+    return lambda chunk, states: np.fromiter(
+        (depth.get(s, -1) for s in states), dtype=np.int64, count=len(states)
+    )
+
+
+def _iter_node_columns(
+    source: DesignSpace | nx.DiGraph, chunksize: Optional[int]
+) -> Iterator[tuple[slice, list, np.ndarray, np.ndarray]]:
+    """Yield each chunk of nodes as a slice of node ids, a list of states, and their
+    visits and rewards."""
+    if isinstance(source, DesignSpace):
+        for chunk in _chunk_slices(source.n_nodes, chunksize):
+            yield (
+                chunk,
+                source.states[chunk].tolist(),
+                np.asarray(source.node_visits[chunk]),
+                np.asarray(source.node_reward[chunk]),
+            )
+        return
+
+    n = source.number_of_nodes()
+    nodes = _iter_chunks(source.nodes(data=True), n, chunksize)
+    for chunk, rows in zip(_chunk_slices(n, chunksize), nodes):
+        yield (
+            chunk,
+            [s for s, _ in rows],
+            np.array([a.get("visits", 0) for _, a in rows], dtype=np.int64),
+            np.array([a.get("reward", 0) for _, a in rows], dtype=np.float64),
+        )
+
+
+def iter_node_table(
+    source: DesignSpace | nx.DiGraph,
+    root: Hashable,
+    is_terminal: Callable[[Hashable], bool],
+    is_success: Optional[Callable[[Hashable], bool]] = None,
+    chunksize: Optional[int] = None,
+) -> Iterator[dict[str, np.ndarray]]:
+    """Yield the node table of a search graph (a networkx graph or a DesignSpace) in
+    chunks of `chunksize` rows (or all at once if None). Each chunk is a dict of
+    column arrays: "state", "visits", "reward", "depth" (-1 if unreachable from
+    `root`, or if `root` is not in the graph), "terminal", and, if `is_success` is
+    given, "success" (False for non-terminal states).
+
+    Rows are read from the source one chunk at a time. Apart from the chunk, only
+    the depths are computed for the whole graph at once."""
+    depth = _depth_lookup(source, root)
+    for chunk, state_list, visits, reward in _iter_node_columns(source, chunksize):
+        terminal = np.fromiter(
+            (is_terminal(s) for s in state_list), dtype=bool, count=len(state_list)
+        )
+        table = dict(
+            state=np.array([str(s) for s in state_list], dtype=str),
+            visits=visits,
+            reward=reward,
+            depth=depth(chunk, state_list),
+            terminal=terminal,
+        )
+        if is_success is not None:
+            table["success"] = np.fromiter(
+                (t and is_success(s) for s, t in zip(state_list, terminal.tolist())),
+                dtype=bool,
+                count=len(state_list),
+            )
+        yield table
+
+
+def iter_edge_table(
+    source: DesignSpace | nx.DiGraph, chunksize: Optional[int] = None
+) -> Iterator[dict[str, np.ndarray]]:
+    """Yield the edge table of a search graph (a networkx graph or a DesignSpace) in
+    chunks of `chunksize` rows (or all at once if None). Each chunk is a dict of
+    column arrays: "parent", "child", "visits", and "reward"."""
+    if isinstance(source, DesignSpace):
+        for chunk in _chunk_slices(source.n_edges, chunksize):
+            edges = source.edges[chunk]
+            yield dict(
+                parent=source.states[edges[:, 0]],
+                child=source.states[edges[:, 1]],
+                visits=np.asarray(source.edge_visits[chunk]),
+                reward=np.asarray(source.edge_reward[chunk]),
+            )
+        return
+
+    n = source.number_of_edges()
+    for rows in _iter_chunks(source.edges(data=True), n, chunksize):
+        yield dict(
+            parent=np.array([str(p) for p, _, _ in rows], dtype=str),
+            child=np.array([str(c) for _, c, _ in rows], dtype=str),
+            visits=np.array([a.get("visits", 0) for *_, a in rows], dtype=np.int64),
+            reward=np.array([a.get("reward", 0) for *_, a in rows], dtype=np.float64),
+        )
+
+
+def write_table(
+    chunks: Iterable[dict[str, np.ndarray]],
+    path: str | Path,
+    format: Literal["parquet", "feather"] = "parquet",
+) -> Path:
+    """Write chunks of column arrays (e.g. from ``iter_node_table()``) to a Parquet
+    or Feather file, one record batch at a time, so only one chunk is converted to
+    Arrow format at once. Requires ``pyarrow``. The file extension for the format
+    is appended to `path` unless it already ends with it. Returns the path written
+    to."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError(
+            "The pyarrow package is required to export tables to Parquet or "
+            "Feather. You can install it with `pip install pyarrow`."
+        )
+    if format not in TABLE_SUFFIXES:
+        raise ValueError(
+            f"Invalid format: {format}. Must be one of {list(TABLE_SUFFIXES)}."
+        )
+
+    target = Path(path)
+    if target.suffix != TABLE_SUFFIXES[format]:
+        target = target.parent / f"{target.name}{TABLE_SUFFIXES[format]}"
+    writer = None
+    try:
+        for chunk in chunks:
+            batch = pa.RecordBatch.from_pydict(
+                {name: pa.array(column) for name, column in chunk.items()}
+            )
+            if writer is None:
+                if format == "parquet":
+                    import pyarrow.parquet as pq
+
+                    writer = pq.ParquetWriter(target, batch.schema)
+                else:
+                    writer = pa.ipc.new_file(str(target), batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return target
@@ -0,0 +1,232 @@
+"""Binary replay log of MCTS iterations."""
+
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Hashable, Iterable, Optional
+import numpy as np
+
+from .design_space import DesignSpace
+
+__all__ = [
+    "IterationJournal",
+    "JournalReader",
+]
+
+RECORDS_FILE = "records.bin"
+PATHS_FILE = "paths.bin"
+STATES_FILE = "states.txt"
+
+# One fixed-size record per iteration. The selection path is stored as a run of
+# `path_len` state ids starting at `path_start` in the paths file.
+RECORD_DTYPE = np.dtype(
+    [
+        ("path_start", "<i8"),
+        ("path_len", "<u2"),
+        ("terminal", "<i4"),
+        ("reward", "<f8"),
+        ("thread", "<u2"),
+        ("time", "<f8"),
+    ]
+)
+PATH_DTYPE = np.dtype("<i4")
+
+
+class IterationJournal:
+    """
+    IterationJournal
+    ================
+    Records every MCTS iteration (selection path, simulated terminal state, reward,
+    thread index, and timestamp) to a directory of binary files, so that the search
+    statistics can be reconstructed at any iteration with ``JournalReader`` without
+    recomputing any rewards.
+
+    States are encoded as integer ids, and each new state is appended once to a
+    table of state strings. Records are kept in a preallocated ring buffer of
+    ``buffer_size`` iterations that is flushed to disk when full, so recording an
+    iteration costs a few dict lookups and array writes. Call ``close()`` (or use
+    the journal as a context manager) to flush the remaining records.
+
+    Pass a journal to ``CircuiTree.search_mcts(journal=...)`` to record a search.
+    If the directory already contains a journal, new records are appended to it.
+    """
+
+    def __init__(self, directory: str | Path, buffer_size: int = 4096):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.buffer_size = buffer_size
+
+        # Resume from an existing journal
+        self._state_ids: dict[str, int] = {}
+        states_path = self.directory.joinpath(STATES_FILE)
+        if states_path.exists():
+            states = states_path.read_text().splitlines()
+            self._state_ids = {s: i for i, s in enumerate(states)}
+        self._n_states_flushed = len(self._state_ids)
+        self._n_records_flushed = _n_items(
+            self.directory.joinpath(RECORDS_FILE), RECORD_DTYPE
+        )
+        self._path_offset = _n_items(self.directory.joinpath(PATHS_FILE), PATH_DTYPE)
+
+        self._records = np.zeros(buffer_size, dtype=RECORD_DTYPE)
+        self._paths = np.zeros(buffer_size * 8, dtype=PATH_DTYPE)
+        self._n_records = 0
+        self._n_path_ids = 0
+        self._new_states: list[str] = []
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return self._n_records_flushed + self._n_records
+
+    def __enter__(self) -> "IterationJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _state_id(self, state: Hashable) -> int:
+        state = str(state)
+        state_id = self._state_ids.get(state)
+        if state_id is None:
+            state_id = len(self._state_ids)
+            self._state_ids[state] = state_id
+            self._new_states.append(state)
+        return state_id
+
+    def record(
+        self,
+        selection_path: Iterable[Hashable],
+        sim_node: Hashable,
+        reward: float | int,
+        thread_idx: int = 0,
+    ) -> None:
+        """Record one iteration of the search."""
+        with self._lock:
+            path_ids = [self._state_id(s) for s in selection_path]
+            n = len(path_ids)
+            if self._n_path_ids + n > len(self._paths):
+                self._paths = np.resize(self._paths, 2 * (self._n_path_ids + n))
+            self._paths[self._n_path_ids : self._n_path_ids + n] = path_ids
+
+            self._records[self._n_records] = (
+                self._path_offset + self._n_path_ids,
+                n,
+                self._state_id(sim_node),
+                reward,
+                thread_idx,
+                time(),
+            )
+            self._n_path_ids += n
+            self._n_records += 1
+            if self._n_records == self.buffer_size:
+                self._flush()
+
+    def flush(self) -> None:
+        """Write the buffered records to disk."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        # Write states, then paths, then records, so that a record on disk only
+        # refers to data that is also on disk
+        if self._new_states:
+            with self.directory.joinpath(STATES_FILE).open("a") as f:
+                f.write("".join(f"{s}\n" for s in self._new_states))
+            self._n_states_flushed += len(self._new_states)
+            self._new_states = []
+        with self.directory.joinpath(PATHS_FILE).open("ab") as f:
+            self._paths[: self._n_path_ids].tofile(f)
+        with self.directory.joinpath(RECORDS_FILE).open("ab") as f:
+            self._records[: self._n_records].tofile(f)
+        self._path_offset += self._n_path_ids
+        self._n_records_flushed += self._n_records
+        self._n_path_ids = 0
+        self._n_records = 0
+
+    def close(self) -> None:
+        self.flush()
+
+
+def _n_items(path: Path, dtype: np.dtype) -> int:
+    return path.stat().st_size // dtype.itemsize if path.exists() else 0
+
+
+class JournalReader:
+    """
+    JournalReader
+    =============
+    Reads a directory written by ``IterationJournal``. The records are
+    memory-mapped as a structured array with fields "path_start", "path_len",
+    "terminal", "reward", "thread", and "time". State ids index into ``states``.
+
+    ``replay(until=k)`` reconstructs the visits and rewards that the search graph
+    had after the first ``k`` recorded iterations, without recomputing rewards. An
+    incomplete record at the end of the files (e.g. after a crash) is ignored.
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.records = _memmap(self.directory.joinpath(RECORDS_FILE), RECORD_DTYPE)
+        self.path_ids = _memmap(self.directory.joinpath(PATHS_FILE), PATH_DTYPE)
+        states_path = self.directory.joinpath(STATES_FILE)
+        self.states = states_path.read_text().splitlines() if states_path.exists() else []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def path(self, i: int) -> list[str]:
+        """The selection path of the i-th recorded iteration."""
+        start, length = self.records["path_start"][i], self.records["path_len"][i]
+        return [self.states[j] for j in self.path_ids[start : start + length]]
+
+    def terminal(self, i: int) -> str:
+        """The terminal state simulated in the i-th recorded iteration."""
+        return self.states[self.records["terminal"][i]]
+
+    def replay(self, until: Optional[int] = None) -> DesignSpace:
+        """Reconstruct the search statistics after the first `until` iterations (by
+        default, all of them) as a DesignSpace containing the nodes and edges that
+        were visited. Use ``.to_networkx()`` to get a search graph."""
+        records = self.records[:until]
+        lengths = records["path_len"].astype(np.int64)
+        n_ids = int(lengths.sum())
+
+        # Paths are written contiguously, in the same order as the records
+        ids = np.asarray(self.path_ids[:n_ids], dtype=np.int64)
+        rewards = np.repeat(records["reward"], lengths)
+
+        # Every node and edge on a path gets one visit and the iteration's reward
+        n_states = len(self.states)
+        node_visits = np.bincount(ids, minlength=n_states)
+        node_reward = np.bincount(ids, weights=rewards, minlength=n_states)
+
+        # Consecutive ids are edges, except across the boundary between two paths
+        is_edge = np.ones(max(n_ids - 1, 0), dtype=bool)
+        is_edge[np.cumsum(lengths)[:-1] - 1] = False
+        pairs = np.column_stack([ids[:-1], ids[1:]])[is_edge]
+        edges, inverse = np.unique(pairs, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        edge_visits = np.bincount(inverse, minlength=len(edges))
+        edge_reward = np.bincount(
+            inverse, weights=rewards[:-1][is_edge], minlength=len(edges)
+        )
+
+        # Keep only the states that were visited, in order of first appearance
+        visited = np.flatnonzero(node_visits > 0)
+        new_ids = np.full(n_states, -1, dtype=np.int64)
+        new_ids[visited] = np.arange(len(visited))
+        return DesignSpace(
+            np.array(self.states, dtype=str)[visited],
+            new_ids[edges],
+            node_visits=node_visits[visited],
+            node_reward=node_reward[visited],
+            edge_visits=edge_visits,
+            edge_reward=edge_reward,
+        )
+
+
+def _memmap(path: Path, dtype: np.dtype) -> np.ndarray:
+    n = _n_items(path, dtype)
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n,))
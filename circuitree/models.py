@@ -72,6 +72,7 @@ class SimpleNetworkGrammar(CircuitGrammar):
                 "edge_options",
                 "component_codes",
                 "_recolor",
+                "_recolor_tables",
                 "get_interaction_recolorings",
             ]
         )
@@ -240,16 +241,19 @@ class SimpleNetworkGrammar(CircuitGrammar):
             for p in permutations(self.recolorable_components)
         ]
 
+    @cached_property
+    def _recolor_tables(self):
+        """Translation tables for each recoloring, for use with ``str.translate``."""
+        return [str.maketrans(mapping) for mapping in self._recolor]
+
     @staticmethod
     def _recolor_string(mapping: dict[str, str], string: str):
         return "".join([mapping.get(c, c) for c in string])
 
     def _get_interaction_recolorings(self, interactions: str) -> list[str]:
         interaction_recolorings = []
-        for mapping in self._recolor:
-            recolored_interactions = sorted(
-                [self._recolor_string(mapping, ixn) for ixn in interactions.split("_")]
-            )
+        for table in self._recolor_tables:
+            recolored_interactions = sorted(interactions.translate(table).split("_"))
             interaction_recolorings.append("_".join(recolored_interactions).strip("_"))
 
         return interaction_recolorings
@@ -257,10 +261,8 @@ class SimpleNetworkGrammar(CircuitGrammar):
     @lru_cache
     def get_component_recolorings(self, components: str) -> list[str]:
         component_recolorings = []
-        for mapping in self._recolor:
-            recolored_components = "".join(
-                sorted(self._recolor_string(mapping, components))
-            )
+        for table in self._recolor_tables:
+            recolored_components = "".join(sorted(components.translate(table)))
             component_recolorings.append(recolored_components)
 
         return component_recolorings
@@ -8,6 +8,7 @@ from typing import Any, Callable, Iterable, Optional
 from .models import DimersGrammar, SimpleNetworkGrammar
 
 from .circuitree import CircuiTree
+from .journal import IterationJournal
 
 __all__ = [
     "MultithreadedCircuiTree",
@@ -51,6 +52,24 @@ class MultithreadedCircuiTree(CircuiTree):
         CircuiTree.get_reward"""
         raise NotImplementedError
 
+    def reward_cache_key(self, node: Any, sample_number: int, **kwargs) -> Any:
+        """Rewards are cached by the canonical terminal state and its sample number."""
+        if not self.compute_unique:
+            node = self.grammar.get_unique_state(node)
+        return (str(node), sample_number)
+
+    def early_stopping_key(self, node: Any, sample_number: int, **kwargs) -> Any:
+        """Rewards are pooled across samples of the same canonical terminal state."""
+        if not self.compute_unique:
+            node = self.grammar.get_unique_state(node)
+        return str(node)
+
+    def _next_reward_args(self, node: Any) -> tuple:
+        # Keep track of samples to terminal nodes
+        sample_number = self.sample_counter[node]
+        self.sample_counter[node] += 1
+        return (sample_number,)
+
     def traverse(self, thread_idx: int, **kwargs):
         # Select the next state to sample and the terminal state to be simulated.
         # Expands a child if possible.
@@ -61,10 +80,8 @@ class MultithreadedCircuiTree(CircuiTree):
         # Between backprop of visit and reward, we incur virtual loss
         self.backpropagate_visit(selection_path)
 
-        # Keep track of samples to terminal nodes
-        sample_number = self.sample_counter[sim_node]
-        self.sample_counter[sim_node] += 1
-        reward = self.get_reward(sim_node, sample_number, **kwargs)
+        (sample_number,) = self._next_reward_args(sim_node)
+        reward = self.get_cached_reward(sim_node, sample_number, **kwargs)
         self.backpropagate_reward(selection_path, reward)
 
         return selection_path, reward, sim_node
@@ -160,6 +177,7 @@ def search_mcts_in_thread(
     callback: Optional[Callable] = None,
     callback_every: int = 1,
     return_metrics: Optional[bool] = None,
+    journal: Optional[IterationJournal] = None,
     **kwargs,
 ):
     if callback is None:
@@ -172,11 +190,16 @@ def search_mcts_in_thread(
     metrics = [m0]
     for iteration in range(1, n_steps + 1):
         selection_path, reward, sim_node = mtree.traverse(thread_idx, **kwargs)
+        if journal is not None:
+            journal.record(selection_path, sim_node, reward, thread_idx)
         if iteration % callback_every == 0:
             m = callback(mtree, iteration, selection_path, reward, sim_node)
             if return_metrics:
                 metrics.append(m)
 
+    if journal is not None:
+        journal.flush()
+
     if return_metrics:
         return mtree, metrics
     else:
@@ -0,0 +1,139 @@
+"""Memoization of rewards across searches and processes."""
+
+from collections import OrderedDict
+import json
+from pathlib import Path
+import sqlite3
+from threading import Lock
+from typing import Callable, Hashable, Optional
+
+__all__ = ["RewardCache"]
+
+
+def _encode_key(key: Hashable) -> str:
+    return json.dumps(key, default=str)
+
+
+class RewardCache:
+    """
+    RewardCache
+    ===========
+    A two-tier cache of rewards. Recently used rewards are kept in an in-memory LRU
+    cache of at most ``maxsize`` entries. If a ``path`` is given, every reward is
+    also stored in an SQLite database at that path, which persists across runs and
+    can be shared by several processes (e.g. parallel replicas of a search), so that
+    a reward computed once is never recomputed.
+
+    Keys can be any JSON-serializable value, typically a tuple of the (canonical)
+    terminal state and a sample index, such as ``("*ABC::ABa_BCi", 3)``. See
+    ``CircuiTree.reward_cache_key()`` for how a search decides which rewards to
+    cache.
+
+    Only the database path is pickled, so a cache can be sent to worker processes,
+    which open their own connection on first use.
+    """
+
+    def __init__(self, maxsize: int = 100_000, path: Optional[str | Path] = None):
+        self.maxsize = maxsize
+        self.path = None if path is None else Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, float] = OrderedDict()
+        self._lock = Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __getstate__(self):
+        return dict(maxsize=self.maxsize, path=self.path)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def connection(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=60.0, check_same_thread=False
+            )
+            # Write-ahead logging lets readers proceed while another process writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rewards "
+                "(key TEXT PRIMARY KEY, reward REAL NOT NULL)"
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _remember(self, key: str, reward: float) -> None:
+        self._memory[key] = reward
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[float]:
+        """Returns the cached reward for a key, or None if it is not cached."""
+        encoded = _encode_key(key)
+        with self._lock:
+            reward = self._memory.get(encoded)
+            if reward is not None:
+                self._memory.move_to_end(encoded)
+            elif self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT reward FROM rewards WHERE key = ?", (encoded,)
+                ).fetchone()
+                if row is not None:
+                    reward = row[0]
+                    self._remember(encoded, reward)
+
+            if reward is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return reward
+
+    def put(self, key: Hashable, reward: float | int) -> None:
+        """Store the reward for a key."""
+        encoded = _encode_key(key)
+        reward = float(reward)
+        with self._lock:
+            self._remember(encoded, reward)
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO rewards (key, reward) VALUES (?, ?)",
+                        (encoded, reward),
+                    )
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], float]) -> float:
+        """Returns the cached reward for a key, calling ``compute()`` and caching the
+        result if it is not cached."""
+        reward = self.get(key)
+        if reward is None:
+            reward = compute()
+            self.put(key, reward)
+        return reward
+
+    def __contains__(self, key: Hashable) -> bool:
+        encoded = _encode_key(key)
+        if encoded in self._memory:
+            return True
+        if self.connection is None:
+            return False
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM rewards WHERE key = ?", (encoded,)
+            ).fetchone()
+        return row is not None
+
+    def clear_memory(self) -> None:
+        """Empty the in-memory tier. Rewards in the database are kept."""
+        with self._lock:
+            self._memory.clear()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
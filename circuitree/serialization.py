@@ -0,0 +1,231 @@
+"""Typed serialization of CircuiTree attributes without pickling."""
+
+from collections import Counter
+from collections.abc import Mapping
+from functools import cached_property
+import json
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Any, Hashable, Iterator, Optional
+import numpy as np
+
+from .utils import replace_directory
+
+__all__ = [
+    "CSRTable",
+    "save_attributes",
+    "load_attributes",
+]
+
+ATTRS_SUFFIX = ".attrs"
+_META_FILE = "attributes.json"
+
+
+class CSRTable(Mapping):
+    """
+    CSRTable
+    ========
+    A read-only mapping from keys to 1-D arrays (e.g. a dict of lists of parameter
+    indices), stored in compressed sparse row (CSR) form: a key array, an index
+    pointer array, and one flat array of values. Row ``i`` is
+    ``values[indptr[i]:indptr[i + 1]]``.
+
+    The arrays can be memory-mapped, in which case rows are only read when accessed.
+    The key-to-row index is built on first lookup. ``save_attributes()`` stores dicts
+    of lists in this form.
+    """
+
+    def __init__(self, keys: np.ndarray, indptr: np.ndarray, values: np.ndarray):
+        self._keys = keys
+        self.indptr = indptr
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, table: dict[Hashable, Any]) -> "CSRTable":
+        keys = np.array(list(table.keys()))
+        rows = [np.asarray(v) for v in table.values()]
+        lengths = np.fromiter((len(r) for r in rows), dtype=np.int64, count=len(rows))
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        non_empty = [r for r in rows if r.size]
+        if non_empty:
+            values = np.concatenate(non_empty)
+        else:
+            values = np.array([], dtype=np.int64)
+
+        # Store integers in the smallest dtype that holds them
+        if values.dtype.kind in "iu" and values.size:
+            values = values.astype(
+                np.promote_types(
+                    np.min_scalar_type(values.min()), np.min_scalar_type(values.max())
+                )
+            )
+        return cls(keys, indptr, values)
+
+    @cached_property
+    def _index(self) -> dict[Hashable, int]:
+        return {k: i for i, k in enumerate(self._keys.tolist())}
+
+    def __getitem__(self, key: Hashable) -> np.ndarray:
+        i = self._index[key]
+        return self.values[self.indptr[i] : self.indptr[i + 1]]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._keys.tolist())
+
+    def to_dict(self) -> dict[Hashable, list]:
+        """Returns a mutable dict of lists with the same contents."""
+        return {k: self[k].tolist() for k in self}
+
+
+def _normalize_keys(value: Any) -> Any:
+    """Replace NumPy scalar keys of a dict (e.g. ``np.int64``) with the equivalent
+    Python scalars, keeping the dict's type."""
+    if isinstance(value, dict) and any(isinstance(k, np.generic) for k in value):
+        return type(value)(
+            (k.item() if isinstance(k, np.generic) else k, v) for k, v in value.items()
+        )
+    return value
+
+
+def _has_uniform_keys(value: dict) -> bool:
+    """Whether all keys of a dict are strings or all are ints, so that they can be
+    stored as an array."""
+    key_types = {type(k) for k in value.keys()}
+    return key_types <= {str} or key_types <= {int}
+
+
+def _as_csr_table(value: Any) -> Optional[CSRTable]:
+    """Returns a CSRTable if the value is a non-empty dict of flat numeric sequences,
+    otherwise None."""
+    if isinstance(value, CSRTable):
+        return value
+    if not isinstance(value, dict) or not value or isinstance(value, Counter):
+        return None
+    if not _has_uniform_keys(value):
+        return None
+    if not all(isinstance(r, (list, tuple, np.ndarray)) for r in value.values()):
+        return None
+    rows = [np.asarray(r) for r in value.values()]
+    if any(r.ndim != 1 or (r.size and r.dtype.kind not in "biuf") for r in rows):
+        return None
+    return CSRTable.from_dict(dict(zip(value.keys(), rows)))
+
+
+def _is_array_dict(value: Any) -> bool:
+    """Whether a value is a non-empty dict of numeric arrays with int or str keys."""
+    if not isinstance(value, dict) or not value:
+        return False
+    return _has_uniform_keys(value) and all(
+        isinstance(v, np.ndarray) and v.dtype.kind in "biufcU" for v in value.values()
+    )
+
+
+def _json_default(value: Any):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Path):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _to_json(name: str, value: Any) -> Any:
+    try:
+        return json.loads(json.dumps(value, default=_json_default))
+    except TypeError as e:
+        raise TypeError(f"Cannot serialize attribute `{name}`: {e}") from None
+
+
+def save_attributes(attrs: dict[str, Any], path: str | Path) -> Path:
+    """Save a dictionary of attributes to a ``.attrs`` directory, choosing a storage
+    format by type:
+
+    - Numeric and string arrays are saved as ``.npy`` files.
+    - Dicts of flat numeric sequences (e.g. a table of parameter indices per state)
+      are saved as ``CSRTable`` arrays.
+    - Dicts of arrays (e.g. parameter sets per component count) are saved as one
+      ``.npy`` file per key.
+    - ``Counter`` objects are saved as a column of keys and a column of counts.
+    - Everything else, which should be small scalar metadata, is saved as JSON.
+
+    Nothing is pickled. Returns the path to the directory."""
+    target = Path(path).with_suffix(ATTRS_SUFFIX)
+    tmp_dir = Path(tempfile.mkdtemp(dir=target.parent, prefix=f".{target.name}-"))
+    try:
+        meta = {}
+        for name, value in attrs.items():
+            value = _normalize_keys(value)
+            if isinstance(value, np.ndarray) and value.dtype.kind != "O":
+                np.save(tmp_dir.joinpath(f"{name}.npy"), value)
+                meta[name] = dict(kind="array")
+            elif isinstance(value, Counter) and _has_uniform_keys(value):
+                np.save(tmp_dir.joinpath(f"{name}.keys.npy"), np.array(list(value)))
+                counts = np.fromiter(value.values(), dtype=np.int64, count=len(value))
+                np.save(tmp_dir.joinpath(f"{name}.counts.npy"), counts)
+                meta[name] = dict(kind="counter")
+            elif _is_array_dict(value):
+                keys = list(value.keys())
+                for i, k in enumerate(keys):
+                    np.save(tmp_dir.joinpath(f"{name}.{i}.npy"), value[k])
+                meta[name] = dict(kind="array_dict", keys=keys)
+            elif (table := _as_csr_table(value)) is not None:
+                np.save(tmp_dir.joinpath(f"{name}.keys.npy"), table._keys)
+                np.save(tmp_dir.joinpath(f"{name}.indptr.npy"), table.indptr)
+                np.save(tmp_dir.joinpath(f"{name}.values.npy"), table.values)
+                meta[name] = dict(kind="csr")
+            else:
+                meta[name] = dict(kind="json", value=_to_json(name, value))
+
+        with tmp_dir.joinpath(_META_FILE).open("w") as f:
+            json.dump(meta, f)
+        replace_directory(tmp_dir, target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target
+
+
+def is_attributes_dir(path: str | Path) -> bool:
+    return Path(path).joinpath(_META_FILE).exists()
+
+
+def load_attributes(path: str | Path, mmap_mode: Optional[str] = "r") -> dict[str, Any]:
+    """Load attributes saved with ``save_attributes()``. Arrays are memory-mapped by
+    default, so they are not read into memory until they are accessed. Dicts of
+    lists are read back from their CSR arrays into mutable dicts of lists."""
+    path = Path(path)
+    with path.joinpath(_META_FILE).open("r") as f:
+        meta = json.load(f)
+
+    def _load(filename: str) -> np.ndarray:
+        return np.load(path.joinpath(filename), mmap_mode=mmap_mode)
+
+    attrs = {}
+    for name, info in meta.items():
+        kind = info["kind"]
+        if kind == "array":
+            attrs[name] = _load(f"{name}.npy")
+        elif kind == "counter":
+            keys = _load(f"{name}.keys.npy").tolist()
+            counts = _load(f"{name}.counts.npy").tolist()
+            attrs[name] = Counter(dict(zip(keys, counts)))
+        elif kind == "array_dict":
+            attrs[name] = {
+                k: _load(f"{name}.{i}.npy") for i, k in enumerate(info["keys"])
+            }
+        elif kind == "csr":
+            attrs[name] = CSRTable(
+                _load(f"{name}.keys.npy"),
+                _load(f"{name}.indptr.npy"),
+                _load(f"{name}.values.npy"),
+            ).to_dict()
+        elif kind == "json":
+            attrs[name] = info["value"]
+        else:
+            raise ValueError(f"Unknown attribute kind for `{name}`: {kind}")
+    return attrs
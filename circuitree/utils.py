@@ -1,8 +1,12 @@
 from itertools import combinations
+from pathlib import Path
+import shutil
+import tempfile
 from typing import Sequence
 
 __all__ = [
     "merge_overlapping_sets",
+    "replace_directory",
 ]
 
 
@@ -30,3 +34,29 @@ def merge_overlapping_sets(sets: Sequence[set]) -> list[set]:
                 break
 
     return sets
+
+
+## file operations
+
+
+def replace_directory(source: str | Path, target: str | Path) -> Path:
+    """Move the directory `source` to `target`, replacing any existing directory at
+    `target`. The old directory is first renamed aside and only deleted once
+    `source` is in place, so `target` is never left missing or half-deleted. If the
+    move fails, the old directory is restored."""
+    source = Path(source)
+    target = Path(target)
+    if not target.exists():
+        source.rename(target)
+        return target
+
+    old = Path(tempfile.mkdtemp(dir=target.parent, prefix=f".{target.name}-old-"))
+    old.rmdir()
+    target.rename(old)
+    try:
+        source.rename(target)
+    except BaseException:
+        old.rename(target)
+        raise
+    shutil.rmtree(old, ignore_errors=True)
+    return target
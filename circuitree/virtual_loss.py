@@ -0,0 +1,179 @@
+"""Virtual loss strategies for searches with concurrent reward evaluations."""
+
+from collections import Counter
+from typing import TYPE_CHECKING, Hashable, Optional
+
+if TYPE_CHECKING:
+    from .circuitree import CircuiTree
+
+__all__ = [
+    "VirtualLoss",
+    "ConstantVirtualLoss",
+    "PenaltyVirtualLoss",
+    "UnobservedCountVirtualLoss",
+]
+
+
+class VirtualLoss:
+    """
+    VirtualLoss
+    ===========
+    Base class for virtual loss strategies. A strategy decides how a selection path
+    is penalized while its reward is being evaluated (``apply()``), how the penalty
+    is removed when the reward arrives (``complete()``) or the evaluation is
+    abandoned (``cancel()``), and how many visits that are not in the graph the UCB
+    score counts in the meantime (``unobserved_visits()``).
+
+    Every strategy also records how often a selection ends at a state that is
+    already being evaluated by another worker (a "collision"), which measures how
+    well concurrent workers are spread over the tree. See ``metrics()``.
+    """
+
+    def __init__(self):
+        self._in_flight: Counter = Counter()
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        self.n_selections = 0
+        self.n_collisions = 0
+        self.max_in_flight = sum(self._in_flight.values())
+
+    @property
+    def collision_rate(self) -> float:
+        return self.n_collisions / self.n_selections if self.n_selections else 0.0
+
+    def metrics(self) -> dict[str, float | int]:
+        return dict(
+            n_selections=self.n_selections,
+            n_collisions=self.n_collisions,
+            collision_rate=self.collision_rate,
+            max_in_flight=self.max_in_flight,
+        )
+
+    def apply(self, tree: "CircuiTree", path: list[Hashable]) -> None:
+        """Penalize a selection path before its reward is evaluated."""
+        leaf = path[-1]
+        self.n_selections += 1
+        if self._in_flight[leaf]:
+            self.n_collisions += 1
+        self._in_flight[leaf] += 1
+        self.max_in_flight = max(self.max_in_flight, sum(self._in_flight.values()))
+        self.add_loss(tree, path)
+
+    def complete(
+        self, tree: "CircuiTree", path: list[Hashable], reward: float | int
+    ) -> None:
+        """Remove the penalty from a selection path and backpropagate its reward."""
+        self._finish(path)
+        self.remove_loss(tree, path, reward)
+
+    def cancel(self, tree: "CircuiTree", path: list[Hashable]) -> None:
+        """Remove the penalty from a selection path whose evaluation was abandoned,
+        leaving the tree as if it had never been selected."""
+        self._finish(path)
+        self.remove_loss(tree, path, None)
+
+    def _finish(self, path: list[Hashable]) -> None:
+        leaf = path[-1]
+        self._in_flight[leaf] -= 1
+        if self._in_flight[leaf] <= 0:
+            del self._in_flight[leaf]
+
+    def add_loss(self, tree: "CircuiTree", path: list[Hashable]) -> None:
+        raise NotImplementedError
+
+    def remove_loss(
+        self, tree: "CircuiTree", path: list[Hashable], reward: Optional[float | int]
+    ) -> None:
+        raise NotImplementedError
+
+    def unobserved_visits(self, parent: Hashable, child: Hashable) -> tuple[int, int]:
+        """The number of in-flight visits to the edge and to the parent that are not
+        recorded in the graph, which ``circuitree.circuitree.ucb_score()`` adds to the
+        visits in the exploration term. Strategies that add their visits to the graph return
+        zeros."""
+        return 0, 0
+
+class ConstantVirtualLoss(VirtualLoss):
+    """Adds `n_vl` visits with zero reward to each node and edge on the selection
+    path. When the reward arrives, the extra `n_vl - 1` visits are removed, so one
+    real visit remains. With `n_vl=1` (the default strategy), this is the standard
+    virtual loss of a single visit that is completed by its reward. Larger values
+    push concurrent workers further apart."""
+
+    def __init__(self, n_vl: int = 1):
+        if n_vl < 1:
+            raise ValueError("Argument `n_vl` must be at least 1.")
+        self.n_vl = n_vl
+        super().__init__()
+
+    def add_loss(self, tree: "CircuiTree", path: list[Hashable]) -> None:
+        tree._backpropagate(path, "visits", self.n_vl)
+
+    def remove_loss(
+        self, tree: "CircuiTree", path: list[Hashable], reward: Optional[float | int]
+    ) -> None:
+        if reward is None:
+            tree._backpropagate(path, "visits", -self.n_vl)
+            return
+        if self.n_vl > 1:
+            tree._backpropagate(path, "visits", 1 - self.n_vl)
+        tree._backpropagate(path, "reward", reward)
+
+
+class PenaltyVirtualLoss(VirtualLoss):
+    """Adds `n_vl` visits to each node and edge on the selection path and subtracts
+    `penalty` reward per visit, so paths being evaluated look worse than unvisited
+    ones rather than merely less explored. The penalty and the extra visits are
+    removed when the reward arrives."""
+
+    def __init__(self, penalty: float = 1.0, n_vl: int = 1):
+        if n_vl < 1:
+            raise ValueError("Argument `n_vl` must be at least 1.")
+        self.penalty = penalty
+        self.n_vl = n_vl
+        super().__init__()
+
+    def add_loss(self, tree: "CircuiTree", path: list[Hashable]) -> None:
+        tree._backpropagate(path, "visits", self.n_vl)
+        tree._backpropagate(path, "reward", -self.n_vl * self.penalty)
+
+    def remove_loss(
+        self, tree: "CircuiTree", path: list[Hashable], reward: Optional[float | int]
+    ) -> None:
+        if reward is None:
+            tree._backpropagate(path, "visits", -self.n_vl)
+            tree._backpropagate(path, "reward", self.n_vl * self.penalty)
+            return
+        if self.n_vl > 1:
+            tree._backpropagate(path, "visits", 1 - self.n_vl)
+        tree._backpropagate(path, "reward", self.n_vl * self.penalty + reward)
+
+
+class UnobservedCountVirtualLoss(VirtualLoss):
+    """The WU-UCT strategy (Liu et al., 2020). Visits are not added until the
+    reward arrives. Instead, the number of in-flight ("unobserved") evaluations
+    through each node and edge is counted outside the graph, and the exploration
+    term of the UCB score uses the sum of observed and unobserved visits. Mean
+    rewards are therefore not biased by pending evaluations."""
+
+    def __init__(self):
+        self.unobserved_nodes: Counter = Counter()
+        self.unobserved_edges: Counter = Counter()
+        super().__init__()
+
+    def add_loss(self, tree: "CircuiTree", path: list[Hashable]) -> None:
+        self.unobserved_nodes.update(path)
+        self.unobserved_edges.update(zip(path[:-1], path[1:]))
+
+    def remove_loss(
+        self, tree: "CircuiTree", path: list[Hashable], reward: Optional[float | int]
+    ) -> None:
+        self.unobserved_nodes.subtract(path)
+        self.unobserved_edges.subtract(zip(path[:-1], path[1:]))
+        if reward is not None:
+            tree._backpropagate(path, "visits", 1)
+            tree._backpropagate(path, "reward", reward)
+
+    def unobserved_visits(self, parent: Hashable, child: Hashable) -> tuple[int, int]:
+        return self.unobserved_edges[parent, child], self.unobserved_nodes[parent]
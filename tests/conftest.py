@@ -0,0 +1,41 @@
+import pytest
+
+from circuitree import CircuiTree, SimpleNetworkGrammar
+
+
+GRAMMAR_KWARGS = dict(components=["A", "B"], interactions=["activates", "inhibits"])
+
+
+class BernoulliTree(CircuiTree):
+    """A small tree over one- and two-component networks whose reward is a random
+    draw with a success probability fixed per state."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("grammar", SimpleNetworkGrammar(**GRAMMAR_KWARGS))
+        kwargs.setdefault("root", "A::")
+        super().__init__(*args, **kwargs)
+
+    def get_reward(self, state, **kwargs) -> float:
+        p = (sum(map(ord, state)) % 7) / 7
+        return float(self.rg.random() < p)
+
+
+def load_tree(path, **kwargs) -> BernoulliTree:
+    return BernoulliTree.from_file(
+        path,
+        grammar_cls=SimpleNetworkGrammar,
+        grammar_kwargs=GRAMMAR_KWARGS.copy(),
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def tree():
+    return BernoulliTree(seed=0)
+
+
+@pytest.fixture
+def searched_tree():
+    tree = BernoulliTree(seed=0)
+    tree.search_mcts(200)
+    return tree
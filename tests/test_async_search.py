@@ -0,0 +1,79 @@
+from collections import Counter
+import numpy as np
+import pytest
+
+from circuitree.executors import InlineRewardExecutor, ThreadPoolRewardExecutor
+from circuitree.virtual_loss import ConstantVirtualLoss, UnobservedCountVirtualLoss
+
+from .conftest import BernoulliTree
+
+
+class FailingTree(BernoulliTree):
+    """Raises an error on the `fail_at`-th reward evaluation."""
+
+    def __init__(self, fail_at: int, **kwargs):
+        self.fail_at = fail_at
+        self.n_calls = 0
+        super().__init__(**kwargs)
+
+    def get_reward(self, state, **kwargs):
+        self.n_calls += 1
+        if self.n_calls == self.fail_at:
+            raise RuntimeError("reward failed")
+        return super().get_reward(state, **kwargs)
+
+
+class Recorder:
+    """Search callback that tallies the visits and rewards that were completed."""
+
+    def __init__(self):
+        self.visits = Counter()
+        self.rewards = Counter()
+        self.n_completed = 0
+
+    def __call__(self, tree, i, selection_path, sim_node, reward):
+        edges = list(zip(selection_path[:-1], selection_path[1:]))
+        for item in selection_path + edges:
+            self.visits[item] += 1
+            self.rewards[item] += reward
+        self.n_completed += 1
+
+    def assert_matches(self, tree):
+        graph = tree.graph
+        for node, attrs in graph.nodes(data=True):
+            assert attrs["visits"] == self.visits[node]
+            assert np.isclose(attrs["reward"], self.rewards[node])
+        for *edge, attrs in graph.edges(data=True):
+            assert attrs["visits"] == self.visits[tuple(edge)]
+            assert np.isclose(attrs["reward"], self.rewards[tuple(edge)])
+        assert not tree.virtual_loss._in_flight
+
+
+@pytest.mark.parametrize(
+    "executor_cls", [InlineRewardExecutor, ThreadPoolRewardExecutor]
+)
+def test_async_search_backpropagates_every_reward(executor_cls):
+    tree = BernoulliTree(seed=0)
+    recorder = Recorder()
+    with executor_cls() as executor:
+        tree.search_mcts_async(100, executor, max_in_flight=4, callback=recorder)
+    assert recorder.n_completed == 100
+    recorder.assert_matches(tree)
+
+
+@pytest.mark.parametrize(
+    "virtual_loss", [ConstantVirtualLoss(2), UnobservedCountVirtualLoss()]
+)
+def test_async_search_error_reverts_virtual_loss(virtual_loss):
+    tree = FailingTree(fail_at=10, seed=0, virtual_loss=virtual_loss)
+    recorder = Recorder()
+    with pytest.raises(RuntimeError, match="reward failed"):
+        tree.search_mcts_async(
+            100, InlineRewardExecutor(), max_in_flight=4, callback=recorder
+        )
+    # Rewards that completed in the same batch as the failure may be backpropagated
+    assert 0 < recorder.n_completed < tree.fail_at + 4
+    recorder.assert_matches(tree)
+    if isinstance(virtual_loss, UnobservedCountVirtualLoss):
+        assert not +virtual_loss.unobserved_nodes
+        assert not +virtual_loss.unobserved_edges
@@ -0,0 +1,73 @@
+from threading import Lock
+import networkx as nx
+
+from circuitree.checkpoint import (
+    DELTA_LOG_NAME,
+    BackgroundCheckpointer,
+    DeltaCheckpointer,
+    load_delta_checkpoint,
+    read_deltas,
+)
+
+from .conftest import load_tree
+
+
+def test_delta_checkpoint_round_trip(searched_tree, tmp_path):
+    checkpointer = DeltaCheckpointer(tmp_path / "search.ckpt", compact_every=10)
+    assert checkpointer.save(searched_tree) == checkpointer.snapshot_path
+
+    for _ in range(3):
+        searched_tree.search_mcts(20)
+        assert checkpointer.save(searched_tree) == checkpointer.log_path
+    assert len(list(read_deltas(checkpointer.log_path))) == 3
+
+    graph = load_delta_checkpoint(checkpointer.directory)
+    assert nx.utils.graphs_equal(graph, searched_tree.graph)
+
+    lazy = load_tree(checkpointer.directory, lazy=True, mmap_mode="r")
+    assert nx.utils.graphs_equal(lazy.graph, searched_tree.graph)
+
+
+def test_delta_checkpoint_compacts_log(searched_tree, tmp_path):
+    checkpointer = DeltaCheckpointer(tmp_path / "search.ckpt", compact_every=2)
+    checkpointer.save(searched_tree)
+    for _ in range(2):
+        searched_tree.search_mcts(10)
+        checkpointer.save(searched_tree)
+    searched_tree.search_mcts(10)
+    assert checkpointer.save(searched_tree) == checkpointer.snapshot_path
+    assert not checkpointer.log_path.exists()
+    graph = load_delta_checkpoint(checkpointer.directory)
+    assert nx.utils.graphs_equal(graph, searched_tree.graph)
+
+
+def test_truncated_delta_is_ignored(searched_tree, tmp_path):
+    checkpointer = DeltaCheckpointer(tmp_path / "search.ckpt")
+    checkpointer.save(searched_tree)
+    searched_tree.search_mcts(10)
+    checkpointer.save(searched_tree)
+    expected = nx.DiGraph(searched_tree.graph)
+
+    searched_tree.search_mcts(10)
+    checkpointer.save(searched_tree)
+    log = tmp_path / "search.ckpt" / DELTA_LOG_NAME
+    data = log.read_bytes()
+    log.write_bytes(data[: len(data) - 50])
+
+    graph = load_delta_checkpoint(checkpointer.directory)
+    assert nx.utils.graphs_equal(graph, expected)
+
+
+def test_background_checkpointer_snapshot_under_lock(searched_tree, tmp_path):
+    lock = Lock()
+    checkpointer = BackgroundCheckpointer()
+    future = checkpointer.save(searched_tree, tmp_path / "tree", context=lock)
+    expected = nx.DiGraph(searched_tree.graph)
+
+    # Changes after the snapshot are not part of the checkpoint
+    searched_tree.search_mcts(10)
+    stats = future.result()
+    checkpointer.close()
+    assert not lock.locked()
+    assert stats.bytes_written > 0
+    assert nx.utils.graphs_equal(load_tree(stats.path).graph, expected)
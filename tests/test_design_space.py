@@ -0,0 +1,69 @@
+import networkx as nx
+import pytest
+
+from circuitree.design_space import DesignSpace
+from circuitree.utils import replace_directory
+
+from .conftest import BernoulliTree, load_tree
+
+
+def test_compact_space_matches_grown_graph(tree):
+    space = tree.grow_tree(compact=True)
+    assert len(tree.graph) == 1
+    tree.grow_tree()
+    assert nx.utils.graphs_equal(space.to_networkx(), tree.graph)
+
+
+def test_from_networkx_round_trip(tree):
+    tree.grow_tree()
+    tree.search_mcts(100)
+    space = DesignSpace.from_networkx(tree.graph)
+    graph = space.to_networkx()
+    assert nx.utils.graphs_equal(graph, tree.graph)
+    for node, attrs in tree.graph.nodes(data=True):
+        assert graph.nodes[node] == attrs
+    for *edge, attrs in tree.graph.edges(data=True):
+        assert graph.edges[edge] == attrs
+
+
+def test_enumerate_topologies_populates_graph(tree, tmp_path):
+    enumerated = BernoulliTree(enumerate_topologies=True)
+    tree.grow_tree()
+    assert nx.utils.graphs_equal(enumerated.graph, tree.graph)
+
+    gml_file = enumerated.to_file(tmp_path / "tree.gml")
+    assert set(nx.read_gml(gml_file).nodes) == set(tree.graph.nodes)
+
+
+def test_columnar_round_trip(searched_tree, tmp_path):
+    target = searched_tree.to_file(tmp_path / "tree", format="columnar")
+    loaded = load_tree(target)
+    assert nx.utils.graphs_equal(loaded.graph, searched_tree.graph)
+
+    # Saving again replaces the directory, leaving nothing else behind
+    searched_tree.search_mcts(10)
+    assert searched_tree.to_file(tmp_path / "tree", format="columnar") == target
+    assert [p.name for p in tmp_path.iterdir()] == [target.name]
+    assert nx.utils.graphs_equal(load_tree(target).graph, searched_tree.graph)
+
+
+def test_lazy_columnar_load_is_memory_mapped(searched_tree, tmp_path):
+    target = searched_tree.to_file(tmp_path / "tree", format="columnar")
+    lazy = load_tree(target, lazy=True, mmap_mode="r")
+    # Read-only memory maps are not copied into writeable arrays
+    assert not lazy.lazy_space.node_visits.flags.writeable
+    assert not lazy.lazy_space.edges.flags.writeable
+    assert nx.utils.graphs_equal(lazy.graph, searched_tree.graph)
+
+    terminal = load_tree(target, lazy=True, terminal_only=True)
+    assert set(terminal.graph.nodes) == set(searched_tree.terminal_states)
+
+
+def test_replace_directory_keeps_target_on_failure(tmp_path):
+    target = tmp_path / "target"
+    target.mkdir()
+    target.joinpath("old.txt").write_text("old")
+    with pytest.raises(OSError):
+        replace_directory(tmp_path / "missing", target)
+    assert target.joinpath("old.txt").read_text() == "old"
+    assert [p.name for p in tmp_path.iterdir()] == ["target"]
@@ -0,0 +1,91 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from adaptation_circuits.enumerate_topologies import (
+    filter_connected_topologies,
+    filter_topologies_with_path,
+    filter_topology_with_path,
+    generate_topologies_with_optional_pairs,
+    has_path_mask,
+    pack_topologies,
+    transitive_closure,
+    weakly_connected_mask,
+)
+
+
+NODES = ["A", "B", "C"]
+
+
+@pytest.fixture(scope="module")
+def topologies():
+    """A random sample of the 19,683 three-node topologies, plus the empty one."""
+    everything = generate_topologies_with_optional_pairs(NODES, ["a", "i", "None"])
+    rg = np.random.default_rng(0)
+    sample = rg.choice(len(everything) - 1, size=1500, replace=False) + 1
+    return [everything[0]] + [everything[i] for i in sorted(sample)]
+
+
+def _graph(topology):
+    graph = nx.DiGraph()
+    graph.add_edges_from((pair[0], pair[1]) for pair in topology.split("_") if pair)
+    return graph
+
+
+def _nx_has_path(topology, source, destination):
+    graph = _graph(topology)
+    if source in graph and destination in graph:
+        return nx.has_path(graph, source, destination)
+    return False
+
+
+def _nx_weakly_connected(topology):
+    graph = _graph(topology)
+    return len(graph) > 0 and nx.is_weakly_connected(graph)
+
+
+def test_transitive_closure_matches_networkx(topologies):
+    adjacency, _, nodes = pack_topologies(topologies, nodes=NODES)
+    reach = transitive_closure(adjacency)
+    for topology, row in zip(topologies, reach):
+        closure = nx.transitive_closure(_graph(topology), reflexive=False)
+        expected = {(src, dst) for src, dst in closure.edges}
+        packed = {
+            (src, dst)
+            for i, src in enumerate(nodes)
+            for j, dst in enumerate(nodes)
+            if row[i] >> j & 1
+        }
+        assert packed == expected, topology
+
+
+@pytest.mark.parametrize("source", NODES)
+@pytest.mark.parametrize("destination", NODES)
+def test_has_path_mask_matches_networkx(topologies, source, destination):
+    mask = has_path_mask(topologies, source, destination)
+    expected = [_nx_has_path(t, source, destination) for t in topologies]
+    assert mask.tolist() == expected
+    assert filter_topologies_with_path(topologies, source, destination) == [
+        t for t, keep in zip(topologies, expected) if keep
+    ]
+
+
+def test_has_path_mask_with_absent_node(topologies):
+    assert not has_path_mask(topologies, "A", "D").any()
+
+
+def test_weakly_connected_mask_matches_networkx(topologies):
+    mask = weakly_connected_mask(topologies)
+    expected = [_nx_weakly_connected(t) for t in topologies]
+    assert mask.tolist() == expected
+    assert filter_connected_topologies(topologies) == [
+        t for t, keep in zip(topologies, expected) if keep
+    ]
+
+
+def test_filter_topology_with_path_reads_full_states():
+    assert filter_topology_with_path("*ABC::ABa_BCi", "A", "C")
+    assert filter_topology_with_path("ABa_BCi", "A", "C")
+    assert not filter_topology_with_path("*ABC::ABa_CBi", "A", "C")
+    assert not filter_topology_with_path("*ABC::", "A", "C")
+    assert not filter_topology_with_path("", "A", "A")
@@ -0,0 +1,63 @@
+import numpy as np
+
+from circuitree.enumeration import (
+    StateHashSet,
+    enumerate_states_parallel,
+    read_terminal_states,
+    write_terminal_states,
+)
+
+from .conftest import BernoulliTree
+
+
+def test_state_hash_set_grows_and_deduplicates():
+    hash_set = StateHashSet(capacity=8)
+    states = [f"state_{i}" for i in range(100)]
+    assert all(hash_set.add(s) for s in states)
+    assert not any(hash_set.add(s) for s in states)
+    assert len(hash_set) == 100
+    assert all(s in hash_set for s in states)
+    assert "missing" not in hash_set
+
+    restored = StateHashSet.from_keys(hash_set.keys())
+    assert len(restored) == 100
+    assert all(s in restored for s in states)
+
+
+def test_iter_terminal_states_matches_grown_tree(tree):
+    terminals = set(tree.iter_terminal_states())
+    tree.grow_tree()
+    expected = set(tree.terminal_states)
+    assert terminals == expected
+    assert tree.enumerate_terminal_states() == expected
+
+
+def test_iter_terminal_states_uses_tree_do_action():
+    class NoUniqueTree(BernoulliTree):
+        def _do_action(self, state, action):
+            return self.grammar.do_action(state, action)
+
+    unique = set(BernoulliTree().iter_terminal_states())
+    raw = set(NoUniqueTree().iter_terminal_states())
+    assert len(raw) > len(unique)
+    assert unique <= raw
+
+
+def test_write_terminal_states_in_chunks(tree, tmp_path):
+    n_chunks = write_terminal_states(tree.grammar, tree.root, tmp_path, chunksize=10)
+    chunks = list(read_terminal_states(tmp_path))
+    assert len(chunks) == n_chunks
+    written = np.concatenate(chunks).tolist()
+    assert len(written) == len(set(written))
+    assert set(written) == set(tree.iter_terminal_states())
+
+    # A finished enumeration resumes to the same result
+    assert write_terminal_states(tree.grammar, tree.root, tmp_path) == n_chunks
+
+
+def test_enumerate_states_parallel_matches_grow_tree(tree):
+    states, edges = enumerate_states_parallel(tree.grammar, tree.root, nprocs=2)
+    tree.grow_tree()
+    assert len(states) == len(set(states))
+    assert set(states) == set(tree.graph.nodes)
+    assert set(edges) == set(tree.graph.edges)
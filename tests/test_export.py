@@ -0,0 +1,56 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from circuitree.design_space import DesignSpace
+from circuitree.export import iter_edge_table, iter_node_table
+
+from .conftest import load_tree
+
+pytest.importorskip("pyarrow")
+
+
+def _concat(chunks):
+    chunks = list(chunks)
+    return {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+
+
+def test_node_table_from_graph_and_space_agree(searched_tree):
+    graph = searched_tree.graph
+    space = DesignSpace.from_networkx(graph)
+    is_terminal = searched_tree.grammar.is_terminal
+    from_graph = _concat(iter_node_table(graph, "A::", is_terminal, chunksize=3))
+    from_space = _concat(iter_node_table(space, "A::", is_terminal, chunksize=7))
+    for column in from_graph:
+        assert np.array_equal(from_graph[column], from_space[column]), column
+
+    depth = nx.single_source_shortest_path_length(graph, "A::")
+    assert from_graph["depth"].tolist() == [depth[s] for s in graph.nodes]
+
+    edges = _concat(iter_edge_table(graph, chunksize=4))
+    assert list(zip(edges["parent"], edges["child"])) == list(graph.edges)
+
+
+def test_export_tables_dotted_path(searched_tree, tmp_path):
+    nodes_file, edges_file = searched_tree.export_tables(
+        tmp_path / "tree.v2", chunksize=5
+    )
+    assert nodes_file.name == "tree.v2_nodes.parquet"
+    assert edges_file.name == "tree.v2_edges.parquet"
+
+    nodes, edges = searched_tree.to_tables()
+    assert pd.read_parquet(nodes_file).equals(pd.DataFrame(nodes))
+    assert pd.read_parquet(edges_file).equals(pd.DataFrame(edges))
+
+
+def test_export_tables_terminal_only_lazy(searched_tree, tmp_path):
+    target = searched_tree.to_file(tmp_path / "tree", format="columnar")
+    lazy = load_tree(target, lazy=True, terminal_only=True)
+    nodes_file, _ = lazy.export_tables(tmp_path / "terminal", format="feather")
+    assert lazy._graph is None
+
+    nodes = pd.read_feather(nodes_file)
+    assert set(nodes["state"]) == set(searched_tree.terminal_states)
+    assert (nodes["depth"] == -1).all()
+    assert nodes["terminal"].all()
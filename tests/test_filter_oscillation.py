@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from scipy.signal import find_peaks
+
+from adaptation_circuits.filter_oscillation import (
+    autocorr,
+    autocorr_batch,
+    damped_oscillation,
+    damped_oscillation_batch,
+    find_peaks_batch,
+    sustained_oscillation,
+    sustained_oscillation_batch,
+)
+from adaptation_circuits.reward import (
+    compute_precision_sensitivity,
+    compute_precision_sensitivity_batch,
+)
+
+
+T = 400
+
+
+def _trajectories(rg, n_sims=60, n_species=3):
+    """Sustained, damped and overdamped oscillations and noise around a steady state,
+    with some species held constant."""
+    t = np.linspace(0, 40, T)[None, :, None]
+    frequency = rg.uniform(0.2, 2, (n_sims, 1, n_species))
+    decay = rg.choice([0, 0.05, 0.3, 3], (n_sims, 1, n_species))
+    amplitude = rg.uniform(0, 0.3, (n_sims, 1, n_species))
+    baseline = rg.uniform(0.2, 0.6, (n_sims, 1, n_species))
+    data = baseline + amplitude * np.exp(-decay * t) * np.sin(frequency * t)
+    data += rg.normal(0, 0.01, data.shape) * rg.choice([0, 1], (n_sims, 1, n_species))
+    return data
+
+
+def _sustained_oscillation(data):
+    """The per-trajectory classifier, computed with `autocorr` column by column."""
+    return np.apply_along_axis(autocorr, 0, data).min() < -0.4
+
+
+def test_autocorr_batch_matches_autocorr():
+    data = _trajectories(np.random.default_rng(0))
+    result = autocorr_batch(data)
+    for sim in range(len(data)):
+        expected = np.apply_along_axis(autocorr, 0, data[sim])
+        assert np.allclose(result[sim], expected)
+
+
+def test_sustained_oscillation_batch_matches_per_trajectory():
+    data = _trajectories(np.random.default_rng(1))
+    expected = [_sustained_oscillation(sim) for sim in data]
+    assert any(expected) and not all(expected)
+    assert sustained_oscillation_batch(data).tolist() == expected
+    assert [sustained_oscillation(sim) for sim in data] == expected
+
+
+def test_sustained_oscillation_of_constant_trajectory():
+    data = np.full((1, T, 3), 0.5)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = _sustained_oscillation(data[0])
+    assert sustained_oscillation_batch(data).tolist() == [expected]
+
+
+def test_find_peaks_batch_matches_scipy():
+    rg = np.random.default_rng(2)
+    # rounding creates plateaus, including at the edges
+    x = np.round(rg.normal(0, 1, (200, 50)).cumsum(axis=1), 0)
+    mask = find_peaks_batch(x)
+    for row, row_mask in zip(x, mask):
+        assert np.flatnonzero(row_mask).tolist() == find_peaks(row)[0].tolist()
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 3])
+def test_find_peaks_batch_short_rows(length):
+    x = np.array([[0.0, 1.0, 0.0][:length]])
+    mask = find_peaks_batch(x)
+    assert np.flatnonzero(mask[0]).tolist() == find_peaks(x[0])[0].tolist()
+
+
+@pytest.mark.parametrize("out_node", [0, -1])
+def test_damped_oscillation_batch_matches_per_trajectory(out_node):
+    rg = np.random.default_rng(3)
+    out = _trajectories(rg)
+    out2 = _trajectories(rg)
+    expected = [damped_oscillation(a, b, out_node=out_node) for a, b in zip(out, out2)]
+    assert any(expected) and not all(expected)
+    result = damped_oscillation_batch(out, out2, out_node=out_node)
+    assert result.tolist() == expected
+
+
+def test_precision_sensitivity_batch_matches_per_trajectory():
+    rg = np.random.default_rng(4)
+    out = _trajectories(rg)
+    out2 = _trajectories(rg)
+    inpt = (0.5, 0.6)
+    precision, sensitivity = compute_precision_sensitivity_batch(inpt, out, out2)
+    for sim in range(len(out)):
+        expected = compute_precision_sensitivity(inpt, out[sim], out2[sim])
+        assert np.allclose((precision[sim], sensitivity[sim]), expected)
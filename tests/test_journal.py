@@ -0,0 +1,60 @@
+import numpy as np
+
+from circuitree import CircuiTree
+from circuitree.journal import IterationJournal, JournalReader
+
+from .conftest import BernoulliTree
+
+
+def _assert_stats_equal(graph, expected):
+    assert set(graph.nodes) == set(expected.nodes)
+    assert set(graph.edges) == set(expected.edges)
+    for node, attrs in expected.nodes(data=True):
+        assert graph.nodes[node]["visits"] == attrs["visits"]
+        assert np.isclose(graph.nodes[node]["reward"], attrs["reward"])
+    for *edge, attrs in expected.edges(data=True):
+        assert graph.edges[edge]["visits"] == attrs["visits"]
+        assert np.isclose(graph.edges[edge]["reward"], attrs["reward"])
+
+
+def test_journal_replay(tmp_path):
+    tree = BernoulliTree(seed=0)
+    with IterationJournal(tmp_path / "journal", buffer_size=16) as journal:
+        tree.search_mcts(200, journal=journal)
+        assert len(journal) == 200
+
+    reader = JournalReader(tmp_path / "journal")
+    assert len(reader) == 200
+    assert reader.path(0)[0] == tree.root
+    assert tree.grammar.is_terminal(reader.terminal(0))
+    _assert_stats_equal(reader.replay().to_networkx(), tree.graph)
+
+    # Replaying a prefix gives the statistics after that many iterations
+    partial_tree = BernoulliTree(seed=0)
+    partial_tree.search_mcts(50)
+    _assert_stats_equal(reader.replay(until=50).to_networkx(), partial_tree.graph)
+
+
+def test_journal_resumes_and_ignores_partial_record(tmp_path):
+    tree = BernoulliTree(seed=0)
+    with IterationJournal(tmp_path / "journal") as journal:
+        tree.search_mcts(30, journal=journal)
+    with IterationJournal(tmp_path / "journal") as journal:
+        tree.search_mcts(20, journal=journal)
+    _assert_stats_equal(
+        JournalReader(tmp_path / "journal").replay().to_networkx(), tree.graph
+    )
+
+    records = tmp_path / "journal" / "records.bin"
+    records.write_bytes(records.read_bytes()[:-5])
+    assert len(JournalReader(tmp_path / "journal")) == 49
+
+
+def test_journal_records_thread_index(tree, tmp_path):
+    with IterationJournal(tmp_path / "journal") as journal:
+        CircuiTree._run_mcts(tree, range(5), journal=journal, thread_idx=3)
+        CircuiTree._run_mcts_with_callback(
+            tree, range(5), None, 1, journal=journal, thread_idx=1
+        )
+    threads = JournalReader(tmp_path / "journal").records["thread"]
+    assert threads.tolist() == [3] * 5 + [1] * 5
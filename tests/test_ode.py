@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+from scipy.integrate import odeint
+
+from adaptation_circuits.ode import (
+    CompiledTopology,
+    TopologyStack,
+    integrate_batch,
+    numerical_jacobian,
+    solve_dynamics,
+    solve_dynamics_batch,
+    system_dynamics,
+)
+
+
+N_SPECIES = 3
+ACTIVATIONS = np.array([[0, 1], [1, 2], [2, 2]])
+INHIBITIONS = np.array([[2, 1], [1, 0]])
+TIME = np.linspace(0, 20, 101)
+
+
+def _params(rng, batch=None):
+    shape = (2, N_SPECIES + 1, N_SPECIES + 1)
+    if batch is not None:
+        shape = (batch,) + shape
+    return rng.uniform(0.5, 5, shape), rng.uniform(0.05, 1, shape)
+
+
+def _odeint(pop0, k_cat, K_hill, inpt, activations=ACTIVATIONS, inhibitions=INHIBITIONS):
+    args = (N_SPECIES, activations, inhibitions, k_cat, K_hill, inpt)
+    return odeint(system_dynamics, pop0, TIME, args=args, rtol=1e-9, atol=1e-12)
+
+
+def test_compiled_dynamics_match_system_dynamics():
+    rng = np.random.default_rng(0)
+    topology = CompiledTopology(N_SPECIES, ACTIVATIONS, INHIBITIONS)
+    for inpt in (0.0, 0.5, 1.0):
+        k_cat, K_hill = _params(rng)
+        f, jac = topology.compile(k_cat, K_hill, inpt)
+        weights = topology.bind(k_cat, K_hill, inpt)
+        for pop in rng.uniform(0, 1, (5, N_SPECIES)):
+            args = (N_SPECIES, ACTIVATIONS, INHIBITIONS, k_cat, K_hill, inpt)
+            assert np.allclose(f(pop, 0.0), system_dynamics(pop, 0.0, *args))
+            assert np.allclose(f(pop, 0.0), topology.rhs(pop, *weights))
+            assert np.allclose(jac(pop, 0.0), topology.jacobian(pop, *weights))
+            assert np.allclose(jac(pop, 0.0), numerical_jacobian(f, pop), atol=1e-5)
+
+
+def test_compiled_dynamics_without_interactions():
+    # Only the input and basal terms remain
+    topology = CompiledTopology(N_SPECIES, [], [])
+    k_cat, K_hill = _params(np.random.default_rng(1))
+    f, jac = topology.compile(k_cat, K_hill, 0.5)
+    pop = np.full(N_SPECIES, 0.3)
+    weights = topology.bind(k_cat, K_hill, 0.5)
+    assert np.allclose(f(pop, 0.0), topology.rhs(pop, *weights))
+    assert np.allclose(jac(pop, 0.0), topology.jacobian(pop, *weights))
+
+
+def test_solve_dynamics_matches_odeint():
+    k_cat, K_hill = _params(np.random.default_rng(2))
+    pop0 = np.full(N_SPECIES, 0.1)
+    expected = _odeint(pop0, k_cat, K_hill, 0.5)
+    result = solve_dynamics(
+        pop0, TIME, N_SPECIES, ACTIVATIONS, INHIBITIONS, k_cat, K_hill, 0.5
+    )
+    assert np.allclose(result, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize(
+    "method, kwargs", [("rk45", {}), ("ros2", {}), ("rk4", dict(dt=0.01))]
+)
+def test_solve_dynamics_batch_matches_odeint(method, kwargs):
+    rng = np.random.default_rng(3)
+    batch = 6
+    k_cat, K_hill = _params(rng, batch)
+    pop0 = rng.uniform(0, 0.5, (batch, N_SPECIES))
+    topology = CompiledTopology(N_SPECIES, ACTIVATIONS, INHIBITIONS)
+
+    result, ok = solve_dynamics_batch(
+        pop0, TIME, topology, k_cat, K_hill, 0.5, method=method, **kwargs
+    )
+    assert result.shape == (len(TIME), batch, N_SPECIES)
+    assert ok.all()
+    for b in range(batch):
+        expected = _odeint(pop0[b], k_cat[b], K_hill[b], 0.5)
+        assert np.allclose(result[:, b], expected, atol=1e-4)
+
+
+def test_topology_stack_matches_odeint_per_member():
+    rng = np.random.default_rng(4)
+    networks = [
+        (ACTIVATIONS, INHIBITIONS),
+        (np.array([[0, 1], [1, 2]]), np.array([[2, 0]])),
+        (np.array([[0, 2]]), np.empty((0, 2), dtype=int)),
+    ]
+    stack = TopologyStack.from_topologies(
+        CompiledTopology(N_SPECIES, act, inh) for act, inh in networks
+    )
+    k_cat, K_hill = _params(rng, len(networks))
+    pop0 = np.full(N_SPECIES, 0.1)
+
+    result, ok = solve_dynamics_batch(pop0, TIME, stack, k_cat, K_hill, 0.5)
+    assert ok.all()
+    for b, (act, inh) in enumerate(networks):
+        expected = _odeint(pop0, k_cat[b], K_hill[b], 0.5, act, inh)
+        assert np.allclose(result[:, b], expected, atol=1e-4)
+
+    with pytest.raises(TypeError):
+        stack.compile(k_cat[0], K_hill[0], 0.5)
+
+
+def test_integrate_batch_exponential_decay():
+    rates = np.array([0.5, 1.0, 2.0])
+
+    def f(y, idx):
+        return -rates[idx, None] * y
+
+    y0 = np.ones((3, 1))
+    result, ok = integrate_batch(f, y0, TIME, rtol=1e-8, atol=1e-10)
+    assert ok.all()
+    assert np.allclose(result[..., 0], np.exp(-np.outer(TIME, rates)), atol=1e-6)
+
+
+def test_integrate_batch_marks_unfinished_members():
+    def f(y, idx):
+        return -y
+
+    result, ok = integrate_batch(f, np.ones((2, 1)), TIME, max_steps=3)
+    assert not ok.any()
+    assert np.isnan(result[-1]).all()
+
+
+def test_integrate_batch_validates_method():
+    def f(y, idx):
+        return -y
+
+    y0 = np.ones((2, 1))
+    with pytest.raises(ValueError):
+        integrate_batch(f, y0, TIME, method="euler")
+    with pytest.raises(ValueError):
+        integrate_batch(f, y0, TIME, method="rk4")
+    with pytest.raises(ValueError):
+        integrate_batch(f, y0, TIME, method="ros2")
@@ -0,0 +1,59 @@
+import pickle
+
+from circuitree.reward_cache import RewardCache
+
+from .conftest import BernoulliTree
+
+
+def test_memory_cache_is_lru():
+    cache = RewardCache(maxsize=2)
+    cache.put(("a", 0), 1)
+    cache.put(("b", 0), 0)
+    assert cache.get(("a", 0)) == 1.0
+    cache.put(("c", 0), 0.5)
+
+    # "b" was the least recently used entry
+    assert ("b", 0) not in cache
+    assert cache.get(("a", 0)) == 1.0
+    assert cache.get(("c", 0)) == 0.5
+    assert cache.get(("b", 0)) is None
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_database_persists_and_pickles(tmp_path):
+    cache = RewardCache(maxsize=1, path=tmp_path / "rewards.db")
+    cache.put(("a", 0), 1)
+    cache.put(("b", 1), 0.25)
+    assert cache.get(("a", 0)) == 1.0  # evicted from memory, read from disk
+
+    restored = pickle.loads(pickle.dumps(cache))
+    cache.close()
+    assert restored.get(("b", 1)) == 0.25
+    assert ("a", 0) in restored
+    assert ("c", 0) not in restored
+    restored.close()
+
+
+def test_search_computes_each_key_once(tmp_path):
+    computed = []
+
+    class CountingTree(BernoulliTree):
+        def reward_cache_key(self, state, *args, **kwargs):
+            return state
+
+        def get_reward(self, state, **kwargs):
+            computed.append(state)
+            return super().get_reward(state, **kwargs)
+
+    cache = RewardCache(path=tmp_path / "rewards.db")
+    tree = CountingTree(seed=0, reward_cache=cache)
+    tree.search_mcts(100)
+    assert len(computed) == cache.misses
+    assert cache.hits + cache.misses == 100
+
+    # A new search is served from the database for every state computed before
+    cache.clear_memory()
+    CountingTree(seed=1, reward_cache=cache).search_mcts(100)
+    assert len(computed) == len(set(computed))
+    assert set(computed) <= set(tree.iter_terminal_states())
+    cache.close()
@@ -0,0 +1,52 @@
+from collections import Counter
+import numpy as np
+import pytest
+
+from circuitree.serialization import CSRTable, load_attributes, save_attributes
+
+
+def test_csr_table_from_dict():
+    table = {"a": [1, 2, 3], "b": [], "c": [300]}
+    csr = CSRTable.from_dict(table)
+    assert len(csr) == 3
+    assert list(csr) == ["a", "b", "c"]
+    assert csr["a"].tolist() == [1, 2, 3]
+    assert csr["b"].size == 0
+    assert csr.values.dtype == np.uint16
+    assert csr.to_dict() == table
+
+
+@pytest.mark.parametrize("mmap_mode", [None, "r"])
+def test_attributes_round_trip(tmp_path, mmap_mode):
+    attrs = dict(
+        root="A::",
+        seed=2023,
+        exploration_constant=1.4,
+        rewards=np.linspace(0, 1, 5),
+        successful_params={"*A::AAa": [0, 5, 7], "*A::AAi": []},
+        param_table={np.int64(1): [2, 3], np.int64(4): [5]},
+        param_sets={2: np.ones((2, 3)), 3: np.zeros((4, 3))},
+        n_visits=Counter({"*A::AAa": 3, "*A::AAi": 1}),
+        metadata={"version": 1, np.int64(2): "two"},
+    )
+    target = save_attributes(attrs, tmp_path / "tree")
+    loaded = load_attributes(target, mmap_mode=mmap_mode)
+
+    assert loaded.keys() == attrs.keys()
+    assert loaded["root"] == "A::"
+    assert loaded["seed"] == 2023
+    assert np.array_equal(loaded["rewards"], attrs["rewards"])
+    assert loaded["successful_params"] == attrs["successful_params"]
+    assert loaded["param_table"] == {1: [2, 3], 4: [5]}
+    assert loaded["param_sets"].keys() == {2, 3}
+    assert np.array_equal(loaded["param_sets"][3], attrs["param_sets"][3])
+    assert loaded["n_visits"] == attrs["n_visits"]
+    assert loaded["metadata"] == {"version": 1, "2": "two"}
+
+    # Dicts of lists come back mutable
+    loaded["successful_params"]["*A::AAi"].append(1)
+    loaded["successful_params"]["*A::AA"] = [2]
+
+    # Saving again replaces the previous attributes
+    save_attributes(dict(root="B::"), target)
+    assert load_attributes(target) == dict(root="B::")
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from circuitree.circuitree import ucb_score
+from circuitree.virtual_loss import (
+    ConstantVirtualLoss,
+    PenaltyVirtualLoss,
+    UnobservedCountVirtualLoss,
+)
+
+from .conftest import BernoulliTree
+
+
+def _selected_tree(virtual_loss, n_steps=50):
+    tree = BernoulliTree(seed=0, virtual_loss=virtual_loss)
+    tree.search_mcts(n_steps)
+    path = tree.select_and_expand()
+    return tree, path
+
+
+def _stats(tree):
+    nodes = {n: (a["visits"], a["reward"]) for n, a in tree.graph.nodes(data=True)}
+    edges = {(p, c): (a["visits"], a["reward"]) for p, c, a in tree.graph.edges(data=True)}
+    return nodes, edges
+
+
+def test_wu_uct_counts_unobserved_visits_outside_graph():
+    virtual_loss = UnobservedCountVirtualLoss()
+    tree, path = _selected_tree(virtual_loss)
+    before = _stats(tree)
+
+    tree.backpropagate_visit(path)
+    tree.backpropagate_visit(path)
+    assert _stats(tree) == before
+    edges = list(zip(path[:-1], path[1:]))
+    assert all(virtual_loss.unobserved_nodes[n] == 2 for n in path)
+    assert all(virtual_loss.unobserved_edges[e] == 2 for e in edges)
+    assert virtual_loss.n_collisions == 1
+
+    # Unobserved visits only enter the exploration term
+    parent, child = edges[0]
+    visits = tree.graph.edges[parent, child]["visits"]
+    parent_visits = tree.graph.nodes[parent]["visits"]
+    mean_reward = tree.graph.edges[parent, child]["reward"] / visits
+    expected = mean_reward + tree.exploration_constant * np.sqrt(
+        np.log(parent_visits + 2) / (visits + 2)
+    )
+    assert np.isclose(tree.get_ucb_score(parent, child), expected)
+
+    tree.backpropagate_reward(path, 1.0)
+    tree.virtual_loss.cancel(tree, path)
+    nodes, edge_stats = _stats(tree)
+    for node in path:
+        assert nodes[node] == (before[0][node][0] + 1, before[0][node][1] + 1.0)
+    assert not +virtual_loss.unobserved_nodes
+    assert not +virtual_loss.unobserved_edges
+    assert not virtual_loss._in_flight
+
+
+@pytest.mark.parametrize(
+    "virtual_loss", [ConstantVirtualLoss(3), PenaltyVirtualLoss(penalty=0.5, n_vl=2)]
+)
+def test_virtual_loss_is_removed(virtual_loss):
+    tree, path = _selected_tree(virtual_loss)
+    before = _stats(tree)
+    tree.backpropagate_visit(path)
+    assert _stats(tree) != before
+    virtual_loss.cancel(tree, path)
+    assert _stats(tree) == before
+
+    tree.backpropagate_visit(path)
+    tree.backpropagate_reward(path, 1.0)
+    nodes, _ = _stats(tree)
+    for node in path:
+        visits, reward = before[0][node]
+        assert nodes[node][0] == visits + 1
+        assert np.isclose(nodes[node][1], reward + 1.0)
+
+
+def test_ucb_score_with_only_unobserved_visits(searched_tree):
+    graph = searched_tree.graph
+    parent, child = next(iter(graph.edges))
+    graph.edges[parent, child].update(visits=0, reward=0)
+    assert ucb_score(graph, parent, child) == np.inf
+    assert np.isfinite(ucb_score(graph, parent, child, np.sqrt(2), 1, 1))